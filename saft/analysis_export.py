@@ -0,0 +1,169 @@
+"""Columnar Parquet export of the hourly breakdown produced by `analyze_period`
+
+Rows are buffered only up to `row_group_size` and written as row groups while the analysis is
+still running, so exporting a multi-year portfolio never holds more than one row group per
+writer in memory. Output is hive-partitioned as `customer=<id>/month=<YYYY-MM>/part-*.parquet`;
+reading one month of one customer only opens the files in that partition directory. A writer
+replaces the files of every partition it writes, so exporting a customer's month again does not
+duplicate its rows.
+
+Requires the optional `pyarrow` dependency (`poetry install --extras export`).
+"""
+
+import glob
+import os
+from datetime import datetime
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without the extra installed
+    pa = None
+
+
+DEFAULT_ROW_GROUP_SIZE = 24 * 31
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError(
+            "Parquet export requires pyarrow, install it with `poetry install --extras export`"
+        )
+
+
+def analysis_schema(plan_types: Sequence[str]) -> "pa.Schema":
+    """Timestamp and usage followed by a price and a cost column per plan type and the total"""
+    _require_pyarrow()
+    components = [*plan_types, "total"]
+    return pa.schema(
+        [
+            ("timestamp", pa.timestamp("us")),
+            ("usage_kwh", pa.float64()),
+            *[(f"price_{component}", pa.float64()) for component in components],
+            *[(f"cost_{component}", pa.float64()) for component in components],
+        ]
+    )
+
+
+class AnalysisParquetWriter:
+    """Streams hourly analysis rows into month partitions of one dataset directory"""
+
+    def __init__(
+        self,
+        root: str,
+        *,
+        plan_types: Sequence[str],
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    ):
+        _require_pyarrow()
+        self.root: str = root
+        self.schema: pa.Schema = analysis_schema(plan_types)
+        self.components: List[str] = [*plan_types, "total"]
+        self.row_group_size: int = row_group_size
+        self.rows_written: int = 0
+        self._partition: Optional[Tuple[str, str]] = None
+        self._writer: Optional[pq.ParquetWriter] = None
+        # Files written per partition, a partition is cleared when first written
+        self._parts: Dict[Tuple[str, str], int] = {}
+        self._columns: Dict[str, list] = self._empty_columns()
+
+    def write(self, customer_id: str, hours: Iterable[Dict]) -> int:
+        """Consume `analyze_period`/`iter_period` rows for one customer, returns rows written"""
+        written = 0
+        for hour_data in hours:
+            timestamp = hour_data["timestamp"]
+            partition = (str(customer_id), f"{timestamp.year:04d}-{timestamp.month:02d}")
+            if partition != self._partition:
+                self._close_partition()
+                self._partition = partition
+
+            columns = self._columns
+            columns["timestamp"].append(timestamp)
+            columns["usage_kwh"].append(float(hour_data["usage_kwh"]))
+            for component in self.components:
+                price = hour_data["prices"].get(component)
+                cost = hour_data["cost"].get(component)
+                columns[f"price_{component}"].append(float(price) if price is not None else None)
+                columns[f"cost_{component}"].append(float(cost) if cost is not None else None)
+
+            written += 1
+            if len(columns["timestamp"]) >= self.row_group_size:
+                self._flush()
+
+        self.rows_written += written
+        return written
+
+    def close(self) -> None:
+        self._close_partition()
+
+    def __enter__(self) -> "AnalysisParquetWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _empty_columns(self) -> Dict[str, list]:
+        return {name: [] for name in self.schema.names}
+
+    def _flush(self) -> None:
+        if not self._columns["timestamp"]:
+            return
+        if self._writer is None:
+            customer_id, month = self._partition
+            directory = os.path.join(self.root, f"customer={customer_id}", f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            part = self._parts.get(self._partition, 0)
+            if part == 0:
+                for stale in glob.glob(os.path.join(directory, "part-*.parquet")):
+                    os.remove(stale)
+            self._parts[self._partition] = part + 1
+            path = os.path.join(directory, f"part-{part}.parquet")
+            self._writer = pq.ParquetWriter(path, self.schema)
+        table = pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._columns = self._empty_columns()
+
+    def _close_partition(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def export_analysis(
+    analyzer: ElectricityUsageAnalyzer,
+    start: datetime,
+    end: datetime,
+    *,
+    root: str,
+    customer_id: str,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> int:
+    """Analyze a period straight into Parquet without materializing the hourly list"""
+    plan_types = list(analyzer.price_calendar.pricing_plans.keys())
+    with AnalysisParquetWriter(root, plan_types=plan_types, row_group_size=row_group_size) as w:
+        return w.write(customer_id, analyzer.iter_period(start, end))
+
+
+def read_month(root: str, customer_id: str, month: str) -> "pa.Table":
+    """One customer's `YYYY-MM`, reading only that partition's files"""
+    _require_pyarrow()
+    directory = os.path.join(root, f"customer={customer_id}", f"month={month}")
+    return pq.read_table(directory).sort_by("timestamp")
+
+
+def read_analysis(root: str, filter=None) -> "pa.Table":
+    """The whole dataset, with `customer` and `month` partition columns and optional filter"""
+    _require_pyarrow()
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    return dataset.to_table(filter=filter)
@@ -0,0 +1,295 @@
+"""Cost-minimizing dispatch of a home battery against hourly prices
+
+The battery's state of charge is discretized into `levels` steps and the cheapest charge and
+discharge schedule is found by dynamic programming backwards over the intervals. Each step
+evaluates every (state of charge, move) pair of every household in the batch as one array
+expression, so the Python loop runs once per interval, not per household or state.
+
+Charging draws `stored / charge_efficiency` from the grid, discharging delivers
+`released * discharge_efficiency` to the household, both limited to `power_kw`. The battery only
+serves the household's own load: it never exports to the grid. Hours without a price are idle.
+
+Usage vectors come from `usage_vector(schedule, index)` for a `UsageSchedule`, e.g.
+`consumption_schedule(consumption_data, start, end)` for a consumption JSON. The resulting grid
+draw is an `AlignedConsumption`, so it is costed by `CompiledTariff.summarize` or analyzed by
+`ElectricityUsageAnalyzer` exactly like the household without a battery.
+"""
+
+import argparse
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from saft.compiled_tariff import align_spot_prices
+from saft.compiled_tariff import DEFAULT_TZ
+from saft.meter_data import AlignedConsumption
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.resolution import consumption_schedule
+from saft.resolution import usage_vector
+from saft.simulate import load_data
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LEVELS = 20
+DEFAULT_BATCH_SIZE = 256
+
+
+class Battery:
+    def __init__(
+        self,
+        *,
+        capacity_kwh: float,
+        power_kw: float,
+        charge_efficiency: float = 0.95,
+        discharge_efficiency: float = 0.95,
+        initial_kwh: float = 0.0,
+        levels: int = DEFAULT_LEVELS,
+    ):
+        if capacity_kwh <= 0 or power_kw <= 0 or levels < 1:
+            raise ValueError("Battery capacity, power and levels must be positive")
+        self.capacity_kwh: float = capacity_kwh
+        self.power_kw: float = power_kw
+        self.charge_efficiency: float = charge_efficiency
+        self.discharge_efficiency: float = discharge_efficiency
+        self.levels: int = levels
+        self.step_kwh: float = capacity_kwh / levels
+        self.initial_level: int = int(round(min(initial_kwh, capacity_kwh) / self.step_kwh))
+
+    def moves(self, interval_hours: float = 1.0) -> np.ndarray:
+        """Feasible changes of the state of charge per interval, in levels"""
+        max_charge = int(
+            np.floor(self.power_kw * interval_hours * self.charge_efficiency / self.step_kwh + 1e-9)
+        )
+        max_discharge = int(
+            np.floor(
+                self.power_kw * interval_hours / (self.discharge_efficiency * self.step_kwh) + 1e-9
+            )
+        )
+        return np.arange(-min(max_discharge, self.levels), min(max_charge, self.levels) + 1)
+
+    def grid_energy(self, moves: np.ndarray) -> np.ndarray:
+        """Change of the household's grid draw caused by each move, in kWh"""
+        stored = moves * self.step_kwh
+        return np.where(
+            stored > 0, stored / self.charge_efficiency, stored * self.discharge_efficiency
+        )
+
+
+class DispatchResult:
+    """Per-household (rows) and per-interval (columns) outcome of a dispatch"""
+
+    def __init__(
+        self,
+        *,
+        usage_kwh: np.ndarray,
+        grid_kwh: np.ndarray,
+        soc_kwh: np.ndarray,
+        prices: np.ndarray,
+    ):
+        self.usage_kwh: np.ndarray = usage_kwh
+        self.grid_kwh: np.ndarray = grid_kwh
+        self.soc_kwh: np.ndarray = soc_kwh
+        self.prices: np.ndarray = np.nan_to_num(prices)
+        self.charge_kwh: np.ndarray = np.clip(grid_kwh - usage_kwh, 0, None)
+        self.discharge_kwh: np.ndarray = np.clip(usage_kwh - grid_kwh, 0, None)
+
+    @property
+    def baseline_cost(self) -> np.ndarray:
+        return (self.prices * self.usage_kwh).sum(axis=-1)
+
+    @property
+    def cost(self) -> np.ndarray:
+        return (self.prices * self.grid_kwh).sum(axis=-1)
+
+    @property
+    def savings(self) -> np.ndarray:
+        return self.baseline_cost - self.cost
+
+    def consumption(
+        self, index: pd.DatetimeIndex, household: int = 0, metering_point: str = "battery"
+    ) -> AlignedConsumption:
+        """One household's grid draw with the battery, ready for the cost engines"""
+        return AlignedConsumption(
+            metering_point=metering_point,
+            index=index,
+            usage=self.grid_kwh[household],
+            missing=np.zeros(len(index), dtype=bool),
+        )
+
+
+def dispatch(
+    battery: Battery,
+    prices: np.ndarray,
+    usage_kwh: np.ndarray,
+    *,
+    interval_hours: float = 1.0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: Optional[int] = 1,
+) -> DispatchResult:
+    """Cheapest battery schedule of every household
+
+    `usage_kwh` is one row of kWh per interval per household (or a single vector), `prices` the
+    price per kWh drawn from the grid, either shared by all households or one row each.
+    Households are solved `batch_size` at a time; with `workers` other than 1 the batches run
+    in a process pool.
+    """
+    usage_kwh = np.atleast_2d(np.asarray(usage_kwh, dtype=float))
+    prices = np.broadcast_to(np.asarray(prices, dtype=float), usage_kwh.shape)
+    batches = [
+        slice(first, first + batch_size) for first in range(0, usage_kwh.shape[0], batch_size)
+    ]
+    args = [(battery, prices[rows], usage_kwh[rows], interval_hours) for rows in batches]
+
+    grid = np.empty_like(usage_kwh)
+    soc = np.empty((usage_kwh.shape[0], usage_kwh.shape[1] + 1))
+    if workers == 1 or len(batches) == 1:
+        results = [_dispatch_batch(*batch_args) for batch_args in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_dispatch_batch, *zip(*args)))
+    for rows, (batch_grid, batch_soc) in zip(batches, results):
+        grid[rows], soc[rows] = batch_grid, batch_soc
+
+    return DispatchResult(usage_kwh=usage_kwh, grid_kwh=grid, soc_kwh=soc, prices=prices)
+
+
+def _dispatch_batch(battery: Battery, prices: np.ndarray, usage: np.ndarray, interval_hours: float):
+    households, intervals = usage.shape
+    moves = battery.moves(interval_hours)
+    grid_energy = battery.grid_energy(moves)
+
+    # The cost to go is padded with infinite cost on both sides, so moves past empty or full are
+    # never chosen, and window [h, level, k] of the padded row is the cost after move k
+    pad = int(np.abs(moves).max())
+    offset = pad + int(moves[0])
+    padded = np.full((households, battery.levels + 1 + 2 * pad), np.inf)
+    windows = sliding_window_view(padded[:, offset:], len(moves), axis=1)[:, : battery.levels + 1]
+    idle = moves == 0
+    usage_by_interval = np.ascontiguousarray(usage.T)
+    unpriced = np.isnan(prices.T)
+    prices_by_interval = np.ascontiguousarray(np.nan_to_num(prices.T))
+
+    # Backward pass: cost_to_go[h, level] of the cheapest schedule from interval t onwards
+    padded[:, pad : pad + battery.levels + 1] = 0.0
+    policy = np.empty(
+        (intervals, households, battery.levels + 1), dtype=np.min_scalar_type(len(moves))
+    )
+    for t in range(intervals - 1, -1, -1):
+        draw = usage_by_interval[t][:, np.newaxis] + grid_energy
+        move_cost = prices_by_interval[t][:, np.newaxis] * draw
+        move_cost[draw < -1e-9] = np.inf  # No export
+        if unpriced[t].any():
+            move_cost[np.ix_(unpriced[t], ~idle)] = np.inf  # Idle without a price
+        total = move_cost[:, np.newaxis, :] + windows
+        best = total.argmin(axis=2)
+        policy[t] = best
+        padded[:, pad : pad + battery.levels + 1] = np.take_along_axis(
+            total, best[:, :, np.newaxis], axis=2
+        )[:, :, 0]
+
+    # Forward pass from the initial state of charge
+    rows = np.arange(households)
+    level = np.full(households, battery.initial_level)
+    grid = np.empty((households, intervals))
+    soc = np.empty((households, intervals + 1))
+    soc[:, 0] = level * battery.step_kwh
+    for t in range(intervals):
+        move = policy[t, rows, level]
+        grid[:, t] = usage[:, t] + grid_energy[move]
+        level = level + moves[move]
+        soc[:, t + 1] = level * battery.step_kwh
+
+    return np.clip(grid, 0, None), soc
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Savings of a home battery on spot price.")
+    parser.add_argument(
+        "--prices_file", type=str, required=True, help="CSV file with Timestamp,Price history"
+    )
+    parser.add_argument(
+        "--consumption_file", type=str, required=True, help="JSON file with consumption data"
+    )
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, required=True, help="First hour to dispatch"
+    )
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, required=True, help="End of the dispatched period"
+    )
+    parser.add_argument("--capacity", type=float, required=True, help="Usable capacity in kwh")
+    parser.add_argument("--power", type=float, required=True, help="Charge/discharge limit in kw")
+    parser.add_argument(
+        "--efficiency", type=float, default=0.95, help="One-way charge and discharge efficiency"
+    )
+    parser.add_argument(
+        "--transfer_price", type=float, default=0.0, help="Transfer price per kwh from the grid"
+    )
+    parser.add_argument(
+        "--levels", type=int, default=DEFAULT_LEVELS, help="State of charge discretization"
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(
+    prices_file: str,
+    consumption_file: str,
+    start: datetime,
+    end: datetime,
+    capacity: float,
+    power: float,
+    efficiency: float = 0.95,
+    transfer_price: float = 0.0,
+    levels: int = DEFAULT_LEVELS,
+    spot_tax_multiplier: Decimal = Decimal("1.24"),
+    tz: str = DEFAULT_TZ,
+) -> Dict:
+    pricing = DayAheadPricing.from_csv(prices_file, country_code="FI")
+    index = pd.date_range(start=start, end=end, freq="h", inclusive="left")
+    prices = align_spot_prices(pricing, index, tz=tz) * float(spot_tax_multiplier) + transfer_price
+    usage = usage_vector(consumption_schedule(load_data(consumption_file), start, end), index)
+
+    battery = Battery(
+        capacity_kwh=capacity,
+        power_kw=power,
+        charge_efficiency=efficiency,
+        discharge_efficiency=efficiency,
+        levels=levels,
+    )
+    result = dispatch(battery, prices, usage)
+
+    summary = {
+        "cost_without_battery": float(result.baseline_cost[0]),
+        "cost_with_battery": float(result.cost[0]),
+        "savings_with_battery": float(result.savings[0]),
+        "charged_kwh": float(result.charge_kwh.sum()),
+        "discharged_kwh": float(result.discharge_kwh.sum()),
+    }
+    print(json.dumps(summary, indent=4))
+    return summary
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(
+        prices_file=args.prices_file,
+        consumption_file=args.consumption_file,
+        start=args.start,
+        end=args.end,
+        capacity=args.capacity,
+        power=args.power,
+        efficiency=args.efficiency,
+        transfer_price=args.transfer_price,
+        levels=args.levels,
+    )
@@ -0,0 +1,161 @@
+"""Durable checkpoints for long batch jobs, so a preempted job resumes where it stopped
+
+A job is a list of work units (e.g. seed ranges or household batches) whose results are merged
+into an aggregate state. `run_units` merges the results strictly in unit order, whatever order
+the workers finish them in, and keeps results that finished early as pending until their turn.
+A resumed job therefore performs exactly the same merges as an uninterrupted one and produces an
+identical result.
+
+The checkpoint holds the merged state, the number of units merged into it and the pending
+results. It is pickled to a temporary file, fsynced and atomically renamed over the previous
+checkpoint, so a crash at any point leaves either the old or the new checkpoint behind. Writes
+are throttled to one per `min_interval` seconds plus a final one, which keeps their cost
+negligible next to the units themselves.
+"""
+
+import logging
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import as_completed
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+
+
+log = logging.getLogger(__name__)
+
+# Bump when the checkpoint layout changes
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SUFFIX = ".ckpt"
+DEFAULT_MIN_INTERVAL = 10.0
+
+
+class Checkpoint:
+    def __init__(self, *, state: Any, next_unit: int = 0, pending: Optional[Dict[int, Any]] = None):
+        self.state: Any = state
+        self.next_unit: int = next_unit  # Units before this one are merged into `state`
+        self.pending: Dict[int, Any] = pending if pending is not None else {}
+
+
+class CheckpointStore:
+    """Checkpoints of one job, identified by `key`, e.g. a `result_cache.fingerprint`"""
+
+    def __init__(self, directory: str, key: str, *, min_interval: float = DEFAULT_MIN_INTERVAL):
+        self.directory: str = directory
+        self.key: str = key
+        self.min_interval: float = min_interval
+        self.last_saved: Optional[float] = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.key + CHECKPOINT_SUFFIX)
+
+    def load(self) -> Optional[Checkpoint]:
+        try:
+            with open(self.path, "rb") as file:
+                version, checkpoint = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+            log.warning(f"Ignoring unreadable checkpoint {self.path}")
+            return None
+        if version != CHECKPOINT_VERSION:
+            log.warning(f"Ignoring checkpoint {self.path} of version {version}")
+            return None
+        return checkpoint
+
+    def save(self, checkpoint: Checkpoint, force: bool = False) -> bool:
+        """Write the checkpoint unless one was written less than `min_interval` seconds ago"""
+        now = time.monotonic()
+        if not force and self.last_saved is not None and now - self.last_saved < self.min_interval:
+            return False
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(
+                    (CHECKPOINT_VERSION, checkpoint), file, protocol=pickle.HIGHEST_PROTOCOL
+                )
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        _fsync_directory(self.directory)
+        self.last_saved = now
+        return True
+
+
+def _fsync_directory(directory: str) -> None:
+    """Make the rename durable; not every platform can open a directory"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def run_units(
+    units: Sequence[Any],
+    compute: Callable[[Any], Any],
+    merge: Callable[[Any, Any], Any],
+    state: Any,
+    *,
+    store: Optional[CheckpointStore] = None,
+    workers: Optional[int] = None,
+) -> Any:
+    """Merge `compute(unit)` of every unit into `state` in unit order, resuming from `store`
+
+    `merge(state, result)` returns the new state. With `workers` other than 1 the units run in
+    a process pool, so `compute` has to be picklable.
+    """
+    checkpoint = store.load() if store is not None else None
+    if checkpoint is None:
+        checkpoint = Checkpoint(state=state)
+    else:
+        log.info(
+            f"Resuming from {store.path}: {checkpoint.next_unit} of {len(units)} units merged, "
+            f"{len(checkpoint.pending)} pending"
+        )
+
+    def completed(unit: int, result: Any) -> None:
+        checkpoint.pending[unit] = result
+        while checkpoint.next_unit in checkpoint.pending:
+            result = checkpoint.pending.pop(checkpoint.next_unit)
+            checkpoint.state = merge(checkpoint.state, result)
+            checkpoint.next_unit += 1
+        if store is not None:
+            store.save(checkpoint)
+
+    todo = [
+        unit for unit in range(checkpoint.next_unit, len(units)) if unit not in checkpoint.pending
+    ]
+    try:
+        if workers == 1:
+            for unit in todo:
+                completed(unit, compute(units[unit]))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(compute, units[unit]): unit for unit in todo}
+                for future in as_completed(futures):
+                    completed(futures[future], future.result())
+    finally:
+        # Also keeps the finished units of a job that is stopped by an exception
+        if store is not None:
+            store.save(checkpoint, force=True)
+    return checkpoint.state
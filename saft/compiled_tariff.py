@@ -0,0 +1,340 @@
+"""Array form of an `ElectricityPriceCalendar` for evaluating many intervals at once
+
+`ElectricityPriceCalendar.get_price` walks every plan for every timestamp. A `TariffTable` holds
+the same plans as arrays and resolves a whole `DatetimeIndex` in one vectorized pass per plan,
+following the same rules: the first applicable plan of each `plan_type` wins and a fixed monthly
+plan charges its price once, on the first interval of a month it is selected in. The result is
+a `CompiledTariff` of with-tax unit prices per plan type that any usage vector can be costed
+against.
+
+Like the calendar, the index is expected in naive local time.
+"""
+
+from datetime import datetime
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from saft.ratepayer_model import ElectricityPriceCalendar
+from saft.ratepayer_model import HOUR
+from saft.ratepayer_model import PricingPlan
+from saft.ratepayer_model import UsageSchedule
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.ratepayer_old_model import PreciseAmount
+from saft.resolution import infer_resolution
+from saft.resolution import PRICE
+from saft.resolution import seconds_of_day
+from saft.resolution import to_resolution
+from saft.resolution import usage_vector
+
+
+DEFAULT_TZ = "Europe/Helsinki"
+SPOT_PLAN_TYPE = "spot"
+# Per-plan arrays of a `TariffTable`, besides `plan_type`
+PLAN_ARRAYS = [
+    "start",
+    "end",
+    "months",
+    "days_of_week",
+    "has_time_range",
+    "time_start",
+    "time_end",
+    "price",
+    "tax_multiplier",
+    "is_fixed_monthly",
+]
+
+
+class TariffTable:
+    """The plans of an `ElectricityPriceCalendar` as flat arrays, ordered by plan priority"""
+
+    def __init__(self, *, plan_types: List[str], plans: List[PricingPlan]):
+        self.plan_types: List[str] = plan_types
+        self.plan_type: np.ndarray = np.array(
+            [plan_types.index(plan.plan_type) for plan in plans], dtype=np.int64
+        )
+        self.start: np.ndarray = np.array([plan.start_date for plan in plans], dtype="M8[s]")
+        self.end: np.ndarray = np.array([plan.end_date for plan in plans], dtype="M8[s]")
+        self.months: np.ndarray = np.ones((len(plans), 13), dtype=bool)
+        self.days_of_week: np.ndarray = np.ones((len(plans), 7), dtype=bool)
+        self.has_time_range: np.ndarray = np.array(
+            [plan.time_range is not None for plan in plans], dtype=bool
+        )
+        self.time_start: np.ndarray = np.zeros(len(plans), dtype=np.int64)
+        self.time_end: np.ndarray = np.zeros(len(plans), dtype=np.int64)
+        self.price: np.ndarray = np.array([float(plan.price.amount) for plan in plans])
+        self.tax_multiplier: np.ndarray = np.array(
+            [float(plan.tax_multiplier.amount) for plan in plans]
+        )
+        self.is_fixed_monthly: np.ndarray = np.array(
+            [plan.is_fixed_monthly for plan in plans], dtype=bool
+        )
+
+        for i, plan in enumerate(plans):
+            if plan.months:
+                self.months[i] = False
+                self.months[i, plan.months] = True
+            if plan.days_of_week is not None:
+                self.days_of_week[i] = False
+                self.days_of_week[i, plan.days_of_week] = True
+            if plan.time_range:
+                self.time_start[i] = seconds_of_day(plan.time_range.start)
+                self.time_end[i] = seconds_of_day(plan.time_range.end)
+
+    @classmethod
+    def from_calendar(cls, calendar: ElectricityPriceCalendar) -> "TariffTable":
+        plan_types = list(calendar.pricing_plans.keys())
+        plans = [plan for plan_type in plan_types for plan in calendar.pricing_plans[plan_type]]
+        return cls(plan_types=plan_types, plans=plans)
+
+    def select(self, rows: np.ndarray) -> "TariffTable":
+        """A table of the plans at `rows`, in that order of priority"""
+        selected = TariffTable(plan_types=[], plans=[])
+        type_indices = list(dict.fromkeys(self.plan_type[rows].tolist()))
+        selected.plan_types = [self.plan_types[i] for i in type_indices]
+        renumbered = np.zeros(len(self.plan_types), dtype=np.int64)
+        renumbered[type_indices] = np.arange(len(type_indices))
+        selected.plan_type = renumbered[self.plan_type[rows]]
+        for name in PLAN_ARRAYS:
+            setattr(selected, name, getattr(self, name)[rows])
+        return selected
+
+    def prices(self, index: pd.DatetimeIndex) -> Dict[str, np.ndarray]:
+        """With-tax price per interval and plan type; fixed monthly charges land in one interval
+
+        Like `ElectricityPriceCalendar.get_price`, fixed monthly charges are priced per hour of
+        usage, so their unit price is scaled by the number of intervals per hour.
+        """
+        return self.resolve(index)[0]
+
+    def resolve(
+        self, index: pd.DatetimeIndex
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """`prices` plus the fixed monthly charge each interval would carry if it opened a month
+
+        The charges are given per plan type with fixed monthly plans, NaN where none applies.
+        """
+        intervals_per_hour = HOUR / infer_resolution(index) if len(index) > 1 else 1.0
+        timestamps = index.to_numpy(dtype="M8[s]")
+        months = index.month.to_numpy()
+        calendar_months = index.year.to_numpy() * 12 + months
+        weekdays = index.weekday.to_numpy()
+        seconds = (timestamps - timestamps.astype("M8[D]")).astype(np.int64)
+
+        prices = {}
+        fixed_charges = {}
+        for type_idx, plan_type in enumerate(self.plan_types):
+            type_prices = np.zeros(len(index), dtype=float)
+            unassigned = np.ones(len(index), dtype=bool)
+            for i in np.flatnonzero(self.plan_type == type_idx):
+                selected = unassigned & self._applies(i, timestamps, months, weekdays, seconds)
+                unassigned &= ~selected
+                unit_price = self.price[i] * self.tax_multiplier[i]
+                if self.is_fixed_monthly[i]:
+                    fixed_price = unit_price * intervals_per_hour
+                    type_prices[_first_of_each_month(selected, calendar_months)] = fixed_price
+                    if plan_type not in fixed_charges:
+                        fixed_charges[plan_type] = np.full(len(index), np.nan)
+                    fixed_charges[plan_type][selected] = fixed_price
+                else:
+                    type_prices[selected] = unit_price
+            prices[plan_type] = type_prices
+
+        return prices, fixed_charges
+
+    def _applies(self, i, timestamps, months, weekdays, seconds) -> np.ndarray:
+        applies = (self.start[i] <= timestamps) & (timestamps <= self.end[i])
+        applies &= self.months[i, months] & self.days_of_week[i, weekdays]
+        if self.has_time_range[i]:
+            start, end = self.time_start[i], self.time_end[i]
+            if start <= end:
+                applies &= (start <= seconds) & (seconds < end)
+            else:  # Handles ranges that cross midnight
+                applies &= (seconds >= start) | (seconds < end)
+        return applies
+
+
+def _first_of_each_month(selected: np.ndarray, calendar_months: np.ndarray) -> np.ndarray:
+    """Positions where a fixed charge is due, as `_get_fixed_monthly_charge` decides them
+
+    `calendar_months` counts months across years, e.g. `year * 12 + month`.
+    """
+    positions = np.flatnonzero(selected)
+    selected_months = calendar_months[positions]
+    due = np.ones(len(positions), dtype=bool)
+    due[1:] = selected_months[1:] != selected_months[:-1]
+    return positions[due]
+
+
+def local_spot_prices(
+    pricing: DayAheadPricing, tz: str = DEFAULT_TZ, resolution: Optional[timedelta] = None
+) -> pd.Series:
+    """Spot prices on naive local timestamps, optionally averaged or repeated to `resolution`
+
+    The repeated hour of the autumn DST change maps onto one naive timestamp; its first price is
+    used.
+    """
+    series = pricing.price_series()
+    if resolution is not None:
+        series = to_resolution(series, resolution, PRICE)
+    local = series.index.tz_convert(tz).tz_localize(None)
+    series = pd.Series(series.to_numpy(), index=local)
+    return series[~series.index.duplicated(keep="first")]
+
+
+def align_spot_prices(
+    pricing: DayAheadPricing, index: pd.DatetimeIndex, tz: str = DEFAULT_TZ
+) -> np.ndarray:
+    """Spot price per interval of a naive local index, NaN where no price is published"""
+    resolution = infer_resolution(index) if len(index) > 1 else None
+    series = local_spot_prices(pricing, tz=tz, resolution=resolution)
+    return series.reindex(index).to_numpy(dtype=float)
+
+
+class CompiledTariff:
+    """With-tax unit prices per plan type over a fixed index, ready to cost usage vectors"""
+
+    def __init__(
+        self,
+        *,
+        index: pd.DatetimeIndex,
+        prices: Dict[str, np.ndarray],
+        fixed_charges: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        self.index: pd.DatetimeIndex = index
+        self.prices: Dict[str, np.ndarray] = prices
+        # See `TariffTable.resolve`, needed to move fixed charges in `window`
+        self.fixed_charges: Dict[str, np.ndarray] = fixed_charges or {}
+        self.total_price: np.ndarray = np.sum(list(prices.values()), axis=0)
+        self.missing: np.ndarray = np.isnan(self.total_price)
+
+    def position(self, timestamp: datetime) -> int:
+        position = self.index.get_indexer([pd.Timestamp(timestamp)])[0]
+        if position < 0:
+            raise ValueError(f"{timestamp} is outside of the compiled period")
+        return position
+
+    def slice(self, start: int, stop: int) -> "CompiledTariff":
+        """The intervals `start:stop` as costed in the whole period, e.g. a day of a month"""
+        return CompiledTariff(
+            index=self.index[start:stop],
+            prices={plan_type: prices[start:stop] for plan_type, prices in self.prices.items()},
+            fixed_charges={
+                plan_type: charges[start:stop] for plan_type, charges in self.fixed_charges.items()
+            },
+        )
+
+    def window(self, start: int, stop: int) -> "CompiledTariff":
+        """The intervals `start:stop` as if compiled over them alone
+
+        Unlike `slice`, fixed monthly charges are due on the first interval of each month in the
+        window, as in an `ElectricityUsageAnalyzer.analyze_period` of the window.
+        """
+        index = self.index[start:stop]
+        calendar_months = index.year.to_numpy() * 12 + index.month.to_numpy()
+        prices = {plan_type: prices[start:stop] for plan_type, prices in self.prices.items()}
+        fixed_charges = {
+            plan_type: charges[start:stop] for plan_type, charges in self.fixed_charges.items()
+        }
+        for plan_type, charges in fixed_charges.items():
+            selected = ~np.isnan(charges)
+            type_prices = prices[plan_type].copy()
+            type_prices[selected] = 0.0
+            first = _first_of_each_month(selected, calendar_months)
+            type_prices[first] = charges[first]
+            prices[plan_type] = type_prices
+        return CompiledTariff(index=index, prices=prices, fixed_charges=fixed_charges)
+
+    def costs(self, usage: np.ndarray) -> Dict[str, np.ndarray]:
+        """Cost per interval and plan type for a usage vector aligned with the index"""
+        usage = np.asarray(usage, dtype=float)
+        if usage.shape[-1] != len(self.index):
+            raise ValueError(f"Expected {len(self.index)} usage values, got {usage.shape[-1]}")
+        return {
+            plan_type: np.nan_to_num(prices) * usage for plan_type, prices in self.prices.items()
+        }
+
+    def summarize(self, usage: np.ndarray) -> Dict:
+        """`ElectricityUsageAnalyzer.summarize_analysis` computed on arrays, in floats"""
+        usage = np.asarray(usage, dtype=float)
+        costs = self.costs(usage)
+        cost_by_type = {plan_type: float(cost.sum()) for plan_type, cost in costs.items()}
+        hourly_total = np.sum(list(costs.values()), axis=0)
+        total_usage = float(usage.sum())
+        total_cost = float(hourly_total.sum())
+
+        return {
+            "total_usage_kwh": total_usage,
+            "total_cost": total_cost,
+            "cost_by_type": cost_by_type,
+            "average_price_per_kwh": total_cost / total_usage if total_usage > 0 else 0.0,
+            "peak_usage_hour": int(np.argmax(usage)) if len(usage) else None,
+            "peak_cost_hour": int(np.argmax(hourly_total)) if len(usage) else None,
+            "missing_price_hours": int(self.missing.sum()),
+        }
+
+
+def compile_tariff(
+    calendar: Union[ElectricityPriceCalendar, TariffTable],
+    index: pd.DatetimeIndex,
+    *,
+    pricing: Optional[DayAheadPricing] = None,
+    spot_tax_multiplier: Decimal = Decimal("1.24"),
+    tz: str = DEFAULT_TZ,
+) -> CompiledTariff:
+    """Resolve the calendar, plus the taxed spot price if `pricing` is given, over `index`"""
+    table = calendar if isinstance(calendar, TariffTable) else TariffTable.from_calendar(calendar)
+    prices, fixed_charges = table.resolve(index)
+    if pricing is not None:
+        spot = align_spot_prices(pricing, index, tz=tz) * float(spot_tax_multiplier)
+        prices[SPOT_PLAN_TYPE] = spot
+    return CompiledTariff(index=index, prices=prices, fixed_charges=fixed_charges)
+
+
+def summarize_period(
+    calendar: ElectricityPriceCalendar,
+    schedule: UsageSchedule,
+    start: datetime,
+    end: datetime,
+    *,
+    resolution: timedelta = HOUR,
+    pricing: Optional[DayAheadPricing] = None,
+) -> Dict:
+    """Array counterpart of `analyze_period` + `summarize_analysis` at any resolution"""
+    index = pd.date_range(start, end, freq=resolution, inclusive="left")
+    tariff = compile_tariff(calendar, index, pricing=pricing)
+    return tariff.summarize(usage_vector(schedule, index, resolution))
+
+
+def simple_calendar(
+    *, start: datetime, end: datetime, transfer_price: Decimal, monthly_fee: Decimal
+) -> ElectricityPriceCalendar:
+    """A calendar with a flat transfer price and a fixed monthly fee, for the CLIs"""
+    calendar = ElectricityPriceCalendar()
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Monthly Fee",
+            start_date=start,
+            end_date=end,
+            price=PreciseAmount(amount=monthly_fee),
+            plan_type="fixed_monthly",
+            is_fixed_monthly=True,
+        )
+    )
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Transfer",
+            start_date=start,
+            end_date=end,
+            price=PreciseAmount(amount=transfer_price),
+            plan_type="transfer",
+        )
+    )
+    return calendar
@@ -0,0 +1,219 @@
+"""Cost one usage profile against the day-ahead prices of many bidding zones at once
+
+The spot prices of all zones are aligned to the costed intervals and stacked into a zones x
+intervals matrix, so one usage vector is costed against every zone in a single broadcasted
+product. Tariff components other than the spot price (transfer, fixed fees, ...) come from one
+`CompiledTariff` shared by all zones.
+
+Zones publish different hours, so missing prices are handled per zone: like
+`CompiledTariff.summarize`, an interval without a spot price costs nothing in that zone and is
+counted in its `missing_price_hours`. Zones are ranked by `estimated_total_cost`, which prices
+the zone's unpriced usage at its average spot price, so gaps do not make a zone look cheaper.
+"""
+
+import argparse
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from saft.compiled_tariff import align_spot_prices
+from saft.compiled_tariff import compile_tariff
+from saft.compiled_tariff import CompiledTariff
+from saft.compiled_tariff import DEFAULT_TZ
+from saft.compiled_tariff import simple_calendar
+from saft.compiled_tariff import SPOT_PLAN_TYPE
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.resolution import consumption_schedule
+from saft.resolution import usage_vector
+from saft.simulate import load_data
+
+
+log = logging.getLogger(__name__)
+
+
+class ZonePrices:
+    """Spot prices per kWh of every zone (rows) and interval (columns), NaN where unpublished"""
+
+    def __init__(self, *, zones: List[str], index: pd.DatetimeIndex, prices: np.ndarray):
+        if prices.shape != (len(zones), len(index)):
+            raise ValueError(f"Expected {len(zones)} x {len(index)} prices, got {prices.shape}")
+        if len(set(zones)) != len(zones):
+            raise ValueError("Zone names must be unique")
+        self.zones: List[str] = zones
+        self.index: pd.DatetimeIndex = index
+        self.prices: np.ndarray = prices
+
+    @classmethod
+    def from_pricings(
+        cls,
+        pricings: List[DayAheadPricing],
+        index: pd.DatetimeIndex,
+        timezones: Optional[Dict[str, str]] = None,
+    ) -> "ZonePrices":
+        """Align every zone's prices to the naive local `index` in the zone's own time zone
+
+        Zones are named by `zone_code`, or by `country_code` for single-zone countries.
+        """
+        timezones = timezones or {}
+        zones = [pricing.zone_code or pricing.country_code for pricing in pricings]
+        prices = np.vstack(
+            [
+                align_spot_prices(pricing, index, tz=timezones.get(zone, DEFAULT_TZ))
+                for zone, pricing in zip(zones, pricings)
+            ]
+        )
+        return cls(zones=zones, index=index, prices=prices)
+
+    @property
+    def missing(self) -> np.ndarray:
+        return np.isnan(self.prices)
+
+
+def compare_zones(
+    zone_prices: ZonePrices,
+    usage: np.ndarray,
+    *,
+    tariff: Optional[CompiledTariff] = None,
+    spot_tax_multiplier: Decimal = Decimal("1.24"),
+) -> Dict:
+    """Per-zone `CompiledTariff.summarize` of `usage` plus the zones ranked cheapest first
+
+    `tariff` holds the components besides the spot price, compiled over the same index without
+    pricing.
+    """
+    usage = np.asarray(usage, dtype=float)
+    if usage.shape != (len(zone_prices.index),):
+        raise ValueError(f"Expected {len(zone_prices.index)} usage values, got {usage.shape}")
+    if tariff is None:
+        tariff = CompiledTariff(index=zone_prices.index, prices={})
+    if not tariff.index.equals(zone_prices.index):
+        raise ValueError("The tariff and the zone prices are compiled over different intervals")
+
+    shared_costs = tariff.costs(usage)
+    shared_hourly = np.sum(list(shared_costs.values()), axis=0) if shared_costs else 0.0
+    shared_missing = tariff.missing if tariff.prices else np.zeros(len(usage), dtype=bool)
+
+    # One zones x intervals pass for every zone
+    spot = zone_prices.prices * float(spot_tax_multiplier)
+    spot_missing = np.isnan(spot)
+    spot_costs = np.nan_to_num(spot) * usage
+    hourly_total = spot_costs + shared_hourly
+    spot_cost = spot_costs.sum(axis=1)
+    total_cost = hourly_total.sum(axis=1)
+    priced_usage = np.where(spot_missing, 0.0, usage).sum(axis=1)
+    unpriced_usage = usage.sum() - priced_usage
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average_spot = np.where(priced_usage > 0, spot_cost / priced_usage, np.nan)
+    estimated_total_cost = total_cost + np.nan_to_num(average_spot) * unpriced_usage
+    missing_price_hours = (spot_missing | shared_missing).sum(axis=1)
+    peak_cost_hour = hourly_total.argmax(axis=1) if len(usage) else [None] * len(spot)
+
+    total_usage = float(usage.sum())
+    shared_by_type = {plan_type: float(cost.sum()) for plan_type, cost in shared_costs.items()}
+    zones = {}
+    for row, zone in enumerate(zone_prices.zones):
+        zones[zone] = {
+            "total_usage_kwh": total_usage,
+            "total_cost": float(total_cost[row]),
+            "cost_by_type": {**shared_by_type, SPOT_PLAN_TYPE: float(spot_cost[row])},
+            "average_price_per_kwh": (
+                float(total_cost[row]) / total_usage if total_usage > 0 else 0.0
+            ),
+            "peak_usage_hour": int(np.argmax(usage)) if len(usage) else None,
+            "peak_cost_hour": (
+                int(peak_cost_hour[row]) if peak_cost_hour[row] is not None else None
+            ),
+            "missing_price_hours": int(missing_price_hours[row]),
+            "average_spot_price_per_kwh": (
+                float(average_spot[row]) if priced_usage[row] > 0 else None
+            ),
+            "estimated_total_cost": float(estimated_total_cost[row]),
+        }
+
+    # Stable, so zones that cost the same keep their input order
+    order = np.argsort(estimated_total_cost, kind="stable")
+    ranking = [zone_prices.zones[row] for row in order]
+    for rank, zone in enumerate(ranking, start=1):
+        zones[zone]["rank"] = rank
+    return {"zones": zones, "ranking": ranking}
+
+
+def parse_zone_file(value: str) -> Dict[str, str]:
+    zone, _, file_path = value.partition("=")
+    if not zone or not file_path:
+        raise argparse.ArgumentTypeError(f"Expected ZONE=PRICES_FILE, got {value}")
+    return {zone: file_path}
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Compare the cost of usage across zones.")
+    parser.add_argument(
+        "--zone",
+        type=parse_zone_file,
+        action="append",
+        required=True,
+        help="ZONE=CSV file with Timestamp,Price history, once per zone",
+    )
+    parser.add_argument(
+        "--consumption_file", type=str, required=True, help="JSON file with consumption data"
+    )
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, required=True, help="First costed hour"
+    )
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, required=True, help="End of costed period"
+    )
+    parser.add_argument(
+        "--transfer_price", type=Decimal, default=Decimal("0"), help="Transfer price per kwh"
+    )
+    parser.add_argument(
+        "--monthly_fee", type=Decimal, default=Decimal("0"), help="Fixed fee per month"
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(
+    zone_files: Dict[str, str],
+    consumption_file: str,
+    start: datetime,
+    end: datetime,
+    transfer_price: Decimal = Decimal("0"),
+    monthly_fee: Decimal = Decimal("0"),
+) -> Dict:
+    index = pd.date_range(start=start, end=end, freq="h", inclusive="left")
+    pricings = [
+        DayAheadPricing.from_csv(file_path, country_code=zone)
+        for zone, file_path in zone_files.items()
+    ]
+    calendar = simple_calendar(
+        start=start, end=end, transfer_price=transfer_price, monthly_fee=monthly_fee
+    )
+    usage = usage_vector(consumption_schedule(load_data(consumption_file), start, end), index)
+
+    comparison = compare_zones(
+        ZonePrices.from_pricings(pricings, index), usage, tariff=compile_tariff(calendar, index)
+    )
+    print(json.dumps(comparison, indent=4))
+    return comparison
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(
+        zone_files={zone: path for zone_file in args.zone for zone, path in zone_file.items()},
+        consumption_file=args.consumption_file,
+        start=args.start,
+        end=args.end,
+        transfer_price=args.transfer_price,
+        monthly_fee=args.monthly_fee,
+    )
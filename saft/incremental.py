@@ -0,0 +1,349 @@
+"""Incremental re-costing of customer summaries as day-ahead prices arrive
+
+A customer's summary over the contract period is kept as aggregates per local day, persisted as
+JSON next to the digest of the spot prices each day was costed with. When prices are appended or
+corrected, only the days whose prices changed are costed again and their aggregates are swapped
+into the running totals in place; the daily refresh costs the new hours, not the whole history.
+
+The calendar part of a day's cost never changes with spot prices, but a fixed monthly charge
+lands on the first hour of its month that the plan applies in. Where that is depends on the
+calendar alone, so only the plan types with fixed monthly plans are resolved from the start of the
+month (or the contract start); every other price, the spot prices and the usage are evaluated over
+the stale days only. Results match costing the whole contract at once with `compile_tariff`.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from saft.compiled_tariff import CompiledTariff
+from saft.compiled_tariff import DEFAULT_TZ
+from saft.compiled_tariff import local_spot_prices
+from saft.compiled_tariff import SPOT_PLAN_TYPE
+from saft.compiled_tariff import TariffTable
+from saft.ratepayer_model import ElectricityPriceCalendar
+from saft.ratepayer_model import UsageSchedule
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.resolution import usage_vector
+from saft.result_cache import fingerprint
+
+
+log = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+DAY = timedelta(days=1)
+
+
+class DailySpotPrices:
+    """Spot prices on naive local hours with a digest of every day's prices
+
+    Built once per price update and shared by all customers.
+    """
+
+    def __init__(self, *, series: pd.Series):
+        self.series: pd.Series = series
+        self.digests: Dict[str, str] = {}
+        days = series.index.normalize()
+        for day, values in series.groupby(days):
+            sha = hashlib.sha256(values.to_numpy(dtype=float).tobytes())
+            self.digests[day.date().isoformat()] = sha.hexdigest()[:16]
+
+    @classmethod
+    def from_pricing(cls, pricing: DayAheadPricing, tz: str = DEFAULT_TZ) -> "DailySpotPrices":
+        return cls(series=local_spot_prices(pricing, tz=tz).sort_index())
+
+
+def contract_days(start: datetime, end: datetime) -> List[date]:
+    """Local days touched by the hours `start <= hour < end`"""
+    if end <= start:
+        return []
+    last = (end - timedelta(hours=1)).date()
+    return [day.date() for day in pd.date_range(start.date(), last, freq="D")]
+
+
+def cost_days(
+    table: TariffTable,
+    schedule: UsageSchedule,
+    prices: DailySpotPrices,
+    days: Iterable[date],
+    *,
+    start: datetime,
+    end: datetime,
+    spot_tax_multiplier: Decimal = Decimal("1.24"),
+) -> Dict[str, Dict]:
+    """Aggregates of the given contract days, costed in one block per run of consecutive days"""
+    has_fixed = np.isin(table.plan_type, table.plan_type[table.is_fixed_monthly])
+    fixed_table = table.select(np.flatnonzero(has_fixed))
+    other_table = table.select(np.flatnonzero(~has_fixed))
+
+    by_month: Dict[Tuple[int, int], List[date]] = {}
+    for day in sorted(days):
+        by_month.setdefault((day.year, day.month), []).append(day)
+
+    aggregates = {}
+    for (year, month), month_days in by_month.items():
+        month_start = max(start, datetime(year, month, 1))
+        month_end = min(end, datetime.combine(month_days[-1], datetime.min.time()) + DAY)
+        month_index = pd.date_range(month_start, month_end, freq="h", inclusive="left")
+        fixed_prices = fixed_table.prices(month_index)
+
+        for run in _consecutive_runs(month_days):
+            run_start = max(start, datetime.combine(run[0], datetime.min.time()))
+            run_end = min(end, datetime.combine(run[-1], datetime.min.time()) + DAY)
+            first, stop = month_index.searchsorted([run_start, run_end])
+            index = month_index[first:stop]
+
+            resolved = other_table.prices(index)
+            for plan_type, type_prices in fixed_prices.items():
+                resolved[plan_type] = type_prices[first:stop]
+            tariff_prices = {plan_type: resolved[plan_type] for plan_type in table.plan_types}
+            spot = prices.series.reindex(index).to_numpy(dtype=float)
+            tariff_prices[SPOT_PLAN_TYPE] = spot * float(spot_tax_multiplier)
+            tariff = CompiledTariff(index=index, prices=tariff_prices)
+            usage = usage_vector(schedule, index)
+
+            labels = index.normalize()
+            boundaries = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1], True])
+            for day_first, day_stop in zip(boundaries[:-1], boundaries[1:]):
+                day = labels[day_first].date().isoformat()
+                aggregates[day] = _day_aggregate(
+                    tariff.slice(day_first, day_stop), usage[day_first:day_stop]
+                )
+                aggregates[day]["prices"] = prices.digests.get(day)
+
+    return aggregates
+
+
+def _consecutive_runs(days: List[date]) -> List[List[date]]:
+    """Sorted days split into runs of consecutive days"""
+    runs: List[List[date]] = []
+    for day in days:
+        if runs and day - runs[-1][-1] == DAY:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _day_aggregate(tariff: CompiledTariff, usage: np.ndarray) -> Dict:
+    summary = tariff.summarize(usage)
+    hourly_cost = np.sum(list(tariff.costs(usage).values()), axis=0)
+    peak_usage = summary["peak_usage_hour"]
+    peak_cost = summary["peak_cost_hour"]
+    return {
+        "usage_kwh": summary["total_usage_kwh"],
+        "total_cost": summary["total_cost"],
+        "cost_by_type": summary["cost_by_type"],
+        "missing_price_hours": summary["missing_price_hours"],
+        "peak_usage": [tariff.index[peak_usage].isoformat(), float(usage[peak_usage])],
+        "peak_cost": [tariff.index[peak_cost].isoformat(), float(hourly_cost[peak_cost])],
+    }
+
+
+class CustomerCostState:
+    """A customer's running summary as per-day aggregates and the totals over them"""
+
+    def __init__(
+        self,
+        *,
+        customer_id: str,
+        start: datetime,
+        end: datetime,
+        definition: str,
+        days: Optional[Dict[str, Dict]] = None,
+    ):
+        self.customer_id: str = customer_id
+        self.start: datetime = start
+        self.end: datetime = end
+        self.definition: str = definition
+        self.days: Dict[str, Dict] = {}
+        self.total_usage_kwh: float = 0.0
+        self.total_cost: float = 0.0
+        self.cost_by_type: Dict[str, float] = {}
+        self.missing_price_hours: int = 0
+        self.peak_usage: Optional[List] = None
+        self.peak_cost: Optional[List] = None
+        for day, aggregate in sorted((days or {}).items()):
+            self.apply_day(day, aggregate)
+
+    def stale_days(self, prices: DailySpotPrices) -> List[date]:
+        """Contract days never costed or costed with other spot prices than the current ones"""
+        return [
+            day
+            for day in contract_days(self.start, self.end)
+            if day.isoformat() not in self.days
+            or self.days[day.isoformat()]["prices"] != prices.digests.get(day.isoformat())
+        ]
+
+    def apply_day(self, day: str, aggregate: Dict) -> None:
+        """Replace the aggregate of `day`, updating the totals in place"""
+        previous = self.days.get(day)
+        if previous is not None:
+            self._add(previous, -1)
+        self.days[day] = aggregate
+        self._add(aggregate, 1)
+
+        if previous is not None and day in (
+            self._day_of(self.peak_usage),
+            self._day_of(self.peak_cost),
+        ):
+            self.peak_usage = self._max_peak("peak_usage")
+            self.peak_cost = self._max_peak("peak_cost")
+        else:
+            self.peak_usage = _earlier_or_higher(self.peak_usage, aggregate["peak_usage"])
+            self.peak_cost = _earlier_or_higher(self.peak_cost, aggregate["peak_cost"])
+
+    def summary(self) -> Dict:
+        """Same keys as `CompiledTariff.summarize`, with peaks as local ISO timestamps"""
+        return {
+            "total_usage_kwh": self.total_usage_kwh,
+            "total_cost": self.total_cost,
+            "cost_by_type": dict(self.cost_by_type),
+            "average_price_per_kwh": (
+                self.total_cost / self.total_usage_kwh if self.total_usage_kwh > 0 else 0.0
+            ),
+            "peak_usage_hour": self.peak_usage[0] if self.peak_usage else None,
+            "peak_cost_hour": self.peak_cost[0] if self.peak_cost else None,
+            "missing_price_hours": self.missing_price_hours,
+        }
+
+    def _add(self, aggregate: Dict, sign: int) -> None:
+        self.total_usage_kwh += sign * aggregate["usage_kwh"]
+        self.total_cost += sign * aggregate["total_cost"]
+        self.missing_price_hours += sign * aggregate["missing_price_hours"]
+        for plan_type, cost in aggregate["cost_by_type"].items():
+            self.cost_by_type[plan_type] = self.cost_by_type.get(plan_type, 0.0) + sign * cost
+
+    def _max_peak(self, key: str) -> Optional[List]:
+        peak = None
+        for day in sorted(self.days):
+            peak = _earlier_or_higher(peak, self.days[day][key])
+        return peak
+
+    @staticmethod
+    def _day_of(peak: Optional[List]) -> Optional[str]:
+        return peak[0][:10] if peak else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": STATE_VERSION,
+            "customer_id": self.customer_id,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "definition": self.definition,
+            "days": self.days,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CustomerCostState":
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported cost state version {data.get('version')}")
+        return cls(
+            customer_id=data["customer_id"],
+            start=datetime.fromisoformat(data["start"]),
+            end=datetime.fromisoformat(data["end"]),
+            definition=data["definition"],
+            days=data["days"],
+        )
+
+
+def _earlier_or_higher(current: Optional[List], candidate: List) -> List:
+    """The peak `summarize_analysis` would report: the highest value, the earliest on ties"""
+    if current is None or candidate[1] > current[1]:
+        return candidate
+    if candidate[1] == current[1] and candidate[0] < current[0]:
+        return candidate
+    return current
+
+
+class IncrementalCostStore:
+    """Directory of `CustomerCostState` JSON files, one per customer"""
+
+    def __init__(self, directory: str):
+        self.directory: str = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, customer_id: str) -> Optional[CustomerCostState]:
+        try:
+            with open(self._path(customer_id), "r") as file:
+                return CustomerCostState.from_dict(json.load(file))
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError):
+            log.warning(f"Discarding unreadable cost state of customer {customer_id}")
+            return None
+
+    def save(self, state: CustomerCostState) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(state.to_dict(), file)
+            os.replace(tmp_path, self._path(state.customer_id))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def refresh(
+        self,
+        customer_id: str,
+        calendar: ElectricityPriceCalendar,
+        schedule: UsageSchedule,
+        prices: DailySpotPrices,
+        *,
+        start: datetime,
+        end: datetime,
+        spot_tax_multiplier: Decimal = Decimal("1.24"),
+    ) -> Tuple[CustomerCostState, int]:
+        """Bring a customer's summary up to date with `prices`, returns it and the days costed
+
+        A customer without state, or whose tariff, usage or contract period changed since the
+        state was saved, is costed from scratch.
+        """
+        definition = fingerprint(
+            plans=calendar.pricing_plans,
+            schedule=schedule,
+            start=start,
+            end=end,
+            spot_tax_multiplier=spot_tax_multiplier,
+        )
+        state = self.load(customer_id)
+        if state is None or state.definition != definition:
+            state = CustomerCostState(
+                customer_id=customer_id, start=start, end=end, definition=definition
+            )
+
+        stale = state.stale_days(prices)
+        if stale:
+            aggregates = cost_days(
+                TariffTable.from_calendar(calendar),
+                schedule,
+                prices,
+                stale,
+                start=start,
+                end=end,
+                spot_tax_multiplier=spot_tax_multiplier,
+            )
+            for day, aggregate in aggregates.items():
+                state.apply_day(day, aggregate)
+            self.save(state)
+
+        log.debug(f"Customer {customer_id}: re-costed {len(stale)} days")
+        return state, len(stale)
+
+    def _path(self, customer_id: str) -> str:
+        return os.path.join(self.directory, f"customer-{customer_id}.json")
@@ -0,0 +1,264 @@
+"""Derive the `--market-file` JSON of `simulate.py` from day-ahead price history
+
+Day-ahead prices are quoted at 0.01 EUR/MWh, so every observed price maps onto an integer "tick"
+and each (month, peak) group can be kept as a table of tick counts. The tables are exact, add up
+when merged and stay small no matter how many years of history are streamed through them, which
+lets us fit min/max or any quantile in one grouped pass over chunked input.
+"""
+
+import argparse
+import json
+import logging
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.simulate import is_peak
+
+
+log = logging.getLogger(__name__)
+
+TICKS_PER_KWH = 100_000  # 0.01 EUR/MWh == 0.00001 EUR/kWh
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_TZ = "Europe/Helsinki"
+
+GroupKey = Tuple[int, bool]
+
+
+def iter_csv_price_chunks(
+    file_path: str, chunksize: int = DEFAULT_CHUNKSIZE
+) -> Iterator[pd.Series]:
+    """Stream an entso-e style `Timestamp,Price` CSV (EUR/MWh) as EUR/kWh series in UTC"""
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        index = pd.to_datetime(chunk["Timestamp"], utc=True)
+        yield pd.Series(chunk["Price"].to_numpy(dtype=float) / 1000, index=index, name="Price")
+
+
+def iter_pricing_chunks(
+    pricing: DayAheadPricing, chunksize: int = DEFAULT_CHUNKSIZE
+) -> Iterator[pd.Series]:
+    series = pricing.price_series()
+    for start in range(0, len(series), chunksize):
+        yield series.iloc[start : start + chunksize]
+
+
+class MarketModelFitter:
+    """Accumulates monthly peak/off-peak price distributions from chunks of price history"""
+
+    def __init__(self, *, tz: str = DEFAULT_TZ):
+        self.tz: str = tz
+        self.counts: Dict[GroupKey, pd.Series] = {}
+        self.last_timestamp: Optional[pd.Timestamp] = None
+
+    def update(self, prices: pd.Series) -> None:
+        """Add a chunk of EUR/kWh prices indexed by tz-aware timestamps"""
+        prices = prices.dropna()
+        if prices.empty:
+            return
+
+        local_index = prices.index.tz_convert(self.tz)
+        frame = pd.DataFrame(
+            {
+                "month": local_index.month,
+                "peak": [is_peak(hour) for hour in local_index.hour],
+                "tick": np.rint(prices.to_numpy() * TICKS_PER_KWH).astype(np.int64),
+            }
+        )
+
+        for (month, peak), counts in frame.groupby(["month", "peak"])["tick"]:
+            key = (int(month), bool(peak))
+            self._add_counts(key, counts.value_counts())
+
+        chunk_end = prices.index.max()
+        if self.last_timestamp is None or chunk_end > self.last_timestamp:
+            self.last_timestamp = chunk_end
+
+    def update_from_pricing(self, pricing: DayAheadPricing) -> int:
+        """Fit only the hours that arrived after the last fitted timestamp
+
+        Meant to be called after `DayAheadPricing.update_prices` appended new days. Corrections
+        to already fitted hours are not detected; refit from scratch if history was rewritten.
+        """
+        series = pricing.price_series()
+        if self.last_timestamp is not None:
+            series = series[series.index > self.last_timestamp]
+        self.update(series)
+        return len(series)
+
+    def merge(self, other: "MarketModelFitter") -> None:
+        if other.tz != self.tz:
+            raise ValueError("Cannot merge fitters that group by different time zones")
+        for key, counts in other.counts.items():
+            self._add_counts(key, counts)
+        if other.last_timestamp is not None and (
+            self.last_timestamp is None or other.last_timestamp > self.last_timestamp
+        ):
+            self.last_timestamp = other.last_timestamp
+
+    def to_market_data(self, quantiles: Optional[Sequence[float]] = None) -> List[Dict]:
+        """Market data in the `--market-file` format
+
+        Without `quantiles` the observed min/max is used, otherwise the (low, high) quantile pair
+        becomes the min/max of the uniform distribution `simulate.py` draws from.
+        """
+        low, high = quantiles if quantiles is not None else (0.0, 1.0)
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError(f"Invalid quantile range {quantiles}")
+
+        market_data = []
+        for month in range(1, 13):
+            if (month, True) not in self.counts or (month, False) not in self.counts:
+                log.warning(f"No peak and off-peak history for month {month}, skipping it")
+                continue
+            entry = {"month": month}
+            for label, peak in (("peak", True), ("off-peak", False)):
+                counts = self.counts[(month, peak)]
+                entry[label] = {
+                    "min": _tick_quantile(counts, low) / TICKS_PER_KWH,
+                    "max": _tick_quantile(counts, high) / TICKS_PER_KWH,
+                }
+            market_data.append(entry)
+
+        return market_data
+
+    def save(self, file_path: str) -> None:
+        state = {
+            "tz": self.tz,
+            "last_timestamp": (
+                self.last_timestamp.isoformat() if self.last_timestamp is not None else None
+            ),
+            "counts": {
+                f"{month}:{'peak' if peak else 'off-peak'}": {
+                    str(tick): int(count) for tick, count in counts.items()
+                }
+                for (month, peak), counts in self.counts.items()
+            },
+        }
+        with open(file_path, "w") as file:
+            json.dump(state, file)
+
+    @classmethod
+    def load(cls, file_path: str) -> "MarketModelFitter":
+        with open(file_path, "r") as file:
+            state = json.load(file)
+
+        fitter = cls(tz=state["tz"])
+        if state["last_timestamp"] is not None:
+            fitter.last_timestamp = pd.Timestamp(state["last_timestamp"])
+        for group, counts in state["counts"].items():
+            month, label = group.split(":")
+            fitter.counts[(int(month), label == "peak")] = pd.Series(
+                {int(tick): count for tick, count in counts.items()}, dtype=np.int64
+            ).sort_index()
+
+        return fitter
+
+    def _add_counts(self, key: GroupKey, counts: pd.Series) -> None:
+        if key in self.counts:
+            counts = self.counts[key].add(counts, fill_value=0).astype(np.int64)
+        self.counts[key] = counts.sort_index()
+
+
+def _tick_quantile(counts: pd.Series, q: float) -> int:
+    """Nearest-rank quantile of a tick count table, q=0 and q=1 are the exact min and max"""
+    cumulative = counts.cumsum().to_numpy()
+    rank = max(1, int(np.ceil(q * cumulative[-1])))
+    return int(counts.index[np.searchsorted(cumulative, rank)])
+
+
+def fit_market_data(
+    chunks: Iterator[pd.Series],
+    quantiles: Optional[Sequence[float]] = None,
+    tz: str = DEFAULT_TZ,
+) -> List[Dict]:
+    fitter = MarketModelFitter(tz=tz)
+    for chunk in chunks:
+        fitter.update(chunk)
+    return fitter.to_market_data(quantiles=quantiles)
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Fit a spot market model from price history.")
+    parser.add_argument(
+        "--prices_file", type=str, required=True, help="CSV file with Timestamp,Price history"
+    )
+    parser.add_argument(
+        "--market-file", type=str, required=True, help="JSON file to write the market data to"
+    )
+    parser.add_argument(
+        "--quantiles",
+        type=float,
+        nargs=2,
+        default=None,
+        help="Low and high quantile to use instead of the observed min and max, e.g. 0.05 0.95",
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read per chunk"
+    )
+    parser.add_argument(
+        "--state-file",
+        type=str,
+        default=None,
+        help="JSON file with fitter state, only rows newer than the saved state are fitted",
+    )
+    parser.add_argument(
+        "--tz",
+        type=str,
+        default=None,
+        help=f"Time zone of peak hours, default {DEFAULT_TZ}; must match a loaded state's zone",
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(
+    prices_file: str,
+    market_file: str,
+    quantiles: Optional[Sequence[float]] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    state_file: Optional[str] = None,
+    tz: Optional[str] = None,
+):
+    try:
+        fitter = MarketModelFitter.load(state_file) if state_file else None
+    except FileNotFoundError:
+        fitter = None
+    if fitter is None:
+        fitter = MarketModelFitter(tz=tz or DEFAULT_TZ)
+    elif tz is not None and tz != fitter.tz:
+        raise ValueError(f"State file {state_file} groups by {fitter.tz}, not {tz}")
+
+    fitted_until = fitter.last_timestamp
+    for chunk in iter_csv_price_chunks(prices_file, chunksize=chunksize):
+        if fitted_until is not None:
+            chunk = chunk[chunk.index > fitted_until]
+        fitter.update(chunk)
+
+    if state_file:
+        fitter.save(state_file)
+
+    market_data = fitter.to_market_data(quantiles=quantiles)
+    with open(market_file, "w") as file:
+        json.dump(market_data, file, indent=4)
+    return market_data
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(
+        prices_file=args.prices_file,
+        market_file=args.market_file,
+        quantiles=args.quantiles,
+        chunksize=args.chunksize,
+        state_file=args.state_file,
+        tz=args.tz,
+    )
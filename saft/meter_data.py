@@ -0,0 +1,372 @@
+"""Stream smart-meter exports and align them to the index of a `CompiledTariff`
+
+Meter exports are long CSVs of `metering_point_id,timestamp,kwh` rows, written one metering point
+after another. They are read in chunks and every metering point's rows are yielded as one series
+as soon as the point is complete, so memory use is bounded by the largest single point and not by
+the file. Each series is then aligned to the tariff index with one vectorized join:
+
+- timestamps with a UTC offset are exact instants, naive timestamps are local time in `tz`; the
+  repeated hour of the autumn DST change is then told apart by file order, its first reading is
+  the summer time hour,
+- a reading sent twice for the same instant counts once, the last one wins (corrections are
+  appended to exports),
+- readings at another resolution than the index are summed or split to match it,
+- the two readings of the repeated hour of the autumn DST change fall onto one naive local hour
+  and are summed, as both hours of energy were consumed,
+- intervals without a reading count as zero usage and are reported as missing.
+
+The aligned usage vector is costed by `CompiledTariff.summarize` directly. A portfolio of exports
+is costed with `cost_meter_files`, one file per unit of `checkpoint.run_units`, so an interrupted
+run resumes after the last file it finished.
+"""
+
+import argparse
+import csv
+import logging
+import os
+from datetime import datetime
+from decimal import Decimal
+from functools import partial
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from saft.checkpoint import CheckpointStore
+from saft.checkpoint import run_units
+from saft.compiled_tariff import compile_tariff
+from saft.compiled_tariff import CompiledTariff
+from saft.compiled_tariff import DEFAULT_TZ
+from saft.compiled_tariff import simple_calendar
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.resolution import ENERGY
+from saft.resolution import infer_resolution
+from saft.resolution import to_resolution
+from saft.result_cache import fingerprint
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNKSIZE = 100_000
+ID_COLUMN = "metering_point_id"
+TIME_COLUMN = "timestamp"
+VALUE_COLUMN = "kwh"
+
+
+def localize_readings(local: pd.DatetimeIndex, tz: str = DEFAULT_TZ) -> pd.DatetimeIndex:
+    """Naive local reading times in file order as UTC instants
+
+    The first reading of a repeated autumn DST hour is taken as summer time and any later one as
+    winter time. Local times skipped by the spring DST change raise an error.
+    """
+    summer_time = ~local.duplicated(keep="first")
+    return local.tz_localize(tz, ambiguous=summer_time).tz_convert("UTC")
+
+
+def _parse_timestamps(timestamps: pd.Series, tz: str) -> pd.DatetimeIndex:
+    """Reading times as UTC instants, naive ones are local time in `tz`"""
+    timestamps = timestamps.astype(str)
+    naive = ~timestamps.str.contains(r"(?:Z|[+-]\d{2}:?\d{2})$", regex=True).to_numpy()
+    if not naive.any():
+        return pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True, format="ISO8601"))
+    utc = pd.Series(pd.NaT, index=timestamps.index, dtype="datetime64[us, UTC]")
+    if not naive.all():
+        utc[~naive] = pd.to_datetime(timestamps[~naive], utc=True, format="ISO8601")
+    local = pd.DatetimeIndex(pd.to_datetime(timestamps[naive], format="ISO8601"))
+    utc[naive] = localize_readings(local, tz)
+    return pd.DatetimeIndex(utc)
+
+
+def iter_meter_readings(
+    file_path: str,
+    *,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    id_column: str = ID_COLUMN,
+    time_column: str = TIME_COLUMN,
+    value_column: str = VALUE_COLUMN,
+    tz: str = DEFAULT_TZ,
+) -> Iterator[Tuple[str, pd.Series]]:
+    """Yield `(metering_point_id, kWh series in UTC)` for every metering point of a meter export
+
+    The rows of a metering point must be contiguous in the file; they may span any number of
+    chunks. A point that reappears after another one has started raises a `ValueError`. Naive
+    timestamps are local time in `tz`, see `localize_readings`.
+    """
+    completed: Set[str] = set()
+    pending_id: Optional[str] = None
+    pending: list = []
+
+    def readings_of(rows: list) -> pd.Series:
+        # Parsed per metering point, so the repeated DST hour is counted across chunks
+        rows = pd.concat(rows)
+        index = _parse_timestamps(rows[time_column], tz)
+        return pd.Series(rows[value_column].to_numpy(dtype=float), index=index, name="kwh")
+
+    for chunk in pd.read_csv(
+        file_path,
+        chunksize=chunksize,
+        dtype={id_column: str, time_column: str},
+        usecols=[id_column, time_column, value_column],
+    ):
+        readings = chunk[[time_column, value_column]]
+        ids = chunk[id_column].to_numpy()
+
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        stops = np.r_[starts[1:], len(ids)]
+        for start, stop in zip(starts, stops):
+            metering_point = ids[start]
+            if metering_point == pending_id:
+                pending.append(readings.iloc[start:stop])
+                continue
+            if pending_id is not None:
+                completed.add(pending_id)
+                yield pending_id, readings_of(pending)
+            if metering_point in completed:
+                raise ValueError(f"Rows of metering point {metering_point} are not contiguous")
+            pending_id, pending = metering_point, [readings.iloc[start:stop]]
+
+    if pending_id is not None:
+        yield pending_id, readings_of(pending)
+
+
+class AlignedConsumption:
+    """A metering point's usage per interval of a naive local index"""
+
+    def __init__(
+        self,
+        *,
+        metering_point: str,
+        index: pd.DatetimeIndex,
+        usage: np.ndarray,
+        missing: np.ndarray,
+    ):
+        self.metering_point: str = metering_point
+        self.index: pd.DatetimeIndex = index
+        self.usage: np.ndarray = usage
+        self.missing: np.ndarray = missing
+
+    @property
+    def coverage(self) -> float:
+        """Share of the index intervals that have a reading"""
+        return 1 - float(self.missing.mean()) if len(self.missing) else 0.0
+
+    def get_usage(self, *, timestamp: datetime) -> Decimal:
+        """`UsageSchedule.get_usage`, so the series can also back an `ElectricityUsageAnalyzer`"""
+        try:
+            position = self.index.get_loc(pd.Timestamp(timestamp))
+        except KeyError:
+            return Decimal("0")
+        return Decimal(str(self.usage[position]))
+
+    def summarize(self, tariff: CompiledTariff) -> Dict:
+        if not tariff.index.equals(self.index):
+            raise ValueError("The consumption is aligned to a different index than the tariff")
+        summary = tariff.summarize(self.usage)
+        summary["missing_usage_hours"] = int(self.missing.sum())
+        return summary
+
+
+def align_consumption(
+    metering_point: str, readings: pd.Series, index: pd.DatetimeIndex, tz: str = DEFAULT_TZ
+) -> AlignedConsumption:
+    """Join a kWh series onto a naive local index, see the module docstring for the rules
+
+    The readings are in UTC, or naive local time in `tz` in file order.
+    """
+    if readings.index.tz is None:
+        readings = pd.Series(readings.to_numpy(), index=localize_readings(readings.index, tz))
+    # Deduplicated in file order, before sorting can reorder the repeated instants
+    readings = readings[~readings.index.duplicated(keep="last")].sort_index()
+    if len(index) > 1:
+        readings = to_resolution(readings, infer_resolution(index), ENERGY)
+
+    local = readings.index.tz_convert(tz).tz_localize(None)
+    readings = pd.Series(readings.to_numpy(), index=local).groupby(level=0).sum()
+
+    aligned = readings.reindex(index).to_numpy(dtype=float)
+    missing = np.isnan(aligned)
+    return AlignedConsumption(
+        metering_point=metering_point,
+        index=index,
+        usage=np.where(missing, 0.0, aligned),
+        missing=missing,
+    )
+
+
+def iter_aligned_consumption(
+    file_path: str,
+    index: pd.DatetimeIndex,
+    *,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    tz: str = DEFAULT_TZ,
+) -> Iterator[AlignedConsumption]:
+    for metering_point, readings in iter_meter_readings(file_path, chunksize=chunksize, tz=tz):
+        yield align_consumption(metering_point, readings, index, tz=tz)
+
+
+def cost_meter_file(
+    file_path: str,
+    tariff: CompiledTariff,
+    *,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    tz: str = DEFAULT_TZ,
+) -> Iterator[Tuple[str, Dict]]:
+    """Yield `(metering_point_id, summary)` for every metering point of a meter export"""
+    for consumption in iter_aligned_consumption(
+        file_path, tariff.index, chunksize=chunksize, tz=tz
+    ):
+        yield consumption.metering_point, consumption.summarize(tariff)
+
+
+def cost_meter_files(
+    file_paths: Sequence[str],
+    tariff: CompiledTariff,
+    *,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    tz: str = DEFAULT_TZ,
+    store: Optional[CheckpointStore] = None,
+    workers: Optional[int] = 1,
+) -> List[Tuple[str, Dict]]:
+    """`cost_meter_file` of every file in file order, resuming from `store` if given"""
+    compute = partial(_cost_whole_file, tariff=tariff, chunksize=chunksize, tz=tz)
+    return run_units(file_paths, compute, _extend, [], store=store, workers=workers)
+
+
+def _cost_whole_file(
+    file_path: str, *, tariff: CompiledTariff, chunksize: int, tz: str
+) -> List[Tuple[str, Dict]]:
+    return list(cost_meter_file(file_path, tariff, chunksize=chunksize, tz=tz))
+
+
+def _extend(summaries: List, file_summaries: List) -> List:
+    summaries.extend(file_summaries)
+    return summaries
+
+
+def _file_identity(path: str) -> List:
+    """Changes when the file is replaced or rewritten"""
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Cost smart-meter exports against spot prices.")
+    parser.add_argument(
+        "--meter_file",
+        type=str,
+        nargs="+",
+        required=True,
+        help="CSV files with metering_point_id,timestamp,kwh rows",
+    )
+    parser.add_argument(
+        "--prices_file", type=str, required=True, help="CSV file with Timestamp,Price history"
+    )
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, required=True, help="First hour to cost"
+    )
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, required=True, help="End of the costed period"
+    )
+    parser.add_argument(
+        "--transfer_price", type=Decimal, default=Decimal("0"), help="Transfer price per kwh"
+    )
+    parser.add_argument(
+        "--monthly_fee", type=Decimal, default=Decimal("0"), help="Fixed monthly fee"
+    )
+    parser.add_argument(
+        "--output", type=str, required=True, help="CSV file for one summary row per meter"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Meter rows read at a time"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, one file each")
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default=None,
+        help="Directory for checkpoints to resume an interrupted run from",
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(
+    meter_file: Union[str, Sequence[str]],
+    prices_file: str,
+    start: datetime,
+    end: datetime,
+    output: str,
+    transfer_price: Decimal = Decimal("0"),
+    monthly_fee: Decimal = Decimal("0"),
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    workers: Optional[int] = 1,
+    checkpoint_dir: Optional[str] = None,
+) -> int:
+    meter_files = [meter_file] if isinstance(meter_file, str) else list(meter_file)
+    pricing = DayAheadPricing.from_csv(prices_file, country_code="FI")
+    calendar = simple_calendar(
+        start=start, end=end, transfer_price=transfer_price, monthly_fee=monthly_fee
+    )
+    index = pd.date_range(start=start, end=end, freq="h", inclusive="left")
+    tariff = compile_tariff(calendar, index, pricing=pricing)
+
+    store = None
+    if checkpoint_dir is not None:
+        key = fingerprint(
+            kind="meter_data",
+            meter_files=[_file_identity(path) for path in meter_files],
+            prices_file=_file_identity(prices_file),
+            start=start,
+            end=end,
+            transfer_price=transfer_price,
+            monthly_fee=monthly_fee,
+        )
+        store = CheckpointStore(checkpoint_dir, key)
+    summaries = cost_meter_files(
+        meter_files, tariff, chunksize=chunksize, store=store, workers=workers
+    )
+
+    fieldnames = [
+        "metering_point_id",
+        "total_usage_kwh",
+        "total_cost",
+        "average_price_per_kwh",
+        *[f"cost_{plan_type}" for plan_type in tariff.prices],
+        "missing_price_hours",
+        "missing_usage_hours",
+    ]
+    with open(output, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for metering_point, summary in summaries:
+            row = {key: value for key, value in summary.items() if key in fieldnames}
+            row.update({f"cost_{k}": v for k, v in summary["cost_by_type"].items()})
+            writer.writerow({"metering_point_id": metering_point, **row})
+
+    log.info(f"Costed {len(summaries)} metering points into {output}")
+    return len(summaries)
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(
+        meter_file=args.meter_file,
+        prices_file=args.prices_file,
+        start=args.start,
+        end=args.end,
+        output=args.output,
+        transfer_price=args.transfer_price,
+        monthly_fee=args.monthly_fee,
+        chunksize=args.chunksize,
+        workers=args.workers,
+        checkpoint_dir=args.checkpoint_dir,
+    )
@@ -0,0 +1,90 @@
+"""Month-partitioned `analyze_period` across a process pool
+
+Fixed monthly charges are decided per (year, month) and every analysis starts without charge
+state, so each month of a period can be analyzed on its own. Workers return a `PartialSummary`
+instead of the hourly rows, and merging the partial summaries in calendar order gives exactly
+the summary of a sequential `analyze_period` + `summarize_analysis`, peaks included.
+
+The Decimal context is per thread and not inherited by worker processes, so a copy of the whole
+context (precision, rounding, ...) is passed along to every worker.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from decimal import Context
+from decimal import getcontext
+from decimal import localcontext
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+from saft.ratepayer_model import HOUR
+from saft.ratepayer_model import PartialSummary
+
+
+def month_partitions(
+    start: datetime, end: datetime, resolution: timedelta = HOUR
+) -> List[Tuple[datetime, datetime]]:
+    """Split `[start, end)` at month starts, rounded up onto the `start + n * resolution` grid"""
+    boundaries = [start]
+    month_start = datetime(start.year, start.month, 1)
+    while True:
+        month_start = datetime(
+            month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1
+        )
+        if month_start >= end:
+            break
+        steps = -(-(month_start - start) // resolution)  # ceil
+        boundary = start + steps * resolution
+        if boundaries[-1] < boundary < end:
+            boundaries.append(boundary)
+    boundaries.append(end)
+    return [(a, b) for a, b in zip(boundaries[:-1], boundaries[1:]) if a < b]
+
+
+def summarize_partition(
+    analyzer: ElectricityUsageAnalyzer,
+    start: datetime,
+    end: datetime,
+    resolution: timedelta = HOUR,
+    context: Optional[Context] = None,
+) -> PartialSummary:
+    """The partial summary of `[start, end)`, in `context` if given"""
+    with localcontext(context):
+        summary = PartialSummary()
+        summary.update(analyzer.iter_period(start, end, resolution))
+    return summary
+
+
+def parallel_summarize(
+    analyzer: ElectricityUsageAnalyzer,
+    start: datetime,
+    end: datetime,
+    *,
+    resolution: timedelta = HOUR,
+    workers: Optional[int] = None,
+) -> Dict:
+    """`summarize_analysis(analyze_period(start, end))`, one month per task
+
+    `workers=1` runs the partitions in this process.
+    """
+    partitions = month_partitions(start, end, resolution)
+    context = getcontext().copy()
+    merged = PartialSummary()
+
+    if workers == 1:
+        for a, b in partitions:
+            merged = merged.merge(summarize_partition(analyzer, a, b, resolution))
+        return merged.to_summary()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(summarize_partition, analyzer, a, b, resolution, context)
+            for a, b in partitions
+        ]
+        for future in futures:
+            merged = merged.merge(future.result())
+    return merged.to_summary()
@@ -0,0 +1,359 @@
+"""Spot price scenarios conditioned on wind and solar forecasts
+
+The model predicts the hourly price from calendar features, the forecasts averaged to hours and
+the prices of the same hour one day and one week earlier. It is fitted once and the fitted model
+can be cached on disk with `ResultCache`.
+
+Scenarios are generated for all paths at once. A lag of at least 24 hours means that the prices
+of one day only depend on earlier days, so each day of every path is predicted in a single
+`predict` call, and a year of scenarios costs 365 calls whether it has one path or thousands.
+Noise is added by bootstrapping whole days of out-of-fold residuals, which keeps the shape of a
+day's errors.
+
+`ScenarioBank.simulate_spot_prices_by_hour` draws one of the generated paths with `random`, so it
+replaces `simulate.simulate_spot_prices_by_hour` in code that seeds `random` before every run.
+"""
+
+import argparse
+import json
+import logging
+import random
+from datetime import datetime
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.model_selection import cross_val_predict
+from sklearn.model_selection import KFold
+
+from saft.compiled_tariff import DEFAULT_TZ
+from saft.market_fit import iter_csv_price_chunks
+from saft.ratepayer_model import HOUR
+from saft.resolution import PRICE
+from saft.resolution import to_resolution
+from saft.result_cache import fingerprint
+from saft.result_cache import ResultCache
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LAGS = (24, 168)
+DEFAULT_MAX_ITER = 200
+DEFAULT_FOLDS = 5
+CALENDAR_FEATURES = ["hour", "day_of_week", "month", "is_weekend", "is_peak"]
+
+
+def _utc_index(index: pd.Index) -> pd.DatetimeIndex:
+    """Naive timestamps are taken as UTC, like `DayAheadPricing.price_series`"""
+    return pd.DatetimeIndex(pd.to_datetime(index, utc=True))
+
+
+def hourly_prices(prices: pd.Series) -> pd.Series:
+    prices = prices.dropna()
+    prices.index = _utc_index(prices.index)
+    return to_resolution(prices.sort_index(), HOUR, PRICE)
+
+
+def calendar_features(index: pd.DatetimeIndex, tz: str = DEFAULT_TZ) -> np.ndarray:
+    local = index.tz_convert(tz)
+    hour = local.hour.to_numpy()
+    day_of_week = local.weekday.to_numpy()
+    peak = ((6 <= hour) & (hour <= 9)) | ((17 <= hour) & (hour <= 20))
+    return np.column_stack([hour, day_of_week, local.month.to_numpy(), day_of_week >= 5, peak])
+
+
+def forecast_features(forecasts: pd.DataFrame, index: pd.DatetimeIndex) -> np.ndarray:
+    """Forecasts of any resolution averaged or repeated to the hours of `index`, NaN if missing"""
+    columns = []
+    for column in forecasts.columns:
+        series = forecasts[column].dropna()
+        series.index = _utc_index(series.index)
+        columns.append(to_resolution(series.sort_index(), HOUR, PRICE).reindex(index))
+    return np.column_stack([column.to_numpy(dtype=float) for column in columns])
+
+
+def lagged_prices(
+    prices: pd.Series, index: pd.DatetimeIndex, lags: Sequence[int] = DEFAULT_LAGS
+) -> np.ndarray:
+    return np.column_stack(
+        [prices.reindex(index - pd.Timedelta(hours=lag)).to_numpy(dtype=float) for lag in lags]
+    )
+
+
+def scenario_index(start: datetime, hours: int, tz: str = DEFAULT_TZ) -> pd.DatetimeIndex:
+    """`hours` consecutive UTC hours from the naive local time `start`"""
+    first = pd.Timestamp(start).tz_localize(tz).tz_convert("UTC")
+    return pd.date_range(first, periods=hours, freq="h")
+
+
+class PriceModel:
+    def __init__(
+        self,
+        *,
+        estimator: HistGradientBoostingRegressor,
+        tz: str,
+        forecast_columns: List[str],
+        lags: Sequence[int],
+        residual_days: np.ndarray,
+    ):
+        self.estimator: HistGradientBoostingRegressor = estimator
+        self.tz: str = tz
+        self.forecast_columns: List[str] = forecast_columns
+        self.lags: Tuple[int, ...] = tuple(lags)
+        # Out-of-fold residuals of complete local days, one row per day and column per hour
+        self.residual_days: np.ndarray = residual_days
+
+    @property
+    def feature_names(self) -> List[str]:
+        return (
+            CALENDAR_FEATURES + self.forecast_columns + [f"price_lag_{lag}h" for lag in self.lags]
+        )
+
+    def static_features(self, index: pd.DatetimeIndex, forecasts: pd.DataFrame) -> np.ndarray:
+        """Features that do not depend on the simulated prices"""
+        return np.hstack(
+            [
+                calendar_features(index, self.tz),
+                forecast_features(forecasts[self.forecast_columns], index),
+            ]
+        )
+
+    def predict(
+        self, index: pd.DatetimeIndex, forecasts: pd.DataFrame, prices: pd.Series
+    ) -> np.ndarray:
+        """Expected prices of `index` given the actual prices of the lagged hours"""
+        features = np.hstack(
+            [
+                self.static_features(index, forecasts),
+                lagged_prices(hourly_prices(prices), index, self.lags),
+            ]
+        )
+        return self.estimator.predict(features)
+
+    def scenarios(
+        self,
+        index: pd.DatetimeIndex,
+        forecasts: pd.DataFrame,
+        history: pd.Series,
+        n_paths: int,
+        rng: Optional[np.random.Generator] = None,
+    ) -> np.ndarray:
+        """`n_paths` price paths (rows) over the consecutive UTC hours of `index` (columns)
+
+        `forecasts` has to cover every hour of `index` and `history` the longest lag before it.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        if ((index[1:] - index[:-1]) != pd.Timedelta(HOUR)).any():
+            raise ValueError("Scenarios need consecutive hours")
+        static = self.static_features(index, forecasts)
+        if np.isnan(static).any():
+            raise ValueError(f"Forecasts do not cover all hours from {index[0]} to {index[-1]}")
+
+        max_lag, block = max(self.lags), min(self.lags)
+        known = hourly_prices(history).reindex(
+            pd.date_range(index[0] - max_lag * HOUR, periods=max_lag, freq="h")
+        )
+        if known.isna().any():
+            raise ValueError(f"Price history does not cover the {max_lag} hours before {index[0]}")
+
+        paths = np.empty((n_paths, max_lag + len(index)))
+        paths[:, :max_lag] = known.to_numpy(dtype=float)
+        local_hour = index.tz_convert(self.tz).hour.to_numpy()
+        for first in range(0, len(index), block):
+            hours = np.arange(first, min(first + block, len(index)))
+            columns = max_lag + hours
+            features = np.concatenate(
+                [
+                    np.broadcast_to(static[hours], (n_paths, len(hours), static.shape[1])),
+                    np.stack([paths[:, columns - lag] for lag in self.lags], axis=-1),
+                ],
+                axis=-1,
+            )
+            predicted = self.estimator.predict(features.reshape(n_paths * len(hours), -1))
+            days = rng.integers(len(self.residual_days), size=n_paths)
+            paths[:, columns] = (
+                predicted.reshape(n_paths, len(hours))
+                + self.residual_days[days[:, np.newaxis], local_hour[hours]]
+            )
+        return paths[:, max_lag:]
+
+
+def _residual_days(residuals: pd.Series, tz: str) -> np.ndarray:
+    local = residuals.index.tz_convert(tz)
+    frame = pd.DataFrame({"date": local.date, "hour": local.hour, "residual": residuals.to_numpy()})
+    days = frame.pivot_table(index="date", columns="hour", values="residual", aggfunc="first")
+    return days.reindex(columns=range(24)).dropna().to_numpy()
+
+
+def fit_price_model(
+    prices: pd.Series,
+    forecasts: pd.DataFrame,
+    *,
+    tz: str = DEFAULT_TZ,
+    lags: Sequence[int] = DEFAULT_LAGS,
+    max_iter: int = DEFAULT_MAX_ITER,
+    folds: int = DEFAULT_FOLDS,
+    random_state: int = 0,
+) -> PriceModel:
+    """Fit on every hour of `prices` (EUR/kWh) with all features available"""
+    prices = hourly_prices(prices)
+    model = PriceModel(
+        estimator=HistGradientBoostingRegressor(max_iter=max_iter, random_state=random_state),
+        tz=tz,
+        forecast_columns=list(forecasts.columns),
+        lags=lags,
+        residual_days=np.empty((0, 24)),
+    )
+    index = prices.index
+    features = np.hstack(
+        [model.static_features(index, forecasts), lagged_prices(prices, index, model.lags)]
+    )
+    complete = ~np.isnan(features).any(axis=1)
+    if not complete.any():
+        raise ValueError("No hour has prices, forecasts and lagged prices to fit on")
+    features, target = features[complete], prices.to_numpy()[complete]
+    log.info(f"Fitting price model on {len(target)} hours")
+
+    # Contiguous folds, so residuals are not fitted on the neighbouring hours of the same day
+    out_of_fold = cross_val_predict(model.estimator, features, target, cv=KFold(n_splits=folds))
+    residuals = pd.Series(target - out_of_fold, index=index[complete])
+    model.residual_days = _residual_days(residuals, tz)
+    if not len(model.residual_days):
+        raise ValueError("Fitting needs at least one complete day of prices")
+    model.estimator.fit(features, target)
+    return model
+
+
+def cached_fit_price_model(
+    cache: ResultCache, prices: pd.Series, forecasts: pd.DataFrame, **params
+) -> Tuple[PriceModel, bool]:
+    """`fit_price_model` that is only run for data and parameters it has not seen before"""
+    key = fingerprint(
+        kind="price_model",
+        sklearn=sklearn.__version__,
+        prices=prices,
+        forecasts=forecasts,
+        params=params,
+    )
+    return cache.get_or_compute(key, lambda: fit_price_model(prices, forecasts, **params))
+
+
+class ScenarioBank:
+    """Generated price paths, handed out like `simulate.simulate_spot_prices_by_hour` paths"""
+
+    def __init__(self, paths: np.ndarray):
+        self.paths: np.ndarray = paths
+
+    @classmethod
+    def generate(
+        cls,
+        model: PriceModel,
+        index: pd.DatetimeIndex,
+        forecasts: pd.DataFrame,
+        history: pd.Series,
+        *,
+        n_paths: int,
+        rng: Optional[np.random.Generator] = None,
+    ) -> "ScenarioBank":
+        return cls(model.scenarios(index, forecasts, history, n_paths, rng))
+
+    def simulate_spot_prices_by_hour(self, market_data=None, num_hours=8760) -> List[float]:
+        """One path drawn with `random`; `market_data` is unused, the model replaces it"""
+        if num_hours > self.paths.shape[1]:
+            raise ValueError(f"Scenarios only cover {self.paths.shape[1]} hours")
+        return self.paths[random.randrange(len(self.paths)), :num_hours].tolist()
+
+
+def load_forecasts(file_path: str) -> pd.DataFrame:
+    """`Timestamp,<forecast>,...` CSV, e.g. solar and wind generation forecasts in MW"""
+    forecasts = pd.read_csv(file_path, index_col="Timestamp")
+    forecasts.index = _utc_index(forecasts.index)
+    return forecasts.astype(float)
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Spot price scenarios from forecasts.")
+    parser.add_argument(
+        "--prices_file", type=str, required=True, help="CSV file with Timestamp,Price history"
+    )
+    parser.add_argument(
+        "--forecasts_file",
+        type=str,
+        required=True,
+        help="CSV file with Timestamp and one column per forecast, history and scenario hours",
+    )
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, required=True, help="First simulated hour"
+    )
+    parser.add_argument("--hours", type=int, default=8760, help="Number of simulated hours")
+    parser.add_argument("--paths", type=int, default=1000, help="Number of price paths")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for RNG")
+    parser.add_argument(
+        "--cache-dir", type=str, default=None, help="Directory for caching the fitted model"
+    )
+    parser.add_argument("--output", type=str, default=None, help="CSV file for the price paths")
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(
+    prices_file: str,
+    forecasts_file: str,
+    start: datetime,
+    hours: int = 8760,
+    paths: int = 1000,
+    seed: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    output: Optional[str] = None,
+    tz: str = DEFAULT_TZ,
+) -> Dict:
+    index = scenario_index(start, hours, tz)
+    prices = pd.concat(iter_csv_price_chunks(prices_file))
+    history = prices[prices.index < index[0]]  # Fit only on what was known before the start
+    forecasts = load_forecasts(forecasts_file)
+
+    if cache_dir is None:
+        model, hit = fit_price_model(history, forecasts, tz=tz), False
+    else:
+        model, hit = cached_fit_price_model(ResultCache(cache_dir), history, forecasts, tz=tz)
+    scenarios = model.scenarios(index, forecasts, history, paths, np.random.default_rng(seed))
+
+    path_means = scenarios.mean(axis=1)
+    summary = {
+        "paths": paths,
+        "hours": hours,
+        "mean_price": float(scenarios.mean()),
+        "p5_mean_price": float(np.percentile(path_means, 5)),
+        "p50_mean_price": float(np.percentile(path_means, 50)),
+        "p95_mean_price": float(np.percentile(path_means, 95)),
+    }
+    if cache_dir is not None:
+        summary["cache"] = "hit" if hit else "miss"
+    if output is not None:
+        frame = pd.DataFrame(scenarios.T, index=index, columns=[f"path_{i}" for i in range(paths)])
+        frame.to_csv(output, index_label="Timestamp")
+
+    print(json.dumps(summary, indent=4))
+    return summary
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(
+        prices_file=args.prices_file,
+        forecasts_file=args.forecasts_file,
+        start=args.start,
+        hours=args.hours,
+        paths=args.paths,
+        seed=args.seed,
+        cache_dir=args.cache_dir,
+        output=args.output,
+    )
@@ -0,0 +1,310 @@
+"""Local HTTP/JSON quote service that keeps prices and compiled tariffs in memory
+
+The service compiles the price calendar and day-ahead prices once at startup and answers
+
+* `POST /quote` with `{"start": "2023-01-01T00:00:00", "usage_kwh": [0.5, 0.4, ...]}`, hourly
+  usage in naive local time, returning the same summary as `CompiledTariff.summarize`,
+* `GET /metrics` with request counts and latency percentiles,
+* `GET /health`.
+
+Evaluation runs in a thread pool so the event loop keeps accepting connections, and requests
+beyond `max_pending` in flight are rejected with 503 instead of queueing without bound. A
+failure other than a bad request is logged and answered with 500, keeping the connection open.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from saft.compiled_tariff import compile_tariff
+from saft.compiled_tariff import CompiledTariff
+from saft.compiled_tariff import simple_calendar
+from saft.ratepayer_old_model import DayAheadPricing
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 64
+MAX_BODY_BYTES = 16 * 1024 * 1024
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class QuoteError(Exception):
+    """A request that cannot be quoted, reported to the client as 400"""
+
+
+class LatencyMetrics:
+    def __init__(self, window: int = 4096):
+        self.latencies_ms: deque = deque(maxlen=window)
+        self.requests: int = 0
+        self.errors: int = 0
+        self.rejected: int = 0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.latencies_ms.append(seconds * 1000)
+
+    def snapshot(self, in_flight: int) -> Dict:
+        latencies = np.array(self.latencies_ms, dtype=float)
+        percentiles = (
+            dict(zip(("p50_ms", "p95_ms", "p99_ms"), np.percentile(latencies, [50, 95, 99])))
+            if latencies.size
+            else {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+        )
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "in_flight": in_flight,
+            **{k: (float(v) if v is not None else None) for k, v in percentiles.items()},
+        }
+
+
+class QuoteService:
+    """Costs posted hourly usage profiles against a tariff compiled once at startup"""
+
+    def __init__(self, tariff: CompiledTariff):
+        self.tariff: CompiledTariff = tariff
+
+    def quote(self, payload: Dict) -> Dict:
+        try:
+            start = datetime.fromisoformat(payload["start"])
+            usage = np.asarray(payload["usage_kwh"], dtype=float)
+        except (KeyError, TypeError, ValueError) as e:
+            raise QuoteError(f"Expected 'start' timestamp and 'usage_kwh' list: {e}")
+        if usage.ndim != 1 or usage.size == 0:
+            raise QuoteError("'usage_kwh' must be a non-empty list of numbers")
+
+        try:
+            first = self.tariff.position(start)
+        except ValueError as e:
+            raise QuoteError(str(e))
+        if first + usage.size > len(self.tariff.index):
+            raise QuoteError("Usage profile extends past the compiled period")
+
+        # Charges fixed monthly fees from the quoted start, not from the compiled one
+        tariff = self.tariff.window(first, first + usage.size)
+        summary = tariff.summarize(usage)
+        for key in ("peak_usage_hour", "peak_cost_hour"):
+            summary[key] = tariff.index[summary[key]].isoformat()
+        return summary
+
+
+class QuoteServer:
+    def __init__(
+        self,
+        service: QuoteService,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        workers: Optional[int] = None,
+    ):
+        self.service: QuoteService = service
+        self.host: str = host
+        self.port: int = port
+        self.max_pending: int = max_pending
+        self.metrics: LatencyMetrics = LatencyMetrics()
+        self.in_flight: int = 0
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info(f"Quote server listening on {self.host}:{self.port}")
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if body is None:
+                    status, response = 413, {"error": "Request body too large"}
+                    keep_alive = False
+                else:
+                    status, response = await self._dispatch(method, path, body)
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], Optional[bytes]]]:
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            return method, path, headers, None
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics.snapshot(self.in_flight)
+        if method != "POST" or path != "/quote":
+            return 404, {"error": f"No route for {method} {path}"}
+
+        if self.in_flight >= self.max_pending:
+            self.metrics.rejected += 1
+            return 503, {"error": "Too many requests in flight, retry later"}
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        ok = False
+        try:
+            payload = json.loads(body)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, self.service.quote, payload)
+            ok = True
+            return 200, result
+        except (QuoteError, json.JSONDecodeError) as e:
+            return 400, {"error": str(e)}
+        except Exception:
+            log.exception(f"Failed to answer {method} {path}")
+            return 500, {"error": "Internal server error"}
+        finally:
+            self.in_flight -= 1
+            self.metrics.record(time.perf_counter() - started, ok)
+
+    @staticmethod
+    def _write_response(
+        writer: asyncio.StreamWriter, status: int, response: Dict, keep_alive: bool
+    ) -> None:
+        body = json.dumps(response).encode()
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Serve electricity cost quotes over HTTP.")
+    parser.add_argument(
+        "--prices_file", type=str, required=True, help="CSV file with Timestamp,Price history"
+    )
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, required=True, help="First quotable hour"
+    )
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, required=True, help="End of quotable period"
+    )
+    parser.add_argument(
+        "--transfer_price", type=Decimal, default=Decimal("0"), help="Transfer price per kwh"
+    )
+    parser.add_argument(
+        "--monthly_fee", type=Decimal, default=Decimal("0"), help="Fixed monthly fee"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8080, help="Port to bind")
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=DEFAULT_MAX_PENDING,
+        help="Requests in flight before new ones are rejected",
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+async def main(
+    prices_file: str,
+    start: datetime,
+    end: datetime,
+    transfer_price: Decimal = Decimal("0"),
+    monthly_fee: Decimal = Decimal("0"),
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    max_pending: int = DEFAULT_MAX_PENDING,
+):
+    pricing = DayAheadPricing.from_csv(prices_file, country_code="FI")
+    calendar = simple_calendar(
+        start=start, end=end, transfer_price=transfer_price, monthly_fee=monthly_fee
+    )
+    index = pd.date_range(start=start, end=end, freq="h", inclusive="left")
+    tariff = compile_tariff(calendar, index, pricing=pricing)
+
+    server = QuoteServer(QuoteService(tariff), host=host, port=port, max_pending=max_pending)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    asyncio.run(
+        main(
+            prices_file=args.prices_file,
+            start=args.start,
+            end=args.end,
+            transfer_price=args.transfer_price,
+            monthly_fee=args.monthly_fee,
+            host=args.host,
+            port=args.port,
+            max_pending=args.max_pending,
+        )
+    )
@@ -34,20 +34,26 @@ def get_distribution_price(distributor: Distributor, dt: datetime) -> PreciseAmo
 
 
 def calculate_total_cost(
-    rate: Rate, start_date: datetime, end_date: datetime, hourly_usage: Decimal
+    rate: Rate, start_date: datetime, end_date: datetime, hourly_usage: Decimal, freq: str = "h"
 ) -> PriceBreakdown:
+    """Cost of a flat `hourly_usage` (kWh per hour) priced per interval of `freq`
+
+    Use `freq="15min"` with day-ahead prices published per 15-minute market time unit.
+    """
     energy_cost = PreciseAmount(amount=Decimal("0"))
     distribution_cost = PreciseAmount(amount=Decimal("0"))
 
-    date_range = pd.date_range(start=start_date, end=end_date, freq="h", tz="Europe/Helsinki")
+    date_range = pd.date_range(start=start_date, end=end_date, freq=freq, tz="Europe/Helsinki")
+    interval_hours = Decimal(int(pd.Timedelta(date_range.freq).total_seconds())) / 3600
+    interval_usage = hourly_usage * interval_hours
 
     for dt in date_range:
         try:
             energy_price = rate.supplier.day_ahead_pricing.get_price(dt)
             distribution_price = get_distribution_price(rate.distributor, dt)
 
-            energy_cost.amount += energy_price.amount * hourly_usage
-            distribution_cost.amount += distribution_price.amount * hourly_usage
+            energy_cost.amount += energy_price.amount * interval_usage
+            distribution_cost.amount += distribution_price.amount * interval_usage
         except ValueError:
             print(f"Warning: Price not available for {dt}")
 
@@ -69,5 +75,5 @@ def calculate_total_cost(
         total_distribution_cost=PreciseAmount(amount=total_distribution_cost),
         total_without_tax=PreciseAmount(amount=total_without_tax),
         total_with_tax=PreciseAmount(amount=total_with_tax),
-        total_usage=hourly_usage * len(date_range),
+        total_usage=interval_usage * len(date_range),
     )
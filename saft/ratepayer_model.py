@@ -3,7 +3,12 @@ from datetime import datetime
 from datetime import time
 from datetime import timedelta
 from decimal import Decimal
+from decimal import getcontext
+from decimal import localcontext
+from decimal import MAX_PREC
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 
@@ -13,6 +18,8 @@ from saft.ratepayer_old_model import PreciseAmount
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+HOUR = timedelta(hours=1)
+
 
 class TimeRange:
     def __init__(self, *, start: time, end: time):
@@ -127,7 +134,14 @@ class ElectricityPriceCalendar:
             self.pricing_plans[plan.plan_type] = []
         self.pricing_plans[plan.plan_type].append(plan)
 
-    def get_price(self, *, timestamp: datetime) -> Dict[str, Dict[str, Decimal]]:
+    def get_price(
+        self, *, timestamp: datetime, resolution: timedelta = HOUR
+    ) -> Dict[str, Dict[str, Decimal]]:
+        """Unit prices of the interval starting at `timestamp`
+
+        Fixed monthly charges are priced per hour of usage, so at sub-hourly resolutions their
+        unit price is scaled up by the number of intervals per hour and the charge stays the same.
+        """
         prices_without_tax = {}
         prices_with_tax = {}
 
@@ -136,6 +150,10 @@ class ElectricityPriceCalendar:
                 if self._plan_applies(plan=plan, timestamp=timestamp):
                     if plan.is_fixed_monthly:
                         fixed_charge = self._get_fixed_monthly_charge(plan, timestamp)
+                        if resolution != HOUR:
+                            fixed_charge *= Decimal(int(HOUR.total_seconds())) / Decimal(
+                                int(resolution.total_seconds())
+                            )
                         prices_without_tax[plan_type] = fixed_charge
                         prices_with_tax[plan_type] = fixed_charge * plan.tax_multiplier.amount
                     else:
@@ -151,10 +169,15 @@ class ElectricityPriceCalendar:
 
         return {"without_tax": prices_without_tax, "with_tax": prices_with_tax}
 
+    def reset_fixed_charges(self) -> None:
+        """Forget which months were charged, so the next `get_price` charges its month again"""
+        self.last_fixed_charge_date.clear()
+
     def _get_fixed_monthly_charge(self, plan: PricingPlan, timestamp: datetime) -> Decimal:
-        if (
-            plan.plan_type not in self.last_fixed_charge_date
-            or self.last_fixed_charge_date[plan.plan_type].month != timestamp.month
+        last_charged = self.last_fixed_charge_date.get(plan.plan_type)
+        if last_charged is None or (last_charged.year, last_charged.month) != (
+            timestamp.year,
+            timestamp.month,
         ):
             self.last_fixed_charge_date[plan.plan_type] = timestamp
             return plan.price.amount
@@ -189,73 +212,149 @@ class ElectricityUsageAnalyzer:
         self.price_calendar = price_calendar
         self.usage_schedule = usage_schedule
 
-    def analyze_period(self, start: datetime, end: datetime) -> List[Dict]:
-        current = start
-        results = []
-
+    def analyze_period(
+        self, start: datetime, end: datetime, resolution: timedelta = HOUR
+    ) -> List[Dict]:
         log.debug(f"Starting analysis from {start} to {end}")
 
+        results = list(self.iter_period(start, end, resolution))
+
+        log.debug(f"Analysis completed, {len(results)} intervals analyzed")
+
+        return results
+
+    def iter_period(
+        self, start: datetime, end: datetime, resolution: timedelta = HOUR
+    ) -> Iterator[Dict]:
+        """Yields the intervals of `analyze_period` one at a time, for consumers that stream them
+
+        Usage patterns are defined in kWh per hour, so at sub-hourly resolutions (e.g. 15-minute
+        market time units) each interval's usage is the hourly usage scaled by its length.
+
+        Every analysis charges fixed monthly plans on the first applicable interval of each month
+        it covers, the same amount at every resolution, independent of earlier analyses, so any
+        month-aligned part of a period is analyzed exactly as in a run over the whole period.
+        """
+        self.price_calendar.reset_fixed_charges()
+        current = start
+        scale = Decimal(int(resolution.total_seconds())) / Decimal(int(HOUR.total_seconds()))
+
         while current < end:
             usage = self.usage_schedule.get_usage(timestamp=current)
-            prices = self.price_calendar.get_price(timestamp=current)
+            if resolution != HOUR:
+                usage *= scale
+            prices = self.price_calendar.get_price(timestamp=current, resolution=resolution)
 
             # log.debug(f"Analyzing {current}: usage={usage}, prices={prices}")
 
-            hour_data = {
+            yield {
                 "timestamp": current,
                 "usage_kwh": usage,
                 "prices": prices["with_tax"],
                 "cost": {k: v * usage for k, v in prices["with_tax"].items()},
             }
 
-            results.append(hour_data)
-            current += timedelta(hours=1)
+            current += resolution
 
-        log.debug(f"Analysis completed, {len(results)} hours analyzed")
+    def summarize_analysis(self, analysis: List[Dict]) -> Dict:
+        log.debug(f"Summarizing {len(analysis)} hours of data")
 
-        return results
+        summary = PartialSummary()
+        summary.update(analysis)
+        summary = summary.to_summary()
 
-    def summarize_analysis(self, analysis: List[Dict]) -> Dict:
-        summary = {
-            "total_usage_kwh": Decimal("0"),
-            "total_cost": PreciseAmount(amount=Decimal("0")),
-            "cost_by_type": {},
-            "average_price_per_kwh": PreciseAmount(amount=Decimal("0")),
-            "peak_usage_hour": None,
-            "peak_cost_hour": None,
-        }
+        log.debug(f"Summary completed. Total usage: {summary['total_usage_kwh']} kWh")
+        log.debug(f"Total cost: {summary['total_cost'].amount}")
+        log.debug(f"Cost by type: {summary['cost_by_type']}")
 
-        log.debug(f"Summarizing {len(analysis)} hours of data")
+        return summary
 
+
+class PartialSummary:
+    """Totals and peaks of a run of consecutive analyzed intervals
+
+    Sums are kept exact and only rounded to the context precision by `to_summary`, so the partial
+    summaries of consecutive parts of a period `merge` into exactly the summary of the whole.
+    Peaks are positions within the run; on ties the earliest interval wins.
+    """
+
+    def __init__(self):
+        self.intervals: int = 0
+        self.total_usage_kwh: Decimal = Decimal("0")
+        self.total_cost: Decimal = Decimal("0")
+        self.cost_by_type: Dict[str, Decimal] = {}
+        self.peak_usage_hour: Optional[int] = None
+        self.peak_usage_kwh: Optional[Decimal] = None
+        self.peak_cost_hour: Optional[int] = None
+        self.peak_cost: Optional[Decimal] = None
+
+    def update(self, analysis: Iterable[Dict]) -> None:
+        # Additions are exact, the sums only grow by the digits added. `analysis` may be a lazy
+        # `iter_period`, so its intervals must still be priced in the caller's context.
+        exact = getcontext().copy()
+        exact.prec = MAX_PREC
         for hour_data in analysis:
-            summary["total_usage_kwh"] += hour_data["usage_kwh"]
-            summary["total_cost"].amount += hour_data["cost"]["total"]
+            self.total_usage_kwh = exact.add(self.total_usage_kwh, hour_data["usage_kwh"])
+            self.total_cost = exact.add(self.total_cost, hour_data["cost"]["total"])
 
             for cost_type, cost in hour_data["cost"].items():
                 if cost_type != "total":
-                    summary["cost_by_type"][cost_type] = (
-                        summary["cost_by_type"].get(cost_type, Decimal("0")) + cost
+                    self.cost_by_type[cost_type] = exact.add(
+                        self.cost_by_type.get(cost_type, Decimal("0")), cost
                     )
 
-            if (
-                summary["peak_usage_hour"] is None
-                or hour_data["usage_kwh"] > analysis[summary["peak_usage_hour"]]["usage_kwh"]
-            ):
-                summary["peak_usage_hour"] = analysis.index(hour_data)
+            if self.peak_usage_hour is None or hour_data["usage_kwh"] > self.peak_usage_kwh:
+                self.peak_usage_hour = self.intervals
+                self.peak_usage_kwh = hour_data["usage_kwh"]
+
+            if self.peak_cost_hour is None or hour_data["cost"]["total"] > self.peak_cost:
+                self.peak_cost_hour = self.intervals
+                self.peak_cost = hour_data["cost"]["total"]
+
+            self.intervals += 1
+
+    def merge(self, other: "PartialSummary") -> "PartialSummary":
+        """Combine with the summary of the intervals directly following this one's"""
+        merged = PartialSummary()
+        merged.intervals = self.intervals + other.intervals
+        with localcontext() as ctx:
+            ctx.prec = MAX_PREC
+            merged.total_usage_kwh = self.total_usage_kwh + other.total_usage_kwh
+            merged.total_cost = self.total_cost + other.total_cost
+            merged.cost_by_type = dict(self.cost_by_type)
+            for cost_type, cost in other.cost_by_type.items():
+                merged.cost_by_type[cost_type] = (
+                    merged.cost_by_type.get(cost_type, Decimal("0")) + cost
+                )
+
+        merged.peak_usage_hour, merged.peak_usage_kwh = self.peak_usage_hour, self.peak_usage_kwh
+        if other.peak_usage_hour is not None and (
+            self.peak_usage_hour is None or other.peak_usage_kwh > self.peak_usage_kwh
+        ):
+            merged.peak_usage_hour = self.intervals + other.peak_usage_hour
+            merged.peak_usage_kwh = other.peak_usage_kwh
 
-            if (
-                summary["peak_cost_hour"] is None
-                or hour_data["cost"]["total"] > analysis[summary["peak_cost_hour"]]["cost"]["total"]
-            ):
-                summary["peak_cost_hour"] = analysis.index(hour_data)
+        merged.peak_cost_hour, merged.peak_cost = self.peak_cost_hour, self.peak_cost
+        if other.peak_cost_hour is not None and (
+            self.peak_cost_hour is None or other.peak_cost > self.peak_cost
+        ):
+            merged.peak_cost_hour = self.intervals + other.peak_cost_hour
+            merged.peak_cost = other.peak_cost
 
-        if summary["total_usage_kwh"] > 0:
-            summary["average_price_per_kwh"] = PreciseAmount(
-                amount=(summary["total_cost"].amount / summary["total_usage_kwh"])
-            )
-
-        log.debug(f"Summary completed. Total usage: {summary['total_usage_kwh']} kWh")
-        log.debug(f"Total cost: {summary['total_cost'].amount}")
-        log.debug(f"Cost by type: {summary['cost_by_type']}")
+        return merged
 
+    def to_summary(self) -> Dict:
+        """The dict returned by `ElectricityUsageAnalyzer.summarize_analysis`"""
+        total_usage_kwh = +self.total_usage_kwh  # Round to the context precision
+        total_cost = +self.total_cost
+        summary = {
+            "total_usage_kwh": total_usage_kwh,
+            "total_cost": PreciseAmount(amount=total_cost),
+            "cost_by_type": {cost_type: +cost for cost_type, cost in self.cost_by_type.items()},
+            "average_price_per_kwh": PreciseAmount(amount=Decimal("0")),
+            "peak_usage_hour": self.peak_usage_hour,
+            "peak_cost_hour": self.peak_cost_hour,
+        }
+        if total_usage_kwh > 0:
+            summary["average_price_per_kwh"] = PreciseAmount(amount=(total_cost / total_usage_kwh))
         return summary
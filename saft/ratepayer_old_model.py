@@ -12,6 +12,7 @@ from typing import List
 from typing import Optional
 
 import moneyed
+import numpy as np
 import pandas as pd
 import pytz
 from moneyed import EUR
@@ -134,11 +135,19 @@ class DayAheadPricing(BaseModel):
         except KeyError:
             raise ValueError(f"No price available for {dt}")
 
+    def price_series(self) -> pd.Series:
+        """Prices as floats in currency units per kWh, indexed by UTC timestamps"""
+        index = pd.to_datetime(self.prices.index, utc=True)
+        values = np.array([float(price.amount) for price in self.prices["Price"]], dtype=float)
+        return pd.Series(values, index=index, name="Price")
+
     def update_prices(self, new_prices: pd.DataFrame):
         new_prices["Price"] = new_prices["Price"].apply(
             lambda x: PreciseAmount(amount=Decimal(str(x)) / 1000)
         )
-        self.prices = pd.concat([self.prices, new_prices]).sort_index().drop_duplicates()
+        prices = pd.concat([self.prices, new_prices])
+        # Deduplicate on the timestamp so that re-published hours replace the old price
+        self.prices = prices[~prices.index.duplicated(keep="last")].sort_index()
         self.last_updated = datetime.now(pytz.UTC)
 
 
@@ -0,0 +1,164 @@
+"""Conversions between market time unit resolutions, e.g. hourly and 15-minute
+
+Prices and energy behave differently when the resolution changes: a price is averaged when
+intervals are aggregated and repeated when they are split, while energy is summed and divided
+evenly. All conversions work on whole arrays, so four times as many intervals cost four times
+the memory but not four times the Python-loop time.
+"""
+
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from saft.ratepayer_model import HOUR
+from saft.ratepayer_model import TimeRange
+from saft.ratepayer_model import UsagePattern
+from saft.ratepayer_model import UsageSchedule
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.ratepayer_old_model import PreciseAmount
+
+
+QUARTER_HOUR = timedelta(minutes=15)
+
+PRICE = "price"
+ENERGY = "energy"
+
+
+def infer_resolution(index: pd.DatetimeIndex) -> pd.Timedelta:
+    """The shortest step between consecutive timestamps, gaps do not affect it"""
+    if len(index) < 2:
+        raise ValueError("Cannot infer the resolution of fewer than two timestamps")
+    steps = index[1:] - index[:-1]
+    return steps[steps > pd.Timedelta(0)].min()
+
+
+def aggregate(
+    series: pd.Series, resolution: timedelta, kind: str, weights: Optional[pd.Series] = None
+) -> pd.Series:
+    """Coarsen to `resolution`: prices are (optionally weighted) means, energy is summed"""
+    if kind == ENERGY:
+        return series.resample(resolution).sum(min_count=1).dropna()
+    if kind != PRICE:
+        raise ValueError(f"Unknown series kind {kind}")
+    if weights is None:
+        return series.resample(resolution).mean().dropna()
+    weighted = (series * weights).resample(resolution).sum(min_count=1)
+    return (weighted / weights.resample(resolution).sum()).dropna()
+
+
+def disaggregate(
+    series: pd.Series,
+    resolution: timedelta,
+    kind: str,
+    source_resolution: Optional[timedelta] = None,
+) -> pd.Series:
+    """Refine to `resolution`: prices are repeated, energy is split evenly across sub-intervals"""
+    source = pd.Timedelta(source_resolution or infer_resolution(series.index))
+    factor = source / pd.Timedelta(resolution)
+    if factor != int(factor) or factor < 1:
+        raise ValueError(f"{source} does not split into whole intervals of {resolution}")
+    factor = int(factor)
+
+    offsets = pd.to_timedelta(np.arange(factor) * pd.Timedelta(resolution))
+    index = series.index.repeat(factor) + np.tile(offsets, len(series))
+    values = np.repeat(series.to_numpy(dtype=float), factor)
+    if kind == ENERGY:
+        values = values / factor
+    elif kind != PRICE:
+        raise ValueError(f"Unknown series kind {kind}")
+    return pd.Series(values, index=index, name=series.name)
+
+
+def to_resolution(series: pd.Series, resolution: timedelta, kind: str) -> pd.Series:
+    if len(series) < 2:
+        return series
+    source = infer_resolution(series.index)
+    if source == pd.Timedelta(resolution):
+        return series
+    if source > pd.Timedelta(resolution):
+        return disaggregate(series, resolution, kind, source_resolution=source)
+    return aggregate(series, resolution, kind)
+
+
+def resample_pricing(pricing: DayAheadPricing, resolution: timedelta) -> DayAheadPricing:
+    """A copy of `pricing` at another resolution, e.g. hourly history as 15-minute units"""
+    series = to_resolution(pricing.price_series(), resolution, PRICE)
+    prices = pd.DataFrame(
+        {"Price": [PreciseAmount(amount=Decimal(str(round(p, 8)))) for p in series.to_numpy()]},
+        index=series.index,
+    )
+    return DayAheadPricing(
+        country_code=pricing.country_code, zone_code=pricing.zone_code, prices=prices
+    )
+
+
+def seconds_of_day(value) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _pattern_mask(pattern: UsagePattern, index: pd.DatetimeIndex) -> np.ndarray:
+    """`UsageSchedule._pattern_applies` for a whole index"""
+    timestamps = index.to_numpy(dtype="M8[s]")
+    mask = (np.datetime64(pattern.start_date, "s") <= timestamps) & (
+        timestamps <= np.datetime64(pattern.end_date, "s")
+    )
+    if pattern.months:
+        mask &= np.isin(index.month, pattern.months)
+    if pattern.days_of_week:
+        mask &= np.isin(index.weekday, pattern.days_of_week)
+    if pattern.time_range:
+        seconds = (timestamps - timestamps.astype("M8[D]")).astype(np.int64)
+        start = seconds_of_day(pattern.time_range.start)
+        end = seconds_of_day(pattern.time_range.end)
+        if start <= end:
+            mask &= (start <= seconds) & (seconds < end)
+        else:  # Handles ranges that cross midnight
+            mask &= (seconds >= start) | (seconds < end)
+    return mask
+
+
+def usage_vector(
+    schedule: UsageSchedule, index: pd.DatetimeIndex, resolution: Optional[timedelta] = None
+) -> np.ndarray:
+    """kWh per interval of a naive local index, evaluated per pattern instead of per interval"""
+    resolution = pd.Timedelta(resolution or infer_resolution(index))
+    scale = resolution / pd.Timedelta(HOUR)
+    usage = np.zeros(len(index), dtype=float)
+    for pattern in schedule.usage_patterns:
+        usage[_pattern_mask(pattern, index)] += float(pattern.kwh)
+    return usage * scale
+
+
+def consumption_schedule(
+    consumption_data: List[Dict], start: datetime, end: datetime
+) -> UsageSchedule:
+    """The consumption JSON of `simulate` as a schedule on the real calendar
+
+    Every consumption period draws its `kw_draw` in the intervals that start within its daily
+    time range, on every day of its months between `start` and `end`. Unlike the simulated year
+    of `sweep.compile_profile`, months have their real lengths and start on their real dates.
+    """
+    schedule = UsageSchedule()
+    for co in consumption_data:
+        for cpo in co["consumption_periods"]:
+            schedule.add_usage_pattern(
+                pattern=UsagePattern(
+                    name=cpo.get("name", co["name"]),
+                    start_date=start,
+                    end_date=end,
+                    kwh=Decimal(str(cpo["kw_draw"])),
+                    time_range=TimeRange(
+                        start=time.fromisoformat(cpo["start_time"]),
+                        end=time.fromisoformat(cpo["stop_time"]),
+                    ),
+                    months=cpo["months"],
+                )
+            )
+    return schedule
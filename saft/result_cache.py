@@ -0,0 +1,213 @@
+"""On-disk result cache keyed by a content hash of everything a result depends on
+
+Entries are pickles named after the sha256 of their inputs. Writes go to a temporary file that
+is atomically renamed into place, so concurrent processes only ever see complete entries, and
+the least recently used entries (by file mtime, bumped on every hit) are evicted once the cache
+grows past `max_bytes`. A reader racing an eviction simply gets a miss.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from decimal import Decimal
+from decimal import getcontext
+from enum import Enum
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import pandas as pd
+from pydantic import BaseModel as PydanticBaseModel
+
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+from saft.ratepayer_old_model import DayAheadPricing
+
+
+log = logging.getLogger(__name__)
+
+# Bump when a cached computation changes its output for the same inputs
+CACHE_VERSION = 2
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+ENTRY_SUFFIX = ".pkl"
+
+
+def file_digest(file_path: str) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def pricing_digest(pricing: DayAheadPricing) -> str:
+    """Identifies the price data version, independent of `last_updated`"""
+    series = pricing.price_series()
+    sha = hashlib.sha256(f"{pricing.country_code}:{pricing.zone_code}".encode())
+    sha.update(series.index.asi8.tobytes())
+    sha.update(series.to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+def _canonical(obj: Any) -> Any:
+    """Reduce tariff/usage definitions and parameters to JSON-like values for hashing"""
+    if obj is None or isinstance(obj, (bool, int, str)):
+        return obj
+    # Tag values with their type so that e.g. 1.0 and "1.0" do not hash alike
+    if isinstance(obj, float):
+        return ["float", repr(obj)]
+    if isinstance(obj, Decimal):
+        return ["Decimal", str(obj)]
+    if isinstance(obj, (datetime, date, time)):
+        return [type(obj).__name__, obj.isoformat()]
+    if isinstance(obj, timedelta):
+        return ["timedelta", obj.total_seconds()]
+    if isinstance(obj, Enum):
+        return [type(obj).__name__, _canonical(obj.value)]
+    if isinstance(obj, DayAheadPricing):
+        return ["DayAheadPricing", pricing_digest(obj)]
+    if isinstance(obj, (pd.Series, pd.DataFrame)):
+        return [type(obj).__name__, pd.util.hash_pandas_object(obj).to_numpy().tobytes().hex()]
+    if isinstance(obj, PydanticBaseModel):
+        # Model ids are random and do not change the meaning of the model
+        return [type(obj).__name__, _canonical(obj.model_dump(exclude={"id"}))]
+    if isinstance(obj, dict):
+        return sorted(([_canonical(k), _canonical(v)] for k, v in obj.items()), key=repr)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = [_canonical(item) for item in obj]
+        return sorted(items, key=repr) if isinstance(obj, (set, frozenset)) else items
+    if hasattr(obj, "__dict__"):
+        return [type(obj).__name__, _canonical(vars(obj))]
+    return [type(obj).__name__, str(obj)]
+
+
+def fingerprint(**parts: Any) -> str:
+    sha = hashlib.sha256(repr(_canonical({"version": CACHE_VERSION, **parts})).encode())
+    return sha.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return False, None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            log.warning(f"Discarding unreadable cache entry {path}")
+            self._remove(path)
+            return False, None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        return True, value
+
+    def store(self, key: str, value: Any) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        hit, value = self.lookup(key)
+        if hit:
+            return value, True
+        value = compute()
+        self.store(key, value)
+        return value, False
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in `max_bytes`"""
+        entries: List[Tuple[float, int, str]] = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_analyze_period(
+    cache: ResultCache, analyzer: ElectricityUsageAnalyzer, start: datetime, end: datetime
+) -> Tuple[List[Dict], Dict]:
+    """`analyze_period` + `summarize_analysis`, with `summary["cache"]` set to "hit" or "miss"
+
+    The summary is rounded to the current Decimal context, so its precision and rounding are
+    part of the key.
+    """
+    context = getcontext()
+    key = fingerprint(
+        kind="analyze_period",
+        pricing_plans=analyzer.price_calendar.pricing_plans,
+        usage_patterns=analyzer.usage_schedule.usage_patterns,
+        start=start,
+        end=end,
+        precision=context.prec,
+        rounding=context.rounding,
+    )
+
+    def compute():
+        analysis = analyzer.analyze_period(start, end)
+        return analysis, analyzer.summarize_analysis(analysis)
+
+    (analysis, summary), hit = cache.get_or_compute(key, compute)
+    summary = {**summary, "cache": "hit" if hit else "miss"}
+    return analysis, summary
+
+
+def simulation_key(
+    *,
+    seed: int,
+    transfer_price: float,
+    consumption_file: str,
+    market_file: str,
+    fixed_total: Optional[float],
+) -> str:
+    return fingerprint(
+        kind="simulate",
+        seed=seed,
+        transfer_price=transfer_price,
+        fixed_total=fixed_total,
+        consumption=file_digest(consumption_file),
+        market=file_digest(market_file),
+    )
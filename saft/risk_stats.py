@@ -0,0 +1,430 @@
+"""Bounded-memory, mergeable risk statistics for Monte Carlo runs of the `simulate.py` cost model
+
+Every worker feeds its runs into its own `RiskEstimator` and the estimators are merged at the
+end, so the report is computed from a small constant-size state instead of a list of results.
+
+Error bounds:
+
+* `RunningMoments` keeps count/mean/M2/min/max (Chan et al. parallel update). Count, min and max
+  merge exactly; mean and variance merge exactly up to floating point rounding.
+* `QuantileSketch` is a DDSketch: values are counted in logarithmic buckets whose boundaries grow
+  by `gamma = (1 + a) / (1 - a)` for a relative accuracy `a`. Bucket counts simply add up, so a
+  merged sketch is identical to the sketch of all values. Any quantile it returns is within
+  `a * |x|` of a value of the exact rank, values with `|x| < zero_threshold` are counted as zero.
+  The state holds at most `log(max|x| / zero_threshold) / log(gamma)` buckets per sign, a few
+  thousand for the defaults, however many runs are added.
+* Because every value in the tail is represented within `a * |x|`, CVaR (the mean of the tail)
+  is within `a * mean(|x|)` of the tail it estimates.
+"""
+
+import argparse
+import json
+import math
+import random
+from functools import partial
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+from saft.checkpoint import CheckpointStore
+from saft.checkpoint import DEFAULT_MIN_INTERVAL
+from saft.checkpoint import run_units
+from saft.simulate import load_data
+from saft.simulate import simulate_spot_prices
+from saft.simulate import simulate_spot_prices_by_hour
+from saft.sweep import compile_profile
+from saft.sweep import LoadProfile
+
+
+DEFAULT_RELATIVE_ACCURACY = 0.005
+DEFAULT_ZERO_THRESHOLD = 1e-6
+DEFAULT_PERCENTILES = (1, 5, 50, 95, 99)
+DEFAULT_LEVEL = 0.95
+
+
+class RunningMoments:
+    def __init__(self):
+        self.count: int = 0
+        self.mean: float = 0.0
+        self.m2: float = 0.0
+        self.min: float = math.inf
+        self.max: float = -math.inf
+
+    def update(self, values: Sequence[float]) -> None:
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        batch = RunningMoments()
+        batch.count = int(values.size)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other: "RunningMoments") -> None:
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class QuantileSketch:
+    def __init__(
+        self,
+        *,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+        zero_threshold: float = DEFAULT_ZERO_THRESHOLD,
+    ):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy: float = relative_accuracy
+        self.zero_threshold: float = zero_threshold
+        self.gamma: float = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma: float = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count: int = 0
+        self.count: int = 0
+
+    def update(self, values: Sequence[float]) -> None:
+        values = np.asarray(values, dtype=float)
+        magnitudes = np.abs(values)
+        is_zero = magnitudes < self.zero_threshold
+        self.zero_count += int(is_zero.sum())
+        self.count += int(values.size)
+        for store, mask in ((self.positive, values > 0), (self.negative, values < 0)):
+            mask &= ~is_zero
+            if mask.any():
+                keys = np.ceil(np.log(magnitudes[mask]) / self._log_gamma).astype(np.int64)
+                for key, count in zip(*np.unique(keys, return_counts=True)):
+                    store[int(key)] = store.get(int(key), 0) + int(count)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if (other.relative_accuracy, other.zero_threshold) != (
+            self.relative_accuracy,
+            self.zero_threshold,
+        ):
+            raise ValueError("Cannot merge sketches with different accuracy settings")
+        for store, other_store in (
+            (self.positive, other.positive),
+            (self.negative, other.negative),
+        ):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for value, count in self._buckets():
+            seen += count
+            if seen > rank:
+                return value
+        return value
+
+    def lower_tail_mean(self, fraction: float) -> float:
+        """Mean of the lowest `fraction` of the values"""
+        if self.count == 0:
+            return math.nan
+        remaining = max(fraction * self.count, 1.0)
+        weight, total = 0.0, 0.0
+        for value, count in self._buckets():
+            taken = min(count, remaining - weight)
+            total += value * taken
+            weight += taken
+            if weight >= remaining:
+                break
+        return total / weight
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def _buckets(self) -> Iterable[Tuple[float, int]]:
+        """(representative value, count) in ascending value order"""
+        for key in sorted(self.negative, reverse=True):
+            yield -self._value(key), self.negative[key]
+        if self.zero_count:
+            yield 0.0, self.zero_count
+        for key in sorted(self.positive):
+            yield self._value(key), self.positive[key]
+
+
+class RiskEstimator:
+    """Running moments and a quantile sketch of savings"""
+
+    def __init__(self, *, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.moments: RunningMoments = RunningMoments()
+        self.sketch: QuantileSketch = QuantileSketch(relative_accuracy=relative_accuracy)
+
+    def update(self, savings: Sequence[float]) -> None:
+        self.moments.update(savings)
+        self.sketch.update(savings)
+
+    def merge(self, other: "RiskEstimator") -> None:
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+
+    def report(
+        self, percentiles: Sequence[float] = DEFAULT_PERCENTILES, level: float = DEFAULT_LEVEL
+    ) -> Dict:
+        """Summary of savings; VaR and CVaR are expressed as losses, i.e. negated savings
+
+        VaR at `level` is the loss not exceeded with probability `level` and CVaR is the mean
+        loss in the remaining `1 - level` tail.
+        """
+        report = {
+            "runs": self.moments.count,
+            "mean_savings": self.moments.mean,
+            "std_savings": math.sqrt(self.moments.variance),
+            "min_savings": self.moments.min,
+            "max_savings": self.moments.max,
+        }
+        for percentile in percentiles:
+            report[f"p{percentile:g}_savings"] = self.sketch.quantile(percentile / 100)
+        report[f"var_{level * 100:g}"] = -self.sketch.quantile(1 - level)
+        report[f"cvar_{level * 100:g}"] = -self.sketch.lower_tail_mean(1 - level)
+        report["relative_accuracy"] = self.sketch.relative_accuracy
+        return report
+
+
+def simulate_savings(
+    *,
+    profile: LoadProfile,
+    market_data: List[Dict],
+    transfer_price: float,
+    fixed_total: float,
+    seed: int,
+    intervals_per_hour: int = 1,
+) -> float:
+    """Savings of one `simulate.main` run, without re-walking the consumption data
+
+    With `intervals_per_hour` other than 1, `profile` is at that resolution and the prices are
+    drawn by `simulate_spot_prices`.
+    """
+    if intervals_per_hour == 1:
+        random.seed(seed)
+        spot_prices = simulate_spot_prices_by_hour(market_data, len(profile.kw_by_hour))
+    else:
+        spot_prices = simulate_spot_prices(
+            market_data,
+            num_hours=len(profile.kw_by_hour) // intervals_per_hour,
+            intervals_per_hour=intervals_per_hour,
+            rng=np.random.default_rng(seed),
+        )
+    variable_cost = profile.price(spot_prices).variable_cost(transfer_price)
+    return float(fixed_total - variable_cost)
+
+
+def estimate_seed_range(
+    *,
+    profile: LoadProfile,
+    market_data: List[Dict],
+    transfer_price: float,
+    fixed_total: float,
+    seeds: range,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+    intervals_per_hour: int = 1,
+) -> RiskEstimator:
+    estimator = RiskEstimator(relative_accuracy=relative_accuracy)
+    estimator.update(
+        [
+            simulate_savings(
+                profile=profile,
+                market_data=market_data,
+                transfer_price=transfer_price,
+                fixed_total=fixed_total,
+                seed=seed,
+                intervals_per_hour=intervals_per_hour,
+            )
+            for seed in seeds
+        ]
+    )
+    return estimator
+
+
+def seed_ranges(first_seed: int, runs: int, batch_size: int) -> List[range]:
+    end = first_seed + runs
+    return [range(s, min(s + batch_size, end)) for s in range(first_seed, end, batch_size)]
+
+
+def _estimate_batch(seeds: range, **kwargs) -> RiskEstimator:
+    return estimate_seed_range(seeds=seeds, **kwargs)
+
+
+def _merge_estimator(estimator: RiskEstimator, other: RiskEstimator) -> RiskEstimator:
+    estimator.merge(other)
+    return estimator
+
+
+def run_risk_analysis(
+    *,
+    consumption_data: List[Dict],
+    market_data: List[Dict],
+    transfer_price: float,
+    fixed_total: float,
+    first_seed: int,
+    runs: int,
+    workers: Optional[int] = None,
+    batch_size: int = 100,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+    checkpoint_dir: Optional[str] = None,
+    checkpoint_interval: float = DEFAULT_MIN_INTERVAL,
+    intervals_per_hour: int = 1,
+) -> RiskEstimator:
+    """Estimators of the seed batches merged in seed order, so any `workers` give one result
+
+    With `checkpoint_dir` the progress is checkpointed and a rerun with the same inputs resumes
+    from the last checkpoint.
+    """
+    params = dict(
+        transfer_price=transfer_price,
+        fixed_total=fixed_total,
+        relative_accuracy=relative_accuracy,
+        intervals_per_hour=intervals_per_hour,
+    )
+    profile = compile_profile(consumption_data)
+    if intervals_per_hour != 1:
+        profile = profile.at_resolution(intervals_per_hour)
+    compute = partial(
+        _estimate_batch,
+        profile=profile,
+        market_data=market_data,
+        **params,
+    )
+    store = None
+    if checkpoint_dir is not None:
+        # Imported only when checkpointing, so worker processes do not load pandas and pydantic
+        from saft.result_cache import fingerprint
+
+        key = fingerprint(
+            kind="risk_stats",
+            consumption=consumption_data,
+            market=market_data,
+            first_seed=first_seed,
+            runs=runs,
+            batch_size=batch_size,
+            **params,
+        )
+        store = CheckpointStore(checkpoint_dir, key, min_interval=checkpoint_interval)
+
+    return run_units(
+        seed_ranges(first_seed, runs, batch_size),
+        compute,
+        _merge_estimator,
+        RiskEstimator(relative_accuracy=relative_accuracy),
+        store=store,
+        workers=workers,
+    )
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo risk statistics of annual savings with spot price."
+    )
+    parser.add_argument("--seed", type=int, required=True, help="First seed for RNG")
+    parser.add_argument("--runs", type=int, required=True, help="Number of simulated years")
+    parser.add_argument(
+        "--fixed_total", type=float, required=True, help="Fixed annual total in X.xx currency unit"
+    )
+    parser.add_argument(
+        "--transfer_price",
+        type=float,
+        required=True,
+        help="Base transfer price in X.xx currency unit per kwh",
+    )
+    parser.add_argument(
+        "--consumption_file", type=str, required=True, help="JSON file with consumption data"
+    )
+    parser.add_argument(
+        "--market-file", type=str, required=True, help="JSON file with spot market data"
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--batch-size", type=int, default=100, help="Seeds per work unit")
+    parser.add_argument(
+        "--relative-accuracy",
+        type=float,
+        default=DEFAULT_RELATIVE_ACCURACY,
+        help="Relative accuracy of the reported quantiles",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default=None,
+        help="Directory for checkpoints to resume an interrupted run from",
+    )
+    parser.add_argument(
+        "--intervals-per-hour",
+        type=int,
+        default=1,
+        help="Spot prices per hour, e.g. 4 for 15-minute market time units",
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(
+    seed: int,
+    runs: int,
+    transfer_price: float,
+    fixed_total: float,
+    consumption_file: str,
+    market_file: str,
+    workers: Optional[int] = None,
+    batch_size: int = 100,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+    checkpoint_dir: Optional[str] = None,
+    intervals_per_hour: int = 1,
+):
+    estimator = run_risk_analysis(
+        consumption_data=load_data(consumption_file),
+        market_data=load_data(market_file),
+        transfer_price=transfer_price,
+        fixed_total=fixed_total,
+        first_seed=seed,
+        runs=runs,
+        workers=workers,
+        batch_size=batch_size,
+        relative_accuracy=relative_accuracy,
+        checkpoint_dir=checkpoint_dir,
+        intervals_per_hour=intervals_per_hour,
+    )
+    report = estimator.report()
+    print(json.dumps(report, indent=4))
+    return report
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(
+        seed=args.seed,
+        runs=args.runs,
+        transfer_price=args.transfer_price,
+        fixed_total=args.fixed_total,
+        consumption_file=args.consumption_file,
+        market_file=args.market_file,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        relative_accuracy=args.relative_accuracy,
+        checkpoint_dir=args.checkpoint_dir,
+        intervals_per_hour=args.intervals_per_hour,
+    )
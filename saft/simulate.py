@@ -1,6 +1,9 @@
 import argparse
 import json
 import random
+from typing import Optional
+
+import numpy as np
 
 
 def is_peak(hour):
@@ -23,6 +26,29 @@ def simulate_spot_prices_by_hour(market_data, num_hours=8760):
     return hourly_spot_prices
 
 
+def simulate_spot_prices(market_data, num_hours=8760, intervals_per_hour=1, rng=None):
+    """Array form of `simulate_spot_prices_by_hour` at `intervals_per_hour` prices per hour
+
+    Every interval is drawn independently from the peak or off-peak range of its hour's month,
+    e.g. `intervals_per_hour=4` gives a 15-minute price path of `4 * num_hours` prices. Draws come
+    from a numpy `Generator`, so paths differ from the `random` based hourly simulation.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    hours = np.arange(num_hours * intervals_per_hour) // intervals_per_hour
+    months = (hours // 730) % 12 + 1
+    hour_of_day = hours % 24
+    peak = ((6 <= hour_of_day) & (hour_of_day <= 9)) | ((17 <= hour_of_day) & (hour_of_day <= 20))
+
+    low = np.zeros((2, 13))
+    high = np.zeros((2, 13))
+    for m in market_data:
+        for is_peak_idx, key in enumerate(("off-peak", "peak")):
+            low[is_peak_idx, m["month"]] = m[key]["min"]
+            high[is_peak_idx, m["month"]] = m[key]["max"]
+
+    return rng.uniform(low[peak.astype(np.int64), months], high[peak.astype(np.int64), months])
+
+
 def load_data(filename):
     with open(filename, "r") as file:
         return json.load(file)
@@ -33,19 +59,14 @@ def parse_time(time_str):
     return h * 3600 + m * 60 + s
 
 
-def get_variable_prices_of_day(
-    month_of_year, day_of_month, hourly_spot_prices, transfer_price, cpo
-):
-    kw_draw = cpo["kw_draw"]
+def active_hours_of_day(month_of_year, day_of_month, num_hours, cpo):
+    """Yields (hour_idx, current_hour) for the simulated hours the consumption period draws power"""
     start = parse_time(cpo["start_time"])
     stop = parse_time(cpo["stop_time"])
-    peak_prices = []
-    off_peak_prices = []
-    total_variable_cost = 0.0
 
     for hour in range(24):
         hour_idx = (month_of_year - 1) * 730 + day_of_month * 24 + hour
-        if hour_idx >= len(hourly_spot_prices):
+        if hour_idx >= num_hours:
             break
         current_hour = start // 3600 + hour
         if (
@@ -53,12 +74,26 @@ def get_variable_prices_of_day(
             or stop < start
             and (current_hour < stop or current_hour >= start)
         ):
-            spot_price = hourly_spot_prices[hour_idx]
-            if is_peak(current_hour):
-                peak_prices.append(spot_price)
-            else:
-                off_peak_prices.append(spot_price)
-            total_variable_cost += (spot_price + transfer_price) * kw_draw
+            yield hour_idx, current_hour
+
+
+def get_variable_prices_of_day(
+    month_of_year, day_of_month, hourly_spot_prices, transfer_price, cpo
+):
+    kw_draw = cpo["kw_draw"]
+    peak_prices = []
+    off_peak_prices = []
+    total_variable_cost = 0.0
+
+    for hour_idx, current_hour in active_hours_of_day(
+        month_of_year, day_of_month, len(hourly_spot_prices), cpo
+    ):
+        spot_price = hourly_spot_prices[hour_idx]
+        if is_peak(current_hour):
+            peak_prices.append(spot_price)
+        else:
+            off_peak_prices.append(spot_price)
+        total_variable_cost += (spot_price + transfer_price) * kw_draw
 
     return total_variable_cost, peak_prices, off_peak_prices
 
@@ -114,6 +149,9 @@ def parse_cli():
     parser.add_argument(
         "--market-file", type=str, required=True, help="JSON file with spot market data"
     )
+    parser.add_argument(
+        "--cache-dir", type=str, default=None, help="Directory for caching simulation results"
+    )
 
     args = parser.parse_args()
 
@@ -126,18 +164,38 @@ def main(
     consumption_file: str,
     market_file: str,
     fixed_total: float = None,
+    cache_dir: Optional[str] = None,
 ):
-    random.seed(seed)
-    market_data = load_data(market_file)
-    hourly_spot_prices = simulate_spot_prices_by_hour(market_data)
-    consumption_data = load_data(consumption_file)
-
-    result = calculate_costs(
-        consumption_data=consumption_data,
-        hourly_spot_prices=hourly_spot_prices,
-        transfer_price=transfer_price,
-        fixed_total=fixed_total,
-    )
+    def simulate():
+        random.seed(seed)
+        market_data = load_data(market_file)
+        hourly_spot_prices = simulate_spot_prices_by_hour(market_data)
+        consumption_data = load_data(consumption_file)
+
+        return calculate_costs(
+            consumption_data=consumption_data,
+            hourly_spot_prices=hourly_spot_prices,
+            transfer_price=transfer_price,
+            fixed_total=fixed_total,
+        )
+
+    if cache_dir is None:
+        result = simulate()
+    else:
+        # Imported only when caching, it pulls in pandas and pydantic
+        from saft.result_cache import ResultCache
+        from saft.result_cache import simulation_key
+
+        key = simulation_key(
+            seed=seed,
+            transfer_price=transfer_price,
+            consumption_file=consumption_file,
+            market_file=market_file,
+            fixed_total=fixed_total,
+        )
+        result, hit = ResultCache(cache_dir).get_or_compute(key, simulate)
+        result = {**result, "cache": "hit" if hit else "miss"}
+
     print(json.dumps(result, indent=4))
     return result
 
@@ -150,4 +208,5 @@ if __name__ == "__main__":
         transfer_price=args.transfer_price,
         consumption_file=args.consumption_file,
         market_file=args.market_file,
+        cache_dir=args.cache_dir,
     )
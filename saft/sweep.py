@@ -0,0 +1,244 @@
+"""Sweep savings over grids of transfer prices and fixed annual totals
+
+`calculate_costs` charges `(spot_price + transfer_price) * kw_draw` for every active hour, so the
+variable cost is `spot_cost + transfer_price * kwh` and the savings are `fixed_total` minus that.
+The load is compiled once into a draw per simulated hour, priced against a simulated price path
+and every grid point is then evaluated as a broadcasted array expression instead of a full
+simulation.
+"""
+
+import argparse
+import csv
+import json
+import random
+import sys
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+
+from saft.simulate import active_hours_of_day
+from saft.simulate import is_peak
+from saft.simulate import load_data
+from saft.simulate import simulate_spot_prices
+from saft.simulate import simulate_spot_prices_by_hour
+
+
+class LoadProfile:
+    """Consumption data reduced to its draw per simulated hour, independent of prices
+
+    `peak_hours`/`off_peak_hours` count how often each hour is drawn from during peak and
+    off-peak, which is what the peak/off-peak price averages of `calculate_costs` weigh by.
+    """
+
+    def __init__(
+        self, *, kw_by_hour: np.ndarray, peak_hours: np.ndarray, off_peak_hours: np.ndarray
+    ):
+        self.kw_by_hour: np.ndarray = kw_by_hour
+        self.peak_hours: np.ndarray = peak_hours
+        self.off_peak_hours: np.ndarray = off_peak_hours
+        self.kwh: float = float(kw_by_hour.sum())
+
+    def at_resolution(self, intervals_per_hour: int) -> "LoadProfile":
+        """The same load over `intervals_per_hour` sub-hourly intervals, e.g. 4 for 15 minutes
+
+        An hour's energy is split evenly over its intervals and each interval counts towards the
+        peak/off-peak averages as often as its hour did.
+        """
+        return LoadProfile(
+            kw_by_hour=np.repeat(self.kw_by_hour / intervals_per_hour, intervals_per_hour),
+            peak_hours=np.repeat(self.peak_hours, intervals_per_hour),
+            off_peak_hours=np.repeat(self.off_peak_hours, intervals_per_hour),
+        )
+
+    def price(self, hourly_spot_prices: Sequence[float]) -> "CompiledLoad":
+        return CompiledLoad(profile=self, hourly_spot_prices=hourly_spot_prices)
+
+
+class CompiledLoad:
+    """A load profile priced against one simulated price path"""
+
+    def __init__(self, *, profile: LoadProfile, hourly_spot_prices: Sequence[float]):
+        prices = np.asarray(hourly_spot_prices, dtype=float)
+        peak_count = profile.peak_hours.sum()
+        off_peak_count = profile.off_peak_hours.sum()
+
+        self.profile: LoadProfile = profile
+        self.hourly_spot_prices: np.ndarray = prices
+        self.spot_cost: float = float(profile.kw_by_hour @ prices)
+        self.kwh: float = profile.kwh
+        self.stats: Dict = {
+            "highest_variable_price": float(prices.max()),
+            "lowest_variable_price": float(prices.min()),
+            "average_peak_price": (
+                float(profile.peak_hours @ prices / peak_count) if peak_count else 0
+            ),
+            "average_off_peak_price": (
+                float(profile.off_peak_hours @ prices / off_peak_count) if off_peak_count else 0
+            ),
+        }
+
+    def variable_cost(self, transfer_prices) -> np.ndarray:
+        return self.spot_cost + np.asarray(transfer_prices, dtype=float) * self.kwh
+
+
+def compile_profile(consumption_data: List[Dict], num_hours: int = 8760) -> LoadProfile:
+    """Walk the consumption periods once, mirroring the hour selection of `calculate_costs`"""
+    kw_by_hour = np.zeros(num_hours, dtype=float)
+    peak_hours = np.zeros(num_hours, dtype=np.int64)
+    off_peak_hours = np.zeros(num_hours, dtype=np.int64)
+
+    for co in consumption_data:
+        for cpo in co["consumption_periods"]:
+            for month in cpo["months"]:
+                for day in range(30):  # Approximation: 30 days per month
+                    for hour_idx, current_hour in active_hours_of_day(month, day, num_hours, cpo):
+                        kw_by_hour[hour_idx] += cpo["kw_draw"]
+                        if is_peak(current_hour):
+                            peak_hours[hour_idx] += 1
+                        else:
+                            off_peak_hours[hour_idx] += 1
+
+    return LoadProfile(kw_by_hour=kw_by_hour, peak_hours=peak_hours, off_peak_hours=off_peak_hours)
+
+
+def compile_load(consumption_data: List[Dict], hourly_spot_prices: Sequence[float]) -> CompiledLoad:
+    return compile_profile(consumption_data, len(hourly_spot_prices)).price(hourly_spot_prices)
+
+
+def sweep_savings(
+    load: CompiledLoad, transfer_prices: Sequence[float], fixed_totals: Sequence[float]
+) -> np.ndarray:
+    """Savings with spot price, shaped (len(transfer_prices), len(fixed_totals))"""
+    variable_cost = load.variable_cost(transfer_prices)
+    return np.asarray(fixed_totals, dtype=float)[np.newaxis, :] - variable_cost[:, np.newaxis]
+
+
+def break_even_fixed_total(load: CompiledLoad, transfer_prices: Sequence[float]) -> np.ndarray:
+    """The fixed annual price at which switching to spot price neither saves nor costs
+
+    That is the variable cost at each transfer price.
+    """
+    return load.variable_cost(transfer_prices)
+
+
+def break_even_transfer_price(load: CompiledLoad, fixed_totals: Sequence[float]) -> np.ndarray:
+    """The transfer price at which spot price costs exactly `fixed_total`"""
+    if load.kwh == 0:
+        return np.full(len(fixed_totals), np.nan)
+    return (np.asarray(fixed_totals, dtype=float) - load.spot_cost) / load.kwh
+
+
+def sweep_table(
+    load: CompiledLoad, transfer_prices: Sequence[float], fixed_totals: Sequence[float]
+) -> List[Dict]:
+    """One row per grid point; the break-even fixed total is `total_cost_variable_price` itself"""
+    savings = sweep_savings(load, transfer_prices, fixed_totals)
+    variable_cost = load.variable_cost(transfer_prices)
+    break_even_transfer = break_even_transfer_price(load, fixed_totals)
+    rows = []
+    for i, transfer_price in enumerate(transfer_prices):
+        for j, fixed_total in enumerate(fixed_totals):
+            rows.append(
+                {
+                    "transfer_price": transfer_price,
+                    "fixed_total": fixed_total,
+                    "total_cost_variable_price": float(variable_cost[i]),
+                    "savings_with_spot_price": float(savings[i, j]),
+                    "break_even_transfer_price": float(break_even_transfer[j]),
+                }
+            )
+    return rows
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(
+        description="Sweep annual savings over transfer prices and fixed totals."
+    )
+    parser.add_argument("--seed", type=int, required=True, help="Seed for RNG")
+    parser.add_argument(
+        "--transfer_prices",
+        type=float,
+        nargs="+",
+        required=True,
+        help="Transfer prices in X.xx currency unit per kwh",
+    )
+    parser.add_argument(
+        "--fixed_totals",
+        type=float,
+        nargs="+",
+        required=True,
+        help="Fixed annual totals in X.xx currency unit",
+    )
+    parser.add_argument(
+        "--consumption_file", type=str, required=True, help="JSON file with consumption data"
+    )
+    parser.add_argument(
+        "--market-file", type=str, required=True, help="JSON file with spot market data"
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="CSV file for the grid, defaults to stdout"
+    )
+    parser.add_argument(
+        "--intervals-per-hour",
+        type=int,
+        default=1,
+        help="Spot prices per hour, e.g. 4 for 15-minute market time units",
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(
+    seed: int,
+    transfer_prices: Sequence[float],
+    fixed_totals: Sequence[float],
+    consumption_file: str,
+    market_file: str,
+    output: Optional[str] = None,
+    intervals_per_hour: int = 1,
+):
+    market_data = load_data(market_file)
+    consumption_data = load_data(consumption_file)
+
+    if intervals_per_hour == 1:
+        random.seed(seed)
+        load = compile_load(consumption_data, simulate_spot_prices_by_hour(market_data))
+    else:
+        profile = compile_profile(consumption_data).at_resolution(intervals_per_hour)
+        spot_prices = simulate_spot_prices(
+            market_data,
+            intervals_per_hour=intervals_per_hour,
+            rng=np.random.default_rng(seed),
+        )
+        load = profile.price(spot_prices)
+    rows = sweep_table(load, transfer_prices, fixed_totals)
+
+    file = open(output, "w", newline="") if output else sys.stdout
+    try:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if output:
+            file.close()
+
+    print(json.dumps(load.stats, indent=4), file=sys.stderr)
+    return rows
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(
+        seed=args.seed,
+        transfer_prices=args.transfer_prices,
+        fixed_totals=args.fixed_totals,
+        consumption_file=args.consumption_file,
+        market_file=args.market_file,
+        output=args.output,
+        intervals_per_hour=args.intervals_per_hour,
+    )
@@ -0,0 +1,262 @@
+"""Supplier and distributor tariffs defined in TOML or JSON files
+
+A tariff file lists tariffs, each with the `PricingPlan`s it consists of (see
+`sample_data/tariffs.toml`). The file is validated once when it is compiled into a
+`TariffCatalogue`, which holds the plans of all tariffs in a single `TariffTable`. With a
+`ResultCache` the catalogue is stored under the hash of the file, so loading an unchanged
+catalogue is a file hash and an unpickle, without parsing or validating anything.
+
+A customer's contract usually combines a supplier and a distributor tariff:
+`catalogue.to_calendar("tou-distribution", "night-day-supply")` builds the calendar for
+`ElectricityUsageAnalyzer` and `catalogue.table_for(...)` the table for `compile_tariff`. The
+plans of the first tariff take priority for shared plan types.
+"""
+
+import argparse
+import json
+import logging
+import tomllib
+from datetime import datetime
+from datetime import time
+from decimal import Decimal
+from typing import Annotated
+from typing import Dict
+from typing import List
+from typing import Literal
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+from pydantic import BaseModel
+from pydantic import ConfigDict
+from pydantic import Field
+from pydantic import model_validator
+
+from saft.compiled_tariff import TariffTable
+from saft.ratepayer_model import ElectricityPriceCalendar
+from saft.ratepayer_model import PricingPlan
+from saft.ratepayer_model import TimeRange
+from saft.ratepayer_old_model import PreciseAmount
+from saft.result_cache import file_digest
+from saft.result_cache import fingerprint
+from saft.result_cache import ResultCache
+
+
+log = logging.getLogger(__name__)
+
+SUPPLIER = "supplier"
+DISTRIBUTOR = "distributor"
+DEFAULT_TAX_MULTIPLIER = Decimal("1.24")
+
+Month = Annotated[int, Field(ge=1, le=12)]
+Weekday = Annotated[int, Field(ge=0, le=6)]  # 0 = Monday, 6 = Sunday
+
+
+class TimeRangeDefinition(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    start: time
+    end: time
+
+
+class PlanDefinition(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    name: str
+    plan_type: str = Field(min_length=1)
+    price: Decimal
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    tax_multiplier: Optional[Decimal] = None
+    time_range: Optional[TimeRangeDefinition] = None
+    days_of_week: Optional[List[Weekday]] = None
+    months: Optional[List[Month]] = None
+    is_fixed_monthly: bool = False
+
+
+class TariffDefinition(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    id: str = Field(min_length=1)
+    kind: Literal["supplier", "distributor"]
+    name: str
+    start_date: datetime
+    end_date: datetime
+    tax_multiplier: Decimal = DEFAULT_TAX_MULTIPLIER
+    plans: List[PlanDefinition] = Field(min_length=1)
+
+    @model_validator(mode="after")
+    def check_dates(self) -> "TariffDefinition":
+        for plan in self.plans:
+            start = plan.start_date or self.start_date
+            end = plan.end_date or self.end_date
+            if start > end:
+                raise ValueError(f"Plan {plan.name} of {self.id} ends before it starts")
+        return self
+
+    def pricing_plans(self) -> List[PricingPlan]:
+        return [
+            PricingPlan(
+                name=plan.name,
+                start_date=plan.start_date or self.start_date,
+                end_date=plan.end_date or self.end_date,
+                price=PreciseAmount(amount=plan.price),
+                plan_type=plan.plan_type,
+                tax_multiplier=PreciseAmount(amount=plan.tax_multiplier or self.tax_multiplier),
+                time_range=(
+                    TimeRange(start=plan.time_range.start, end=plan.time_range.end)
+                    if plan.time_range
+                    else None
+                ),
+                days_of_week=plan.days_of_week,
+                months=plan.months,
+                is_fixed_monthly=plan.is_fixed_monthly,
+            )
+            for plan in self.plans
+        ]
+
+
+class TariffFile(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    tariffs: List[TariffDefinition]
+
+    @model_validator(mode="after")
+    def check_unique_ids(self) -> "TariffFile":
+        ids = [tariff.id for tariff in self.tariffs]
+        duplicates = sorted({tariff_id for tariff_id in ids if ids.count(tariff_id) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate tariff ids: {', '.join(duplicates)}")
+        return self
+
+
+class TariffCatalogue:
+    """Every plan of a tariff file in one `TariffTable`, with the rows of each tariff
+
+    The plans are kept as plain `PricingPlan` arguments, which unpickle much faster than the
+    plans themselves, and turned into plans when a calendar is built.
+    """
+
+    def __init__(self, *, tariffs: List[TariffDefinition]):
+        self.kinds: Dict[str, str] = {tariff.id: tariff.kind for tariff in tariffs}
+        self.names: Dict[str, str] = {tariff.id: tariff.name for tariff in tariffs}
+        plans = [plan for tariff in tariffs for plan in tariff.pricing_plans()]
+        self.table: TariffTable = TariffTable(
+            plan_types=list(dict.fromkeys(plan.plan_type for plan in plans)), plans=plans
+        )
+        self.rows: Dict[str, Tuple[int, int]] = {}
+        first = 0
+        for tariff in tariffs:
+            self.rows[tariff.id] = (first, first + len(tariff.plans))
+            first += len(tariff.plans)
+        self.plan_arguments: List[Dict] = [
+            {
+                **vars(plan),
+                "price": plan.price.amount,
+                "tax_multiplier": plan.tax_multiplier.amount,
+                "time_range": (
+                    (plan.time_range.start, plan.time_range.end) if plan.time_range else None
+                ),
+            }
+            for plan in plans
+        ]
+
+    def ids(self, kind: Optional[str] = None) -> List[str]:
+        return [tariff_id for tariff_id, k in self.kinds.items() if kind is None or k == kind]
+
+    def plans(self, *tariff_ids: str) -> List[PricingPlan]:
+        plans = []
+        for row in self._rows(tariff_ids):
+            arguments = self.plan_arguments[row]
+            time_range = arguments["time_range"]
+            plans.append(
+                PricingPlan(
+                    **{
+                        **arguments,
+                        "price": PreciseAmount(amount=arguments["price"]),
+                        "tax_multiplier": PreciseAmount(amount=arguments["tax_multiplier"]),
+                        "time_range": (
+                            TimeRange(start=time_range[0], end=time_range[1])
+                            if time_range
+                            else None
+                        ),
+                    }
+                )
+            )
+        return plans
+
+    def to_calendar(self, *tariff_ids: str) -> ElectricityPriceCalendar:
+        calendar = ElectricityPriceCalendar()
+        for plan in self.plans(*tariff_ids):
+            calendar.add_pricing_plan(plan=plan)
+        return calendar
+
+    def table_for(self, *tariff_ids: str) -> TariffTable:
+        """Equal to `TariffTable.from_calendar(self.to_calendar(*tariff_ids))`"""
+        return self.table.select(self._rows(tariff_ids))
+
+    def _rows(self, tariff_ids) -> np.ndarray:
+        ranges = []
+        for tariff_id in tariff_ids:
+            if tariff_id not in self.rows:
+                raise ValueError(f"No tariff {tariff_id} in the catalogue")
+            ranges.append(np.arange(*self.rows[tariff_id]))
+        return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+
+def read_tariff_file(file_path: str) -> TariffFile:
+    """Parse and validate a `.toml` or `.json` tariff file"""
+    with open(file_path, "rb") as file:
+        if file_path.endswith(".toml"):
+            data = tomllib.load(file)
+        elif file_path.endswith(".json"):
+            data = json.load(file)
+        else:
+            raise ValueError(f"Tariff files are .toml or .json, not {file_path}")
+    return TariffFile.model_validate(data)
+
+
+def load_catalogue(file_path: str) -> TariffCatalogue:
+    return TariffCatalogue(tariffs=read_tariff_file(file_path).tariffs)
+
+
+def cached_load_catalogue(cache: ResultCache, file_path: str) -> Tuple[TariffCatalogue, bool]:
+    """`load_catalogue`, only parsed and validated when the file content changed"""
+    key = fingerprint(kind="tariff_catalogue", file=file_digest(file_path))
+    return cache.get_or_compute(key, lambda: load_catalogue(file_path))
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Validate and compile a tariff file.")
+    parser.add_argument(
+        "--tariff_file", type=str, required=True, help="TOML or JSON file with tariffs"
+    )
+    parser.add_argument(
+        "--cache-dir", type=str, default=None, help="Directory for caching the compiled catalogue"
+    )
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main(tariff_file: str, cache_dir: Optional[str] = None) -> Dict:
+    if cache_dir is None:
+        catalogue = load_catalogue(tariff_file)
+    else:
+        catalogue, hit = cached_load_catalogue(ResultCache(cache_dir), tariff_file)
+
+    summary = {
+        "suppliers": catalogue.ids(SUPPLIER),
+        "distributors": catalogue.ids(DISTRIBUTOR),
+        "plans": len(catalogue.plan_arguments),
+    }
+    if cache_dir is not None:
+        summary["cache"] = "hit" if hit else "miss"
+    print(json.dumps(summary, indent=4))
+    return summary
+
+
+if __name__ == "__main__":
+    args = parse_cli()
+    main(tariff_file=args.tariff_file, cache_dir=args.cache_dir)
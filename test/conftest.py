@@ -0,0 +1,111 @@
+from datetime import datetime
+from datetime import time
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from saft.ratepayer_model import ElectricityPriceCalendar
+from saft.ratepayer_model import PricingPlan
+from saft.ratepayer_model import TimeRange
+from saft.ratepayer_model import UsagePattern
+from saft.ratepayer_model import UsageSchedule
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.ratepayer_old_model import PreciseAmount
+
+
+def make_pricing(start: str, prices_mwh, freq: str = "h", tz: str = "Europe/Helsinki"):
+    index = pd.date_range(start=start, periods=len(prices_mwh), freq=freq, tz=tz)
+    df = pd.DataFrame(
+        {"Price": [PreciseAmount(amount=Decimal(str(p)) / 1000) for p in prices_mwh]},
+        index=index,
+    )
+    return DayAheadPricing(country_code="FI", zone_code=None, prices=df)
+
+
+@pytest.fixture
+def pricing_factory():
+    """Builds a `DayAheadPricing` from EUR/MWh prices starting at a local timestamp"""
+    return make_pricing
+
+
+@pytest.fixture
+def tariff_calendar():
+    """Fixed monthly fee, winter weekday distribution over a default and a flat supply rate"""
+    calendar = ElectricityPriceCalendar()
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Fixed Monthly Cost",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 1, 1),
+            price=PreciseAmount(amount=Decimal("39.90")),
+            plan_type="fixed_monthly",
+            is_fixed_monthly=True,
+        )
+    )
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Winter Daytime",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 1, 1),
+            time_range=TimeRange(start=time(7), end=time(21)),
+            days_of_week=[0, 1, 2, 3, 4],
+            months=[11, 12, 1, 2, 3],
+            price=PreciseAmount(amount=Decimal("0.15")),
+            plan_type="distribution",
+        )
+    )
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Other Time",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 1, 1),
+            price=PreciseAmount(amount=Decimal("0.10")),
+            plan_type="distribution",
+        )
+    )
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Night Supply",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 1, 1),
+            time_range=TimeRange(start=time(22), end=time(6)),
+            price=PreciseAmount(amount=Decimal("0.05")),
+            plan_type="supply",
+        )
+    )
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Day Supply",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 1, 1),
+            price=PreciseAmount(amount=Decimal("0.08")),
+            plan_type="supply",
+        )
+    )
+    return calendar
+
+
+@pytest.fixture
+def household_schedule():
+    """A base load plus an evening load on weekdays"""
+    schedule = UsageSchedule()
+    schedule.add_usage_pattern(
+        pattern=UsagePattern(
+            name="Base Usage",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 1, 1),
+            kwh=Decimal("0.5"),
+        )
+    )
+    schedule.add_usage_pattern(
+        pattern=UsagePattern(
+            name="Evening",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 1, 1),
+            time_range=TimeRange(start=time(17), end=time(21)),
+            days_of_week=[0, 1, 2, 3, 4],
+            kwh=Decimal("1.5"),
+        )
+    )
+    return schedule
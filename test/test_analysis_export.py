@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from saft.analysis_export import AnalysisParquetWriter
+from saft.analysis_export import export_analysis
+from saft.analysis_export import read_analysis
+from saft.analysis_export import read_month
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+
+
+ds = pytest.importorskip("pyarrow.dataset")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def analyzer(tariff_calendar, household_schedule):
+    return ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+
+
+def test_export_partitions_by_customer_and_month(tmp_path, analyzer):
+    start, end = datetime(2023, 1, 20), datetime(2023, 3, 5)
+    rows = export_analysis(analyzer, start, end, root=str(tmp_path), customer_id="c1")
+    export_analysis(analyzer, start, end, root=str(tmp_path), customer_id="c2")
+
+    assert rows == (end - start).days * 24
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["customer=c1", "customer=c2"]
+    assert sorted(p.name for p in (tmp_path / "customer=c1").iterdir()) == [
+        "month=2023-01",
+        "month=2023-02",
+        "month=2023-03",
+    ]
+
+    february = read_month(str(tmp_path), "c1", "2023-02")
+    assert february.num_rows == 28 * 24
+    assert february.column("timestamp")[0].as_py() == datetime(2023, 2, 1)
+
+    everything = read_analysis(str(tmp_path), filter=ds.field("customer") == "c2")
+    assert everything.num_rows == rows
+
+
+def test_exporting_again_replaces_the_partitions(tmp_path, analyzer):
+    start, end = datetime(2023, 1, 20), datetime(2023, 2, 5)
+    rows = export_analysis(analyzer, start, end, root=str(tmp_path), customer_id="c1")
+    export_analysis(analyzer, start, end, root=str(tmp_path), customer_id="c1")
+
+    assert read_analysis(str(tmp_path)).num_rows == rows
+    assert read_month(str(tmp_path), "c1", "2023-02").num_rows == 4 * 24
+
+
+def test_partition_written_twice_by_one_writer_keeps_both_parts(tmp_path, analyzer):
+    january = analyzer.analyze_period(datetime(2023, 1, 1), datetime(2023, 1, 2))
+    with AnalysisParquetWriter(
+        str(tmp_path), plan_types=["fixed_monthly", "distribution", "supply"]
+    ) as writer:
+        writer.write("c1", january[:10])
+        writer.write("c2", january)
+        writer.write("c1", january[10:])
+
+    assert read_month(str(tmp_path), "c1", "2023-01").num_rows == 24
+
+
+def test_exported_values_match_analysis(tmp_path, analyzer):
+    start, end = datetime(2023, 1, 1), datetime(2023, 1, 3)
+    expected = analyzer.analyze_period(start, end)
+    export_analysis(analyzer, start, end, root=str(tmp_path), customer_id="c1")
+
+    table = read_month(str(tmp_path), "c1", "2023-01").to_pylist()
+    assert len(table) == len(expected)
+    for row, hour_data in zip(table, expected):
+        assert row["timestamp"] == hour_data["timestamp"]
+        assert row["usage_kwh"] == pytest.approx(float(hour_data["usage_kwh"]))
+        assert row["cost_total"] == pytest.approx(float(hour_data["cost"]["total"]))
+        assert row["price_distribution"] == pytest.approx(
+            float(hour_data["prices"]["distribution"])
+        )
+
+
+def test_row_groups_are_bounded(tmp_path, analyzer):
+    with AnalysisParquetWriter(
+        str(tmp_path), plan_types=["fixed_monthly", "distribution", "supply"], row_group_size=24
+    ) as writer:
+        writer.write("c1", analyzer.iter_period(datetime(2023, 1, 1), datetime(2023, 1, 11)))
+
+    files = list((tmp_path / "customer=c1" / "month=2023-01").iterdir())
+    assert len(files) == 1
+    metadata = pq.ParquetFile(files[0]).metadata
+    assert metadata.num_rows == 240
+    assert metadata.num_row_groups == 10
+
+
+def test_missing_components_are_null(tmp_path, analyzer):
+    with AnalysisParquetWriter(str(tmp_path), plan_types=["supply", "other"]) as writer:
+        writer.write("c1", analyzer.iter_period(datetime(2023, 1, 1), datetime(2023, 1, 2)))
+
+    table = read_month(str(tmp_path), "c1", "2023-01")
+    assert table.column("cost_other").null_count == 24
+    assert table.column("cost_supply").null_count == 0
@@ -0,0 +1,167 @@
+import itertools
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft.battery import Battery
+from saft.battery import dispatch
+from saft.battery import main
+from saft.compiled_tariff import align_spot_prices
+from saft.compiled_tariff import compile_tariff
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+from saft.ratepayer_old_model import DayAheadPricing
+from saft.resolution import usage_vector
+
+
+def brute_force_cost(battery, prices, usage):
+    """Cheapest cost over every sequence of state of charge levels"""
+    grid_energy = dict(zip(battery.moves(), battery.grid_energy(battery.moves())))
+    best = np.inf
+    for path in itertools.product(range(battery.levels + 1), repeat=len(prices)):
+        level, cost = battery.initial_level, 0.0
+        for price, kwh, next_level in zip(prices, usage, path):
+            move = next_level - level
+            if move not in grid_energy or kwh + grid_energy[move] < -1e-9:
+                break
+            cost += price * (kwh + grid_energy[move])
+            level = next_level
+        else:
+            best = min(best, cost)
+    return best
+
+
+def test_charges_cheap_and_discharges_expensive():
+    battery = Battery(
+        capacity_kwh=1, power_kw=1, charge_efficiency=1, discharge_efficiency=1, levels=4
+    )
+    result = dispatch(battery, [0.1, 1.0], [0.0, 1.0])
+
+    assert result.grid_kwh[0] == pytest.approx([1.0, 0.0])
+    assert result.soc_kwh[0] == pytest.approx([0.0, 1.0, 0.0])
+    assert result.cost[0] == pytest.approx(0.1)
+    assert result.savings[0] == pytest.approx(0.9)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    prices = rng.uniform(0.0, 0.3, 5)
+    usage = rng.uniform(0.0, 1.0, 5)
+    battery = Battery(
+        capacity_kwh=1.5, power_kw=1.0, charge_efficiency=0.9, discharge_efficiency=0.9, levels=3
+    )
+
+    result = dispatch(battery, prices, usage)
+
+    assert result.cost[0] == pytest.approx(brute_force_cost(battery, prices, usage))
+
+
+def test_respects_limits_and_never_exports():
+    rng = np.random.default_rng(3)
+    prices = rng.uniform(-0.05, 0.4, 24 * 14)
+    usage = rng.uniform(0.0, 2.0, (3, 24 * 14))
+    battery = Battery(capacity_kwh=5, power_kw=2, levels=10)
+
+    result = dispatch(battery, prices, usage)
+
+    assert np.all(result.grid_kwh >= 0)
+    assert np.all(result.discharge_kwh <= usage + 1e-9)
+    assert np.all(result.charge_kwh <= battery.power_kw + 1e-9)
+    assert np.all(result.discharge_kwh <= battery.power_kw + 1e-9)
+    assert np.all((result.soc_kwh >= 0) & (result.soc_kwh <= battery.capacity_kwh + 1e-9))
+    assert np.all(result.savings >= 0)
+
+
+def test_batches_and_workers_agree():
+    rng = np.random.default_rng(4)
+    prices = rng.uniform(0.0, 0.3, 48)
+    usage = rng.uniform(0.0, 1.5, (5, 48))
+    battery = Battery(capacity_kwh=4, power_kw=2, levels=8)
+
+    together = dispatch(battery, prices, usage)
+    batched = dispatch(battery, prices, usage, batch_size=2, workers=2)
+    alone = dispatch(battery, prices, usage[3])
+
+    assert batched.grid_kwh == pytest.approx(together.grid_kwh)
+    assert alone.grid_kwh[0] == pytest.approx(together.grid_kwh[3])
+
+
+def test_idle_without_price():
+    battery = Battery(capacity_kwh=2, power_kw=2, levels=4)
+    result = dispatch(battery, [0.1, np.nan, 1.0], [1.0, 1.0, 1.0])
+
+    assert result.grid_kwh[0][1] == 1.0
+    assert result.soc_kwh[0][1] == result.soc_kwh[0][2]
+
+
+def test_plugs_into_cost_engines(tariff_calendar, household_schedule, pricing_factory):
+    start, end = datetime(2023, 1, 2), datetime(2023, 1, 9)
+    index = pd.date_range(start, end, freq="h", inclusive="left")
+    pricing = pricing_factory("2023-01-02", [40 + 80 * (7 <= h % 24 <= 20) for h in range(168)])
+    tariff = compile_tariff(tariff_calendar, index, pricing=pricing)
+    usage = usage_vector(household_schedule, index)
+
+    result = dispatch(Battery(capacity_kwh=5, power_kw=2.5), tariff.total_price, usage)
+    with_battery = result.consumption(index)
+
+    assert (
+        tariff.summarize(with_battery.usage)["total_cost"] < tariff.summarize(usage)["total_cost"]
+    )
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, with_battery)
+    summary = analyzer.summarize_analysis(analyzer.analyze_period(start, end))
+    assert float(summary["total_usage_kwh"]) == pytest.approx(result.grid_kwh.sum(), rel=1e-5)
+
+
+def test_main():
+    summary = main(
+        prices_file="saft/sample_data/day_ahead_spot_2022_04_2024_07.csv",
+        consumption_file="test/energy_model_test.json",
+        start=datetime(2023, 1, 1),
+        end=datetime(2023, 2, 1),
+        capacity=10,
+        power=5,
+    )
+
+    assert summary["savings_with_battery"] > 0
+    assert summary["discharged_kwh"] < summary["charged_kwh"]
+
+
+def test_main_uses_the_months_of_the_dispatched_period(tmp_path):
+    # Only draws in July, so a profile that starts in January would be empty
+    consumption_file = tmp_path / "consumption.json"
+    consumption_file.write_text(
+        json.dumps(
+            [
+                {
+                    "name": "cooling",
+                    "consumption_periods": [
+                        {
+                            "start_time": "00:00:00",
+                            "stop_time": "23:59:59",
+                            "kw_draw": 1.0,
+                            "months": [7],
+                        }
+                    ],
+                }
+            ]
+        )
+    )
+    prices_file = "saft/sample_data/day_ahead_spot_2022_04_2024_07.csv"
+    start, end = datetime(2023, 6, 28), datetime(2023, 7, 5)
+
+    summary = main(
+        prices_file=prices_file,
+        consumption_file=str(consumption_file),
+        start=start,
+        end=end,
+        capacity=0.001,
+        power=0.001,
+    )
+
+    index = pd.date_range(start, end, freq="h", inclusive="left")
+    prices = align_spot_prices(DayAheadPricing.from_csv(prices_file, country_code="FI"), index)
+    july = index.month == 7
+    assert summary["cost_without_battery"] == pytest.approx(prices[july].sum() * 1.24)
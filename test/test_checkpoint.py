@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from saft.checkpoint import Checkpoint
+from saft.checkpoint import CheckpointStore
+from saft.checkpoint import run_units
+
+
+class Preempted(Exception):
+    pass
+
+
+def square(unit):
+    return unit * unit
+
+
+def append(state, result):
+    return state + [result]
+
+
+def preempt_at(stop_unit):
+    def compute(unit):
+        if unit == stop_unit:
+            raise Preempted()
+        return square(unit)
+
+    return compute
+
+
+def test_resume_is_identical_to_an_uninterrupted_run(tmp_path):
+    units = list(range(10))
+    expected = run_units(units, square, append, [], workers=1)
+
+    store = CheckpointStore(str(tmp_path), "job", min_interval=0)
+    with pytest.raises(Preempted):
+        run_units(units, preempt_at(6), append, [], store=store, workers=1)
+    assert store.load().next_unit == 6
+
+    computed = []
+
+    def compute(unit):
+        computed.append(unit)
+        return square(unit)
+
+    store = CheckpointStore(str(tmp_path), "job")
+    resumed = run_units(units, compute, append, [], store=store, workers=1)
+
+    assert resumed == expected
+    assert computed == [6, 7, 8, 9]
+
+
+def test_pending_results_are_merged_in_unit_order(tmp_path):
+    store = CheckpointStore(str(tmp_path), "job")
+    store.save(Checkpoint(state=[0, 1], next_unit=2, pending={4: 16}))
+
+    state = run_units(list(range(6)), square, append, [], store=store, workers=1)
+
+    assert state == [0, 1, 4, 9, 16, 25]
+
+
+def test_workers_give_the_same_result(tmp_path):
+    units = list(range(20))
+    store = CheckpointStore(str(tmp_path), "job", min_interval=0)
+
+    assert run_units(units, square, append, [], store=store, workers=3) == [u * u for u in units]
+    # A finished job is answered from its final checkpoint
+    assert run_units(units, preempt_at(0), append, [], store=store) == [u * u for u in units]
+
+
+def test_saves_are_throttled_and_atomic(tmp_path):
+    store = CheckpointStore(str(tmp_path), "job", min_interval=3600)
+
+    assert store.save(Checkpoint(state=1))
+    assert not store.save(Checkpoint(state=2))
+    assert store.load().state == 1
+    assert store.save(Checkpoint(state=3), force=True)
+    assert store.load().state == 3
+    assert os.listdir(tmp_path) == ["job.ckpt"]
+
+
+def test_unreadable_checkpoint_starts_over(tmp_path):
+    store = CheckpointStore(str(tmp_path), "job")
+    with open(store.path, "wb") as file:
+        file.write(b"truncated")
+
+    assert store.load() is None
+    assert run_units([1, 2], square, append, [], store=store, workers=1) == [1, 4]
@@ -0,0 +1,90 @@
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft.compiled_tariff import align_spot_prices
+from saft.compiled_tariff import compile_tariff
+from saft.compiled_tariff import TariffTable
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+
+
+def test_prices_match_calendar(tariff_calendar):
+    index = pd.date_range("2023-01-01", "2023-04-01", freq="h", inclusive="left")
+    prices = TariffTable.from_calendar(tariff_calendar).prices(index)
+
+    for i, timestamp in enumerate(index):
+        expected = tariff_calendar.get_price(timestamp=timestamp.to_pydatetime())["with_tax"]
+        for plan_type, type_prices in prices.items():
+            assert type_prices[i] == pytest.approx(float(expected.get(plan_type, 0))), (
+                timestamp,
+                plan_type,
+            )
+
+
+def test_fixed_monthly_charged_once_per_month(tariff_calendar):
+    index = pd.date_range("2023-01-15", "2023-03-15", freq="h")
+    fixed = TariffTable.from_calendar(tariff_calendar).prices(index)["fixed_monthly"]
+
+    charged = index[fixed > 0]
+    assert list(charged) == [
+        pd.Timestamp("2023-01-15"),
+        pd.Timestamp("2023-02-01"),
+        pd.Timestamp("2023-03-01"),
+    ]
+    assert fixed[fixed > 0] == pytest.approx([39.90 * 1.24] * 3)
+
+
+def test_window_is_compiled_over_its_own_intervals(tariff_calendar):
+    index = pd.date_range("2023-01-01", "2023-03-01", freq="h", inclusive="left")
+    tariff = compile_tariff(tariff_calendar, index)
+
+    for start, stop in [(30, 100), (700, 800), (0, len(index))]:
+        expected = compile_tariff(tariff_calendar, index[start:stop])
+        window = tariff.window(start, stop)
+        for plan_type, prices in expected.prices.items():
+            np.testing.assert_array_equal(window.prices[plan_type], prices)
+    # `slice` keeps the charges of the whole period
+    assert tariff.slice(30, 100).prices["fixed_monthly"].sum() == 0
+
+
+def test_summary_matches_analyzer(tariff_calendar, household_schedule):
+    start, end = datetime(2023, 1, 1), datetime(2023, 3, 1)
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+    expected = analyzer.summarize_analysis(analyzer.analyze_period(start, end))
+
+    index = pd.date_range(start, end, freq="h", inclusive="left")
+    usage = [float(household_schedule.get_usage(timestamp=ts)) for ts in index]
+    tariff = compile_tariff(tariff_calendar, index)
+    summary = tariff.summarize(np.array(usage))
+
+    assert summary["total_usage_kwh"] == pytest.approx(float(expected["total_usage_kwh"]))
+    assert summary["total_cost"] == pytest.approx(float(expected["total_cost"].amount))
+    for plan_type, cost in expected["cost_by_type"].items():
+        assert summary["cost_by_type"][plan_type] == pytest.approx(float(cost))
+    assert summary["peak_usage_hour"] == expected["peak_usage_hour"]
+    assert summary["peak_cost_hour"] == expected["peak_cost_hour"]
+
+
+def test_spot_prices_are_aligned_and_taxed(tariff_calendar, pricing_factory):
+    pricing = pricing_factory("2023-01-01", [100.0, 200.0, 300.0])
+    index = pd.date_range("2023-01-01", periods=4, freq="h")
+
+    assert align_spot_prices(pricing, index)[:3] == pytest.approx([0.1, 0.2, 0.3])
+    assert np.isnan(align_spot_prices(pricing, index)[3])
+
+    tariff = compile_tariff(
+        tariff_calendar, index, pricing=pricing, spot_tax_multiplier=Decimal("1.1")
+    )
+    assert tariff.prices["spot"][:3] == pytest.approx([0.11, 0.22, 0.33])
+    summary = tariff.summarize(np.ones(4))
+    assert summary["missing_price_hours"] == 1
+    assert summary["cost_by_type"]["spot"] == pytest.approx(0.66)
+
+
+def test_usage_length_is_checked(tariff_calendar):
+    tariff = compile_tariff(tariff_calendar, pd.date_range("2023-01-01", periods=4, freq="h"))
+    with pytest.raises(ValueError):
+        tariff.costs(np.ones(3))
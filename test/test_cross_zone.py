@@ -0,0 +1,149 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft.compiled_tariff import compile_tariff
+from saft.cross_zone import compare_zones
+from saft.cross_zone import main
+from saft.cross_zone import ZonePrices
+from saft.resolution import usage_vector
+
+
+START, END = datetime(2023, 1, 2), datetime(2023, 1, 9)
+INDEX = pd.date_range(START, END, freq="h", inclusive="left")
+
+
+def zone_pricing(pricing_factory, zone, prices_mwh, start="2023-01-02", tz="Europe/Helsinki"):
+    pricing = pricing_factory(start, prices_mwh, tz=tz)
+    pricing.zone_code = zone
+    return pricing
+
+
+@pytest.fixture
+def zones(pricing_factory):
+    hours = np.arange(len(INDEX))
+    return [
+        zone_pricing(pricing_factory, "FI", list(60 + 30 * np.sin(hours / 4))),
+        zone_pricing(pricing_factory, "SE3", list(40 + 10 * np.sin(hours / 4))),
+        # Publishes only the first three days
+        zone_pricing(pricing_factory, "EE", list(20 + 0 * hours[: 3 * 24])),
+    ]
+
+
+def test_each_zone_matches_its_own_compiled_tariff(zones, tariff_calendar, household_schedule):
+    usage = usage_vector(household_schedule, INDEX)
+    tariff = compile_tariff(tariff_calendar, INDEX)
+
+    comparison = compare_zones(ZonePrices.from_pricings(zones, INDEX), usage, tariff=tariff)
+
+    for pricing in zones:
+        expected = compile_tariff(tariff_calendar, INDEX, pricing=pricing).summarize(usage)
+        summary = comparison["zones"][pricing.zone_code]
+        for key, value in expected.items():
+            assert summary[key] == pytest.approx(value), key
+
+
+def test_missing_hours_are_handled_per_zone(zones, household_schedule):
+    usage = usage_vector(household_schedule, INDEX)
+
+    comparison = compare_zones(ZonePrices.from_pricings(zones, INDEX), usage)
+    estonia = comparison["zones"]["EE"]
+
+    assert [comparison["zones"][zone]["missing_price_hours"] for zone in ["FI", "SE3"]] == [0, 0]
+    assert estonia["missing_price_hours"] == 4 * 24
+    assert estonia["average_spot_price_per_kwh"] == pytest.approx(0.02 * 1.24)
+    assert estonia["estimated_total_cost"] == pytest.approx(0.02 * 1.24 * usage.sum())
+    assert estonia["total_cost"] < estonia["estimated_total_cost"]
+    assert comparison["ranking"] == ["EE", "SE3", "FI"]
+    assert [comparison["zones"][zone]["rank"] for zone in ["EE", "SE3", "FI"]] == [1, 2, 3]
+
+
+def test_ranking_uses_estimated_cost(pricing_factory, household_schedule):
+    usage = usage_vector(household_schedule, INDEX)
+    full = zone_pricing(pricing_factory, "FULL", [50.0] * len(INDEX))
+    # More expensive, but only published for one day
+    partial = zone_pricing(pricing_factory, "PARTIAL", [60.0] * 24)
+
+    comparison = compare_zones(ZonePrices.from_pricings([partial, full], INDEX), usage)
+
+    assert comparison["zones"]["PARTIAL"]["total_cost"] < comparison["zones"]["FULL"]["total_cost"]
+    assert comparison["ranking"] == ["FULL", "PARTIAL"]
+
+
+def test_zones_are_aligned_in_their_own_time_zone(pricing_factory):
+    helsinki = zone_pricing(pricing_factory, "FI", list(range(len(INDEX))))
+    stockholm = zone_pricing(pricing_factory, "SE3", list(range(len(INDEX))), tz="Europe/Stockholm")
+
+    zone_prices = ZonePrices.from_pricings(
+        [helsinki, stockholm], INDEX, timezones={"SE3": "Europe/Stockholm"}
+    )
+
+    np.testing.assert_allclose(zone_prices.prices[0], zone_prices.prices[1])
+    assert not zone_prices.missing.any()
+
+
+def test_rejects_mismatched_inputs(zones):
+    zone_prices = ZonePrices.from_pricings(zones, INDEX)
+
+    with pytest.raises(ValueError):
+        compare_zones(zone_prices, np.ones(len(INDEX) - 1))
+    with pytest.raises(ValueError):
+        ZonePrices(zones=["FI", "FI"], index=INDEX, prices=np.zeros((2, len(INDEX))))
+
+
+def test_main(tmp_path):
+    prices_file = "saft/sample_data/day_ahead_spot_2022_04_2024_07.csv"
+    prices = pd.read_csv(prices_file)
+    partial_file = str(tmp_path / "partial.csv")
+    prices[prices["Timestamp"] < "2023-01-15"].to_csv(partial_file, index=False)
+
+    comparison = main(
+        zone_files={"FI": prices_file, "PARTIAL": partial_file},
+        consumption_file="test/energy_model_test.json",
+        start=datetime(2023, 1, 1),
+        end=datetime(2023, 2, 1),
+        transfer_price=Decimal("0.05"),
+    )
+
+    full, partial = comparison["zones"]["FI"], comparison["zones"]["PARTIAL"]
+    assert full["missing_price_hours"] == 0
+    assert partial["missing_price_hours"] == 17 * 24
+    assert partial["cost_by_type"]["transfer"] == full["cost_by_type"]["transfer"]
+
+
+def test_main_uses_the_months_of_the_costed_period(tmp_path):
+    # Only draws in July, so a profile that starts in January would be empty
+    consumption_file = tmp_path / "consumption.json"
+    consumption_file.write_text(
+        json.dumps(
+            [
+                {
+                    "name": "cooling",
+                    "consumption_periods": [
+                        {
+                            "start_time": "00:00:00",
+                            "stop_time": "23:59:59",
+                            "kw_draw": 1.0,
+                            "months": [7],
+                        }
+                    ],
+                }
+            ]
+        )
+    )
+
+    comparison = main(
+        zone_files={"FI": "saft/sample_data/day_ahead_spot_2022_04_2024_07.csv"},
+        consumption_file=str(consumption_file),
+        start=datetime(2023, 6, 28),
+        end=datetime(2023, 7, 5),
+        transfer_price=Decimal("0.05"),
+    )
+
+    fi = comparison["zones"]["FI"]
+    assert fi["total_usage_kwh"] == 4 * 24
+    assert fi["cost_by_type"]["transfer"] == pytest.approx(0.05 * 1.24 * 4 * 24)
@@ -0,0 +1,200 @@
+from datetime import datetime
+from datetime import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft.compiled_tariff import compile_tariff
+from saft.incremental import DailySpotPrices
+from saft.incremental import IncrementalCostStore
+from saft.ratepayer_model import TimeRange
+from saft.ratepayer_model import UsagePattern
+from saft.resolution import usage_vector
+
+
+START = datetime(2023, 1, 1)
+END = datetime(2023, 3, 1)
+
+
+def spot_mwh(hours, offset=0):
+    return [round(60 + 40 * np.sin((h + offset) / 5), 2) for h in range(hours)]
+
+
+def expected_summary(calendar, schedule, pricing):
+    index = pd.date_range(START, END, freq="h", inclusive="left")
+    tariff = compile_tariff(calendar, index, pricing=pricing)
+    summary = tariff.summarize(usage_vector(schedule, index))
+    summary["peak_usage_hour"] = index[summary["peak_usage_hour"]].isoformat()
+    summary["peak_cost_hour"] = index[summary["peak_cost_hour"]].isoformat()
+    return summary
+
+
+def assert_summary_equal(summary, expected):
+    assert summary["total_usage_kwh"] == pytest.approx(expected["total_usage_kwh"])
+    assert summary["total_cost"] == pytest.approx(expected["total_cost"])
+    assert summary["cost_by_type"] == pytest.approx(expected["cost_by_type"])
+    assert summary["missing_price_hours"] == expected["missing_price_hours"]
+    assert summary["peak_usage_hour"] == expected["peak_usage_hour"]
+    assert summary["peak_cost_hour"] == expected["peak_cost_hour"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IncrementalCostStore(str(tmp_path / "state"))
+
+
+def test_first_refresh_costs_whole_contract(
+    store, tariff_calendar, household_schedule, pricing_factory
+):
+    pricing = pricing_factory("2023-01-01", spot_mwh(20 * 24))
+    prices = DailySpotPrices.from_pricing(pricing)
+
+    state, costed = store.refresh(
+        "c1", tariff_calendar, household_schedule, prices, start=START, end=END
+    )
+
+    assert costed == 59
+    assert_summary_equal(
+        state.summary(), expected_summary(tariff_calendar, household_schedule, pricing)
+    )
+
+
+def test_appended_prices_recost_only_new_days(
+    store, tariff_calendar, household_schedule, pricing_factory
+):
+    pricing = pricing_factory("2023-01-01", spot_mwh(20 * 24))
+    store.refresh(
+        "c1",
+        tariff_calendar,
+        household_schedule,
+        DailySpotPrices.from_pricing(pricing),
+        start=START,
+        end=END,
+    )
+
+    extended = pricing_factory("2023-01-01", spot_mwh(22 * 24))
+    state, costed = store.refresh(
+        "c1",
+        tariff_calendar,
+        household_schedule,
+        DailySpotPrices.from_pricing(extended),
+        start=START,
+        end=END,
+    )
+
+    assert costed == 2
+    assert_summary_equal(
+        state.summary(), expected_summary(tariff_calendar, household_schedule, extended)
+    )
+
+
+def test_corrected_peak_hour_moves_the_peak(
+    store, tariff_calendar, household_schedule, pricing_factory
+):
+    del tariff_calendar.pricing_plans["fixed_monthly"]  # Would be the peak cost hour
+    prices_mwh = spot_mwh(20 * 24)
+    pricing = pricing_factory("2023-01-01", prices_mwh)
+    state, _ = store.refresh(
+        "c1",
+        tariff_calendar,
+        household_schedule,
+        DailySpotPrices.from_pricing(pricing),
+        start=START,
+        end=END,
+    )
+    peak = pd.Timestamp(state.summary()["peak_cost_hour"])
+
+    corrected_mwh = list(prices_mwh)
+    corrected_mwh[int((peak - pd.Timestamp("2023-01-01")) / pd.Timedelta(hours=1))] = 0.0
+    corrected = pricing_factory("2023-01-01", corrected_mwh)
+    state, costed = store.refresh(
+        "c1",
+        tariff_calendar,
+        household_schedule,
+        DailySpotPrices.from_pricing(corrected),
+        start=START,
+        end=END,
+    )
+
+    assert costed == 1
+    assert pd.Timestamp(state.summary()["peak_cost_hour"]) != peak
+    assert_summary_equal(
+        state.summary(), expected_summary(tariff_calendar, household_schedule, corrected)
+    )
+
+
+def test_recosted_days_find_the_fixed_charge_in_the_calendar(
+    store, tariff_calendar, household_schedule, pricing_factory
+):
+    fixed_plan = tariff_calendar.pricing_plans["fixed_monthly"][0]
+    fixed_plan.start_date = datetime(2023, 1, 15, 12)  # Charged mid-month in January
+    prices_mwh = spot_mwh(20 * 24)
+    pricing = pricing_factory("2023-01-01", prices_mwh)
+    store.refresh(
+        "c1",
+        tariff_calendar,
+        household_schedule,
+        DailySpotPrices.from_pricing(pricing),
+        start=START,
+        end=END,
+    )
+
+    corrected_mwh = list(prices_mwh)
+    for day in (15, 18):
+        corrected_mwh[(day - 1) * 24 + 3] = 0.0
+    corrected = pricing_factory("2023-01-01", corrected_mwh)
+    state, costed = store.refresh(
+        "c1",
+        tariff_calendar,
+        household_schedule,
+        DailySpotPrices.from_pricing(corrected),
+        start=START,
+        end=END,
+    )
+
+    assert costed == 2
+    assert state.days["2023-01-15"]["cost_by_type"]["fixed_monthly"] > 0.0
+    assert state.days["2023-01-18"]["cost_by_type"]["fixed_monthly"] == 0.0
+    assert_summary_equal(
+        state.summary(), expected_summary(tariff_calendar, household_schedule, corrected)
+    )
+
+
+def test_state_is_persisted(tmp_path, tariff_calendar, household_schedule, pricing_factory):
+    prices = DailySpotPrices.from_pricing(pricing_factory("2023-01-01", spot_mwh(24)))
+    first, _ = IncrementalCostStore(str(tmp_path)).refresh(
+        "c1", tariff_calendar, household_schedule, prices, start=START, end=END
+    )
+
+    state, costed = IncrementalCostStore(str(tmp_path)).refresh(
+        "c1", tariff_calendar, household_schedule, prices, start=START, end=END
+    )
+
+    assert costed == 0
+    assert state.days == first.days
+    assert_summary_equal(state.summary(), first.summary())
+
+
+def test_changed_usage_recosts_everything(
+    store, tariff_calendar, household_schedule, pricing_factory
+):
+    prices = DailySpotPrices.from_pricing(pricing_factory("2023-01-01", spot_mwh(24)))
+    store.refresh("c1", tariff_calendar, household_schedule, prices, start=START, end=END)
+
+    household_schedule.add_usage_pattern(
+        pattern=UsagePattern(
+            name="Sauna",
+            start_date=START,
+            end_date=END,
+            time_range=TimeRange(start=time(19), end=time(20)),
+            days_of_week=[5],
+            kwh=Decimal("6"),
+        )
+    )
+    _, costed = store.refresh(
+        "c1", tariff_calendar, household_schedule, prices, start=START, end=END
+    )
+
+    assert costed == 59
@@ -0,0 +1,137 @@
+import json
+
+import pandas as pd
+import pytest
+
+from saft import market_fit
+from saft.market_fit import MarketModelFitter
+
+
+SAMPLE_CSV = "saft/sample_data/day_ahead_spot_2022_04_2024_07.csv"
+
+
+def test_min_max_per_month_and_peak(pricing_factory):
+    # 2023-01-02 00:00 local, hours 6-9 and 17-20 are peak
+    pricing = pricing_factory("2023-01-02", list(range(24)))
+    fitter = MarketModelFitter()
+    fitter.update(pricing.price_series())
+
+    assert fitter.to_market_data() == [
+        {
+            "month": 1,
+            "peak": {"min": 0.006, "max": 0.02},
+            "off-peak": {"min": 0.0, "max": 0.023},
+        }
+    ]
+
+
+def test_quantiles(pricing_factory):
+    pricing = pricing_factory("2023-01-02", list(range(24)))
+    fitter = MarketModelFitter()
+    fitter.update(pricing.price_series())
+
+    market_data = fitter.to_market_data(quantiles=(0.25, 0.75))
+    # peak prices 6,7,8,9,17,18,19,20 -> nearest-rank 25% is the 2nd, 75% the 6th value
+    assert market_data[0]["peak"] == {"min": 0.007, "max": 0.018}
+
+
+def test_invalid_quantiles():
+    with pytest.raises(ValueError):
+        MarketModelFitter().to_market_data(quantiles=(0.9, 0.1))
+
+
+def test_chunked_fit_matches_single_pass():
+    single = MarketModelFitter()
+    for chunk in market_fit.iter_csv_price_chunks(SAMPLE_CSV, chunksize=1_000_000):
+        single.update(chunk)
+
+    chunked = MarketModelFitter()
+    for chunk in market_fit.iter_csv_price_chunks(SAMPLE_CSV, chunksize=997):
+        chunked.update(chunk)
+
+    assert len(single.to_market_data()) == 12
+    assert chunked.to_market_data() == single.to_market_data()
+    assert chunked.to_market_data((0.05, 0.95)) == single.to_market_data((0.05, 0.95))
+
+
+def test_merge_equals_combined_fit(pricing_factory):
+    first = pricing_factory("2023-01-02", [10, 20, 30] * 8)
+    second = pricing_factory("2023-01-03", [5, 50, 15] * 8)
+
+    left = MarketModelFitter()
+    left.update(first.price_series())
+    right = MarketModelFitter()
+    right.update(second.price_series())
+    left.merge(right)
+
+    combined = MarketModelFitter()
+    combined.update(pd.concat([first.price_series(), second.price_series()]))
+
+    assert left.to_market_data() == combined.to_market_data()
+    assert left.last_timestamp == combined.last_timestamp
+
+
+def test_incremental_refit_after_update_prices(tmp_path, pricing_factory):
+    pricing = pricing_factory("2023-01-02", [10] * 24)
+    fitter = MarketModelFitter()
+    assert fitter.update_from_pricing(pricing) == 24
+
+    state_file = tmp_path / "state.json"
+    fitter.save(state_file)
+    fitter = MarketModelFitter.load(state_file)
+
+    new_day = pd.DataFrame(
+        {"Price": [100.0] * 24},
+        index=pd.date_range("2023-01-03", periods=24, freq="h", tz="Europe/Helsinki"),
+    )
+    pricing.update_prices(new_day)
+
+    assert fitter.update_from_pricing(pricing) == 24
+    assert fitter.update_from_pricing(pricing) == 0
+    assert fitter.to_market_data()[0]["off-peak"] == {"min": 0.01, "max": 0.1}
+
+
+def test_main_writes_market_file(tmp_path):
+    market_file = tmp_path / "market.json"
+    state_file = tmp_path / "state.json"
+
+    result = market_fit.main(
+        prices_file=SAMPLE_CSV,
+        market_file=str(market_file),
+        quantiles=(0.05, 0.95),
+        chunksize=5000,
+        state_file=str(state_file),
+    )
+
+    with open(market_file) as file:
+        assert json.load(file) == result
+    assert [m["month"] for m in result] == list(range(1, 13))
+    assert all(m["peak"]["min"] <= m["peak"]["max"] for m in result)
+
+    # rerunning against the same history adds nothing new to the saved state
+    assert (
+        market_fit.main(
+            prices_file=SAMPLE_CSV,
+            market_file=str(market_file),
+            quantiles=(0.05, 0.95),
+            state_file=str(state_file),
+        )
+        == result
+    )
+
+
+def test_main_rejects_a_time_zone_other_than_the_states(tmp_path):
+    state_file = tmp_path / "state.json"
+    MarketModelFitter(tz="UTC").save(state_file)
+    kwargs = dict(
+        prices_file=SAMPLE_CSV,
+        market_file=str(tmp_path / "market.json"),
+        state_file=str(state_file),
+    )
+
+    with pytest.raises(ValueError):
+        market_fit.main(tz="Europe/Helsinki", **kwargs)
+    assert MarketModelFitter.load(state_file).last_timestamp is None
+
+    market_fit.main(tz="UTC", **kwargs)
+    assert MarketModelFitter.load(state_file).tz == "UTC"
@@ -0,0 +1,216 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft import meter_data
+from saft.compiled_tariff import compile_tariff
+from saft.meter_data import align_consumption
+from saft.meter_data import cost_meter_file
+from saft.meter_data import iter_meter_readings
+from saft.meter_data import main
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+
+
+def write_meter_file(path, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["metering_point_id", "timestamp", "kwh"])
+        writer.writerows(rows)
+    return str(path)
+
+
+def hourly_rows(metering_point, start, kwh):
+    index = pd.date_range(start, periods=len(kwh), freq="h", tz="Europe/Helsinki")
+    return [(metering_point, ts.isoformat(), value) for ts, value in zip(index, kwh)]
+
+
+def test_readings_are_grouped_across_chunks(tmp_path):
+    rows = hourly_rows("001", "2023-01-01", [1.0] * 7) + hourly_rows("002", "2023-01-01", [2.0] * 3)
+    path = write_meter_file(tmp_path / "meters.csv", rows)
+
+    points = list(iter_meter_readings(path, chunksize=3))
+
+    assert [(point, len(readings)) for point, readings in points] == [("001", 7), ("002", 3)]
+    assert str(points[0][1].index.tz) == "UTC"
+    assert points[1][1].sum() == 6.0
+
+
+def test_non_contiguous_metering_point_is_rejected(tmp_path):
+    rows = (
+        hourly_rows("001", "2023-01-01", [1.0])
+        + hourly_rows("002", "2023-01-01", [1.0])
+        + hourly_rows("001", "2023-01-01 01:00", [1.0])
+    )
+    path = write_meter_file(tmp_path / "meters.csv", rows)
+
+    with pytest.raises(ValueError):
+        list(iter_meter_readings(path))
+
+
+def test_alignment_handles_gaps_and_corrections():
+    index = pd.date_range("2023-01-01", periods=4, freq="h")
+    readings = pd.Series(
+        [1.0, 5.0, 2.0, 4.0],
+        index=pd.to_datetime(
+            [
+                "2023-01-01 00:00+02:00",
+                "2023-01-01 01:00+02:00",
+                "2023-01-01 01:00+02:00",  # Corrected reading, replaces the previous one
+                "2023-01-01 03:00+02:00",
+            ],
+            utc=True,
+        ),
+    )
+
+    aligned = align_consumption("001", readings, index)
+
+    assert list(aligned.usage) == [1.0, 2.0, 0.0, 4.0]
+    assert list(aligned.missing) == [False, False, True, False]
+    assert aligned.coverage == 0.75
+
+
+def test_every_appended_correction_wins():
+    utc = pd.date_range("2023-01-01", periods=5000, freq="h", tz="UTC")
+    corrected = np.random.default_rng(0).choice(len(utc), size=2000, replace=False)
+    readings = pd.concat(
+        [
+            pd.Series(np.ones(len(utc)), index=utc),
+            pd.Series(np.full(len(corrected), 2.0), index=utc[corrected]),
+        ]
+    )
+    index = pd.date_range("2023-01-01", periods=len(utc), freq="h")
+
+    aligned = align_consumption("001", readings, index, tz="UTC")
+
+    assert aligned.usage.sum() == len(utc) + len(corrected)
+    assert (aligned.usage[corrected] == 2.0).all()
+
+
+def test_dst_repeated_hour_is_summed():
+    utc = pd.date_range("2023-10-28 23:00", periods=4, freq="h", tz="UTC")  # 02..04 local
+    readings = pd.Series([1.0, 2.0, 3.0, 4.0], index=utc)
+    index = pd.date_range("2023-10-29 02:00", periods=3, freq="h")
+
+    aligned = align_consumption("001", readings, index)
+
+    assert list(aligned.usage) == [1.0, 5.0, 4.0]
+    assert aligned.usage.sum() == readings.sum()
+
+
+def test_naive_timestamps_are_local_time_across_dst(tmp_path):
+    local_hours = ["01:00", "02:00", "03:00", "03:00", "04:00", "02:00"]  # 03:00 repeats
+    kwh = [1.0, 1.0, 1.0, 1.0, 1.0, 3.0]  # Ends with a correction of 02:00
+    rows = [("001", f"2023-10-29T{hour}:00", value) for hour, value in zip(local_hours, kwh)]
+    path = write_meter_file(tmp_path / "meters.csv", rows)
+    index = pd.date_range("2023-10-29 01:00", periods=4, freq="h")
+
+    [(_, readings)] = list(iter_meter_readings(path, chunksize=2))
+    aligned = align_consumption("001", readings, index)
+
+    assert list(readings.index[2:4]) == [
+        pd.Timestamp("2023-10-29 00:00", tz="UTC"),
+        pd.Timestamp("2023-10-29 01:00", tz="UTC"),
+    ]
+    assert list(aligned.usage) == [1.0, 3.0, 2.0, 1.0]
+    assert not aligned.missing.any()
+
+
+def test_quarter_hour_readings_are_summed_to_hours():
+    utc = pd.date_range("2022-12-31 22:00", periods=8, freq="15min", tz="UTC")
+    readings = pd.Series(np.arange(8, dtype=float), index=utc)
+    index = pd.date_range("2023-01-01", periods=2, freq="h")
+
+    aligned = align_consumption("001", readings, index)
+
+    assert list(aligned.usage) == [6.0, 22.0]
+
+
+def test_summary_matches_analyzer(tmp_path, tariff_calendar, pricing_factory):
+    start, end = datetime(2023, 1, 1), datetime(2023, 1, 3)
+    kwh = [round(0.2 + (h % 24) / 10, 1) for h in range(48)]
+    path = write_meter_file(tmp_path / "meters.csv", hourly_rows("001", "2023-01-01", kwh))
+    pricing = pricing_factory("2023-01-01", [50.0 + h for h in range(48)])
+
+    index = pd.date_range(start, end, freq="h", inclusive="left")
+    tariff = compile_tariff(tariff_calendar, index, pricing=pricing)
+    [(metering_point, summary)] = list(cost_meter_file(path, tariff))
+
+    consumption = align_consumption("001", next(iter_meter_readings(path))[1], index)
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, consumption)
+    expected = analyzer.summarize_analysis(analyzer.analyze_period(start, end))
+
+    assert metering_point == "001"
+    assert summary["total_usage_kwh"] == pytest.approx(sum(kwh))
+    assert summary["total_usage_kwh"] == pytest.approx(float(expected["total_usage_kwh"]))
+    for plan_type, cost in expected["cost_by_type"].items():
+        assert summary["cost_by_type"][plan_type] == pytest.approx(float(cost), rel=1e-4)
+    assert summary["peak_usage_hour"] == expected["peak_usage_hour"]
+    assert summary["missing_usage_hours"] == 0
+
+
+def test_main_writes_one_row_per_meter(tmp_path):
+    rows = hourly_rows("001", "2023-01-01", [1.0] * 24) + hourly_rows(
+        "002", "2023-01-01", [2.0] * 12
+    )
+    meter_file = write_meter_file(tmp_path / "meters.csv", rows)
+    output = tmp_path / "summary.csv"
+
+    count = main(
+        meter_file=meter_file,
+        prices_file="saft/sample_data/day_ahead_spot_2022_04_2024_07.csv",
+        start=datetime(2023, 1, 1),
+        end=datetime(2023, 1, 2),
+        output=str(output),
+        chunksize=10,
+    )
+
+    with open(output) as file:
+        written = list(csv.DictReader(file))
+    assert count == 2
+    assert [row["metering_point_id"] for row in written] == ["001", "002"]
+    assert float(written[1]["total_usage_kwh"]) == 24.0
+    assert written[1]["missing_usage_hours"] == "12"
+    assert float(written[0]["cost_spot"]) > 0
+
+
+def test_interrupted_portfolio_resumes_after_the_last_costed_file(tmp_path, monkeypatch):
+    meter_files = [
+        write_meter_file(
+            tmp_path / f"meters-{n}.csv", hourly_rows(f"00{n}", "2023-01-01", [n] * 24)
+        )
+        for n in range(1, 4)
+    ]
+    kwargs = dict(
+        meter_file=meter_files,
+        prices_file="saft/sample_data/day_ahead_spot_2022_04_2024_07.csv",
+        start=datetime(2023, 1, 1),
+        end=datetime(2023, 1, 2),
+        checkpoint_dir=str(tmp_path / "checkpoints"),
+    )
+    main(output=str(tmp_path / "expected.csv"), **{**kwargs, "checkpoint_dir": None})
+
+    cost_meter_file = meter_data.cost_meter_file
+    costed = []
+
+    def preempted(file_path, *args, **kwargs):
+        if file_path == meter_files[1]:
+            raise KeyboardInterrupt()
+        return cost_meter_file(file_path, *args, **kwargs)
+
+    def recorded(file_path, *args, **kwargs):
+        costed.append(file_path)
+        return cost_meter_file(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(meter_data, "cost_meter_file", preempted)
+    with pytest.raises(KeyboardInterrupt):
+        main(output=str(tmp_path / "summary.csv"), **kwargs)
+    monkeypatch.setattr(meter_data, "cost_meter_file", recorded)
+    count = main(output=str(tmp_path / "summary.csv"), **kwargs)
+
+    assert count == 3
+    assert costed == meter_files[1:]
+    with open(tmp_path / "summary.csv") as resumed, open(tmp_path / "expected.csv") as expected:
+        assert resumed.read() == expected.read()
@@ -0,0 +1,128 @@
+from datetime import datetime
+from decimal import Decimal
+from decimal import localcontext
+from decimal import ROUND_DOWN
+
+import pandas as pd
+import pytest
+
+from saft.compiled_tariff import TariffTable
+from saft.parallel_analysis import month_partitions
+from saft.parallel_analysis import parallel_summarize
+from saft.ratepayer_model import ElectricityPriceCalendar
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+from saft.ratepayer_model import PartialSummary
+from saft.ratepayer_model import PricingPlan
+from saft.ratepayer_old_model import PreciseAmount
+from saft.resolution import QUARTER_HOUR
+
+
+def assert_summaries_identical(summary, expected):
+    assert summary["total_usage_kwh"] == expected["total_usage_kwh"]
+    assert summary["total_cost"].amount == expected["total_cost"].amount
+    assert summary["cost_by_type"] == expected["cost_by_type"]
+    assert summary["average_price_per_kwh"].amount == expected["average_price_per_kwh"].amount
+    assert summary["peak_usage_hour"] == expected["peak_usage_hour"]
+    assert summary["peak_cost_hour"] == expected["peak_cost_hour"]
+
+
+@pytest.fixture
+def january_fee_calendar():
+    """A fixed fee charged only in January, over a contract spanning two of them"""
+    calendar = ElectricityPriceCalendar()
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="January Fee",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2024, 2, 1),
+            months=[1],
+            price=PreciseAmount(amount=Decimal("10")),
+            plan_type="fixed_monthly",
+            is_fixed_monthly=True,
+        )
+    )
+    return calendar
+
+
+def test_month_partitions():
+    assert month_partitions(datetime(2023, 1, 15), datetime(2023, 3, 10)) == [
+        (datetime(2023, 1, 15), datetime(2023, 2, 1)),
+        (datetime(2023, 2, 1), datetime(2023, 3, 1)),
+        (datetime(2023, 3, 1), datetime(2023, 3, 10)),
+    ]
+    # Boundaries stay on the grid of the analyzed intervals
+    partitions = month_partitions(datetime(2023, 1, 31, 23, 10), datetime(2023, 2, 2), QUARTER_HOUR)
+    assert partitions == [
+        (datetime(2023, 1, 31, 23, 10), datetime(2023, 2, 1, 0, 10)),
+        (datetime(2023, 2, 1, 0, 10), datetime(2023, 2, 2)),
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_summary_is_identical(tariff_calendar, household_schedule, workers):
+    start, end = datetime(2023, 1, 10), datetime(2023, 4, 5)
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+
+    with localcontext() as ctx:
+        ctx.prec = 7  # Workers have to round like the caller
+        expected = analyzer.summarize_analysis(analyzer.analyze_period(start, end))
+        summary = parallel_summarize(analyzer, start, end, workers=workers)
+
+    assert_summaries_identical(summary, expected)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_summary_follows_the_rounding_mode(tariff_calendar, household_schedule, workers):
+    start, end = datetime(2023, 1, 10), datetime(2023, 3, 5)
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+
+    with localcontext() as ctx:
+        ctx.prec = 4
+        ctx.rounding = ROUND_DOWN
+        expected = analyzer.summarize_analysis(analyzer.analyze_period(start, end))
+        summary = parallel_summarize(analyzer, start, end, workers=workers)
+
+    assert_summaries_identical(summary, expected)
+
+
+def test_fixed_charges_do_not_depend_on_earlier_analyses(tariff_calendar, household_schedule):
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+    first = analyzer.summarize_analysis(
+        analyzer.analyze_period(datetime(2023, 1, 1), datetime(2023, 1, 2))
+    )
+    again = analyzer.summarize_analysis(
+        analyzer.analyze_period(datetime(2023, 1, 1), datetime(2023, 1, 2))
+    )
+
+    assert again["cost_by_type"]["fixed_monthly"] == first["cost_by_type"]["fixed_monthly"] > 0
+
+
+def test_fixed_charge_repeats_in_the_same_month_of_the_next_year(january_fee_calendar):
+    start, end = datetime(2023, 1, 1), datetime(2024, 2, 1)
+    index = pd.date_range(start, end, freq="h", inclusive="left")
+    fee = TariffTable.from_calendar(january_fee_calendar).prices(index)["fixed_monthly"]
+    assert list(index[fee > 0]) == [pd.Timestamp("2023-01-01"), pd.Timestamp("2024-01-01")]
+
+    charged = [
+        timestamp
+        for timestamp in index[:48].append(index[-31 * 24 :])
+        if january_fee_calendar.get_price(timestamp=timestamp.to_pydatetime())["with_tax"].get(
+            "fixed_monthly"
+        )
+    ]
+    assert charged == [pd.Timestamp("2023-01-01"), pd.Timestamp("2024-01-01")]
+
+
+def test_merge_keeps_the_earliest_peak():
+    def hour(usage):
+        return {"usage_kwh": Decimal(usage), "cost": {"total": Decimal(usage)}}
+
+    first, second = PartialSummary(), PartialSummary()
+    first.update([hour("1"), hour("3"), hour("2")])
+    second.update([hour("3"), hour("4"), hour("4")])
+
+    assert first.merge(second).peak_usage_hour == 4
+    second.update([hour("5")])
+    merged = PartialSummary().merge(first).merge(second)
+    assert merged.peak_cost_hour == 6
+    assert merged.intervals == 7
@@ -0,0 +1,161 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft.price_model import cached_fit_price_model
+from saft.price_model import calendar_features
+from saft.price_model import fit_price_model
+from saft.price_model import forecast_features
+from saft.price_model import main
+from saft.price_model import scenario_index
+from saft.price_model import ScenarioBank
+from saft.result_cache import ResultCache
+from saft.simulate import load_data
+from saft.sweep import compile_profile
+
+
+PRICES_FILE = "saft/sample_data/day_ahead_spot_2022_04_2024_07.csv"
+
+
+def synthetic_forecasts(start, periods, seed=0, freq="15min"):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq=freq, tz="UTC")
+    hours = (index - index[0]) / pd.Timedelta(hours=1)
+    return pd.DataFrame(
+        {
+            "Solar": np.clip(np.sin((index.hour - 6) / 12 * np.pi), 0, None) * 500,
+            "Wind Onshore": 2000 + 1500 * np.sin(hours / 37) + rng.normal(0, 200, len(index)),
+        },
+        index=index,
+    )
+
+
+@pytest.fixture
+def wind_market():
+    """Prices that fall with the wind forecast, with a daily pattern and noise"""
+    forecasts = synthetic_forecasts("2023-01-01", 120 * 24 * 4)
+    hourly = forecasts.resample("h").mean()
+    rng = np.random.default_rng(1)
+    prices = pd.Series(
+        0.15
+        - 0.00004 * hourly["Wind Onshore"].to_numpy()
+        + 0.02 * np.isin(hourly.index.hour, [6, 7, 8, 15, 16, 17])
+        + rng.normal(0, 0.005, len(hourly)),
+        index=hourly.index,
+    )
+    return prices, forecasts
+
+
+def test_features_are_local_and_hourly():
+    index = pd.date_range("2023-03-26 00:00", periods=3, freq="h", tz="UTC")
+    features = calendar_features(index, tz="Europe/Helsinki")
+    # 01:00 UTC is 04:00 local after the clocks moved forward
+    assert features[:, 0].tolist() == [2, 4, 5]
+    assert features[:, 3].tolist() == [1, 1, 1]
+
+    forecasts = synthetic_forecasts("2023-03-26", 8)
+    hourly = forecast_features(forecasts, index)
+    assert hourly[0] == pytest.approx(forecasts.iloc[:4].mean().to_numpy())
+    assert np.isnan(hourly[-1]).all()
+
+
+def test_scenarios_follow_the_forecast(wind_market):
+    prices, forecasts = wind_market
+    train = prices[: 100 * 24]
+    model = fit_price_model(train, forecasts, max_iter=100)
+    index = prices.index[100 * 24 : 107 * 24]
+
+    calm, windy = forecasts.copy(), forecasts.copy()
+    calm["Wind Onshore"], windy["Wind Onshore"] = 500.0, 3500.0
+    rng = np.random.default_rng(2)
+    calm_paths = model.scenarios(index, calm, train, 50, rng)
+    windy_paths = model.scenarios(index, windy, train, 50, rng)
+
+    assert calm_paths.shape == windy_paths.shape == (50, len(index))
+    assert calm_paths.mean() - windy_paths.mean() == pytest.approx(0.12, abs=0.03)
+    assert model.predict(index, forecasts, prices) == pytest.approx(
+        prices[index].to_numpy(), abs=0.03
+    )
+
+
+def test_one_predict_call_per_day_for_all_paths(wind_market):
+    prices, forecasts = wind_market
+    model = fit_price_model(prices[: 100 * 24], forecasts, max_iter=20)
+    calls = []
+    predict = model.estimator.predict
+    model.estimator.predict = lambda features: calls.append(len(features)) or predict(features)
+
+    index = prices.index[100 * 24 : 110 * 24 + 5]
+    model.scenarios(index, forecasts, prices[: 100 * 24], 1000)
+
+    assert calls == [1000 * 24] * 10 + [1000 * 5]
+
+
+def test_scenarios_need_forecasts_and_history(wind_market):
+    prices, forecasts = wind_market
+    model = fit_price_model(prices[: 100 * 24], forecasts, max_iter=20)
+
+    with pytest.raises(ValueError, match="Forecasts"):
+        model.scenarios(scenario_index(pd.Timestamp("2023-06-01"), 24), forecasts, prices, 1)
+    with pytest.raises(ValueError, match="history"):
+        model.scenarios(prices.index[24 * 10 : 24 * 11], forecasts, prices[:24], 1)
+
+
+def test_fitted_model_is_cached(tmp_path, wind_market):
+    prices, forecasts = wind_market
+    cache = ResultCache(str(tmp_path))
+    model, hit = cached_fit_price_model(cache, prices[: 30 * 24], forecasts, max_iter=20)
+    again, hit_again = cached_fit_price_model(cache, prices[: 30 * 24], forecasts, max_iter=20)
+    _, other_params = cached_fit_price_model(cache, prices[: 30 * 24], forecasts, max_iter=30)
+
+    assert (hit, hit_again, other_params) == (False, True, False)
+    index = prices.index[30 * 24 : 31 * 24]
+    assert again.predict(index, forecasts, prices) == pytest.approx(
+        model.predict(index, forecasts, prices)
+    )
+
+
+def test_bank_replaces_simulate_spot_prices_by_hour(wind_market):
+    prices, forecasts = wind_market
+    model = fit_price_model(prices[: 100 * 24], forecasts, max_iter=20)
+    index = prices.index[100 * 24 : 120 * 24]
+    bank = ScenarioBank.generate(
+        model, index, forecasts, prices[: 100 * 24], n_paths=20, rng=np.random.default_rng(3)
+    )
+    market_data = load_data("test/market_model_test.json")
+
+    random.seed(7)
+    first = bank.simulate_spot_prices_by_hour(market_data, 24 * 14)
+    random.seed(7)
+    assert bank.simulate_spot_prices_by_hour(market_data, 24 * 14) == first
+    assert len(first) == 24 * 14
+
+    profile = compile_profile(load_data("test/energy_model_test.json"), num_hours=len(first))
+    assert profile.price(first).variable_cost(0.05) > 0
+    with pytest.raises(ValueError):
+        bank.simulate_spot_prices_by_hour(market_data)
+
+
+def test_main(tmp_path):
+    forecasts_file = str(tmp_path / "forecasts.csv")
+    synthetic_forecasts("2024-01-01", 200 * 24, freq="h").to_csv(
+        forecasts_file, index_label="Timestamp"
+    )
+    output = str(tmp_path / "scenarios.csv")
+
+    summary = main(
+        prices_file=PRICES_FILE,
+        forecasts_file=forecasts_file,
+        start=pd.Timestamp("2024-06-01").to_pydatetime(),
+        hours=48,
+        paths=10,
+        seed=1,
+        cache_dir=str(tmp_path / "cache"),
+        output=output,
+    )
+
+    assert summary["cache"] == "miss"
+    assert summary["p5_mean_price"] <= summary["p50_mean_price"] <= summary["p95_mean_price"]
+    assert pd.read_csv(output, index_col="Timestamp").shape == (48, 10)
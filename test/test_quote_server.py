@@ -0,0 +1,164 @@
+import asyncio
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft.compiled_tariff import compile_tariff
+from saft.quote_server import QuoteError
+from saft.quote_server import QuoteServer
+from saft.quote_server import QuoteService
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+from saft.resolution import usage_vector
+
+
+@pytest.fixture
+def service(tariff_calendar, pricing_factory):
+    index = pd.date_range("2023-01-01", "2023-01-08", freq="h", inclusive="left")
+    pricing = pricing_factory("2023-01-01", list(np.arange(len(index), dtype=float)))
+    return QuoteService(compile_tariff(tariff_calendar, index, pricing=pricing))
+
+
+async def request(port, method, path, payload=None, connection="close"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        (
+            f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {connection}\r\n\r\n"
+        ).encode()
+        + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = {}
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    response = await reader.readexactly(int(headers["content-length"]))
+    writer.close()
+    return int(status_line.split()[1]), json.loads(response)
+
+
+def run_with_server(service, scenario, **kwargs):
+    async def run():
+        server = QuoteServer(service, port=0, **kwargs)
+        await server.start()
+        try:
+            return await scenario(server)
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def test_quote_matches_analyzer(service, tariff_calendar, household_schedule):
+    # Starts mid-month, so the fixed monthly fee is due on the first quoted hour
+    start, end = datetime(2023, 1, 2, 5), datetime(2023, 1, 4, 5)
+    usage = usage_vector(household_schedule, pd.date_range(start, end, freq="h", inclusive="left"))
+
+    async def scenario(server):
+        return await request(
+            server.port, "POST", "/quote", {"start": start.isoformat(), "usage_kwh": list(usage)}
+        )
+
+    status, response = run_with_server(service, scenario)
+
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+    expected = analyzer.summarize_analysis(analyzer.analyze_period(start, end))
+    assert status == 200
+    assert response["cost_by_type"]["fixed_monthly"] > 0
+    for plan_type, cost in expected["cost_by_type"].items():
+        assert response["cost_by_type"][plan_type] == pytest.approx(float(cost), rel=1e-4)
+    spot = service.tariff.slice(29, 29 + len(usage)).costs(usage)["spot"].sum()
+    assert response["cost_by_type"]["spot"] == pytest.approx(spot)
+    assert response["total_usage_kwh"] == pytest.approx(float(expected["total_usage_kwh"]))
+
+
+def test_bad_requests(service):
+    async def scenario(server):
+        return [
+            await request(server.port, "POST", "/quote", {"usage_kwh": [1]}),
+            await request(
+                server.port, "POST", "/quote", {"start": "2022-01-01T00:00:00", "usage_kwh": [1]}
+            ),
+            await request(
+                server.port,
+                "POST",
+                "/quote",
+                {"start": "2023-01-07T23:00:00", "usage_kwh": [1, 1]},
+            ),
+            await request(server.port, "GET", "/nowhere"),
+        ]
+
+    statuses = [status for status, _ in run_with_server(service, scenario)]
+    assert statuses == [400, 400, 400, 404]
+
+
+def test_unexpected_failure_is_answered_with_500(service, monkeypatch, caplog):
+    def broken_quote(payload):
+        raise RuntimeError("tariff unavailable")
+
+    async def scenario(server):
+        monkeypatch.setattr(server.service, "quote", broken_quote)
+        failed = await request(
+            server.port, "POST", "/quote", {"start": "2023-01-01T00:00:00", "usage_kwh": [1]}
+        )
+        return failed, await request(server.port, "GET", "/metrics")
+
+    (status, response), (_, metrics) = run_with_server(service, scenario)
+
+    assert status == 500
+    assert "error" in response
+    assert metrics["errors"] == 1
+    assert "tariff unavailable" in caplog.text
+
+
+def test_quote_errors(service):
+    with pytest.raises(QuoteError):
+        service.quote({"start": "2023-01-01T00:00:00", "usage_kwh": []})
+
+
+def test_metrics_and_keep_alive(service):
+    payload = {"start": "2023-01-01T00:00:00", "usage_kwh": [0.5] * 48}
+
+    async def scenario(server):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        body = json.dumps(payload).encode()
+        for _ in range(3):
+            writer.write(
+                f"POST /quote HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            assert (await reader.readline()).startswith(b"HTTP/1.1 200")
+            length = 0
+            while (line := await reader.readline()) != b"\r\n":
+                if line.lower().startswith(b"content-length"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+        writer.close()
+        return await request(server.port, "GET", "/metrics")
+
+    status, metrics = run_with_server(service, scenario)
+    assert status == 200
+    assert metrics["requests"] == 3
+    assert metrics["errors"] == 0
+    assert metrics["p50_ms"] > 0
+
+
+def test_backpressure_rejects_when_saturated(service):
+    async def scenario(server):
+        server.in_flight = server.max_pending
+        rejected = await request(
+            server.port, "POST", "/quote", {"start": "2023-01-01T00:00:00", "usage_kwh": [1]}
+        )
+        server.in_flight = 0
+        accepted = await request(
+            server.port, "POST", "/quote", {"start": "2023-01-01T00:00:00", "usage_kwh": [1]}
+        )
+        _, metrics = await request(server.port, "GET", "/metrics")
+        return rejected[0], accepted[0], metrics["rejected"]
+
+    assert run_with_server(service, scenario, max_pending=2) == (503, 200, 1)
@@ -0,0 +1,188 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saft.compiled_tariff import align_spot_prices
+from saft.compiled_tariff import summarize_period
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+from saft.resolution import aggregate
+from saft.resolution import consumption_schedule
+from saft.resolution import disaggregate
+from saft.resolution import ENERGY
+from saft.resolution import infer_resolution
+from saft.resolution import PRICE
+from saft.resolution import QUARTER_HOUR
+from saft.resolution import resample_pricing
+from saft.resolution import to_resolution
+from saft.resolution import usage_vector
+from saft.simulate import load_data
+from saft.simulate import simulate_spot_prices
+from saft.sweep import compile_profile
+
+
+HOURLY = pd.date_range("2023-03-01", periods=6, freq="h", tz="UTC")
+CONSUMPTION_FILE = "test/energy_model_test.json"
+MARKET_FILE = "test/market_model_test.json"
+
+
+def test_infer_resolution_ignores_gaps():
+    index = pd.DatetimeIndex(["2023-01-01 00:00", "2023-01-01 00:15", "2023-01-01 02:00"])
+    assert infer_resolution(index) == pd.Timedelta(minutes=15)
+
+
+def test_price_round_trip():
+    prices = pd.Series([10.0, 20.0, 30.0, 40.0, 50.0, 60.0], index=HOURLY)
+    quarters = disaggregate(prices, QUARTER_HOUR, PRICE)
+
+    assert len(quarters) == 24
+    assert infer_resolution(quarters.index) == pd.Timedelta(QUARTER_HOUR)
+    assert list(quarters.iloc[:5]) == [10.0, 10.0, 10.0, 10.0, 20.0]
+    pd.testing.assert_series_equal(
+        aggregate(quarters, pd.Timedelta(hours=1), PRICE), prices, check_freq=False
+    )
+
+
+def test_energy_is_conserved():
+    usage = pd.Series([1.0, 2.0, 0.0, 4.0, 1.0, 2.0], index=HOURLY)
+    quarters = to_resolution(usage, QUARTER_HOUR, ENERGY)
+
+    assert quarters.sum() == pytest.approx(usage.sum())
+    assert list(quarters.iloc[:4]) == [0.25] * 4
+    pd.testing.assert_series_equal(
+        to_resolution(quarters, pd.Timedelta(hours=1), ENERGY), usage, check_freq=False
+    )
+
+
+def test_weighted_price_aggregation():
+    index = pd.date_range("2023-03-01", periods=4, freq="15min", tz="UTC")
+    prices = pd.Series([10.0, 20.0, 30.0, 40.0], index=index)
+    usage = pd.Series([1.0, 0.0, 0.0, 3.0], index=index)
+
+    hourly = aggregate(prices, pd.Timedelta(hours=1), PRICE, weights=usage)
+    assert list(hourly) == [pytest.approx(32.5)]
+
+
+def test_disaggregate_rejects_uneven_split():
+    prices = pd.Series([10.0, 20.0], index=HOURLY[:2])
+    with pytest.raises(ValueError):
+        disaggregate(prices, pd.Timedelta(minutes=25), PRICE)
+
+
+def test_resample_pricing_serves_quarter_hour_lookups(pricing_factory):
+    pricing = pricing_factory("2023-01-01", [100.0, 200.0])
+    quarters = resample_pricing(pricing, QUARTER_HOUR)
+
+    assert len(quarters.prices) == 8
+    lookup = pd.Timestamp("2023-01-01 01:45", tz="Europe/Helsinki")
+    assert float(quarters.get_price(lookup).amount) == pytest.approx(0.2)
+
+
+def test_usage_vector_matches_schedule(household_schedule):
+    index = pd.date_range("2023-01-01", "2023-01-15", freq="h", inclusive="left")
+    expected = [float(household_schedule.get_usage(timestamp=ts)) for ts in index]
+
+    assert usage_vector(household_schedule, index) == pytest.approx(expected)
+
+    quarters = pd.date_range("2023-01-01", "2023-01-15", freq="15min", inclusive="left")
+    assert usage_vector(household_schedule, quarters).sum() == pytest.approx(sum(expected))
+
+
+def test_analyzer_at_quarter_hour(tariff_calendar, household_schedule):
+    start, end = datetime(2023, 1, 2), datetime(2023, 1, 9)
+
+    hourly = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+    hourly_summary = hourly.summarize_analysis(hourly.analyze_period(start, end))
+    quarterly = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+    analysis = quarterly.analyze_period(start, end, QUARTER_HOUR)
+    quarterly_summary = quarterly.summarize_analysis(analysis)
+
+    assert len(analysis) == 4 * 24 * 7
+    assert quarterly_summary["total_usage_kwh"] == hourly_summary["total_usage_kwh"]
+    # Decimal sums are rounded to the context precision, four times as often at 15 minutes
+    assert float(quarterly_summary["total_cost"].amount) == pytest.approx(
+        float(hourly_summary["total_cost"].amount), rel=1e-3
+    )
+    # The fixed monthly fee does not depend on the resolution
+    assert (
+        quarterly_summary["cost_by_type"]["fixed_monthly"]
+        == hourly_summary["cost_by_type"]["fixed_monthly"]
+    )
+
+
+def test_summarize_period_matches_analyzer(tariff_calendar, household_schedule):
+    start, end = datetime(2023, 1, 2), datetime(2023, 1, 9)
+    analyzer = ElectricityUsageAnalyzer(tariff_calendar, household_schedule)
+    expected = analyzer.summarize_analysis(analyzer.analyze_period(start, end, QUARTER_HOUR))
+
+    summary = summarize_period(
+        tariff_calendar, household_schedule, start, end, resolution=QUARTER_HOUR
+    )
+    hourly = summarize_period(tariff_calendar, household_schedule, start, end)
+
+    assert summary["total_usage_kwh"] == pytest.approx(float(expected["total_usage_kwh"]))
+    assert summary["total_cost"] == pytest.approx(float(expected["total_cost"].amount), rel=1e-3)
+    assert summary["peak_cost_hour"] == expected["peak_cost_hour"]
+    assert summary["cost_by_type"]["fixed_monthly"] == pytest.approx(
+        float(expected["cost_by_type"]["fixed_monthly"])
+    )
+    assert summary["total_cost"] == pytest.approx(hourly["total_cost"])
+    assert summary["cost_by_type"] == pytest.approx(hourly["cost_by_type"])
+
+
+def test_hourly_spot_prices_repeat_over_quarter_hours(pricing_factory):
+    pricing = pricing_factory("2023-01-01", [100.0, 200.0])
+    index = pd.date_range("2023-01-01", periods=8, freq="15min")
+
+    spot = align_spot_prices(pricing, index)
+    assert spot == pytest.approx([0.1] * 4 + [0.2] * 4)
+
+
+def test_simulated_quarter_hour_prices_follow_hourly_ranges():
+    market_data = load_data(MARKET_FILE)
+    prices = simulate_spot_prices(
+        market_data, num_hours=24, intervals_per_hour=4, rng=np.random.default_rng(1)
+    )
+    january = next(m for m in market_data if m["month"] == 1)
+
+    assert prices.shape == (96,)
+    peak = prices[6 * 4 : 10 * 4]
+    assert np.all(peak >= january["peak"]["min"]) and np.all(peak <= january["peak"]["max"])
+    night = prices[: 6 * 4]
+    assert np.all(night >= january["off-peak"]["min"])
+    assert np.all(night <= january["off-peak"]["max"])
+
+
+def test_load_profile_at_quarter_hour():
+    profile = compile_profile(load_data(CONSUMPTION_FILE), num_hours=24 * 60)
+    quarters = profile.at_resolution(4)
+    hourly_prices = np.linspace(0.05, 0.2, 24 * 60)
+
+    assert quarters.kwh == pytest.approx(profile.kwh)
+    hourly = profile.price(hourly_prices)
+    quarterly = quarters.price(np.repeat(hourly_prices, 4))
+    assert quarterly.spot_cost == pytest.approx(hourly.spot_cost)
+    assert quarterly.stats["average_peak_price"] == pytest.approx(
+        hourly.stats["average_peak_price"]
+    )
+
+
+def test_consumption_schedule_follows_the_calendar():
+    consumption_data = load_data(CONSUMPTION_FILE)
+    index = pd.date_range("2023-06-01", "2023-09-01", freq="h", inclusive="left")
+
+    usage = usage_vector(consumption_schedule(consumption_data, index[0], index[-1]), index)
+
+    for month in (6, 7, 8):
+        for hour in (0, 12):
+            active = [
+                cpo["kw_draw"]
+                for co in consumption_data
+                for cpo in co["consumption_periods"]
+                if month in cpo["months"]
+                and cpo["start_time"] <= f"{hour:02d}:00:00" < cpo["stop_time"]
+            ]
+            in_month = (index.month == month) & (index.hour == hour)
+            # The 31st draws like every other day
+            assert usage[in_month] == pytest.approx([sum(active)] * in_month.sum())
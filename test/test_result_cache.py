@@ -0,0 +1,146 @@
+import os
+import shutil
+import time
+from datetime import datetime
+from decimal import Decimal
+from decimal import localcontext
+
+import pytest
+
+from saft import simulate
+from saft.ratepayer_model import ElectricityPriceCalendar
+from saft.ratepayer_model import ElectricityUsageAnalyzer
+from saft.ratepayer_model import PricingPlan
+from saft.ratepayer_model import UsagePattern
+from saft.ratepayer_model import UsageSchedule
+from saft.ratepayer_old_model import PreciseAmount
+from saft.result_cache import cached_analyze_period
+from saft.result_cache import fingerprint
+from saft.result_cache import ResultCache
+
+
+SIMULATION_ARGS = dict(
+    consumption_file="test/energy_model_test.json",
+    market_file="test/market_model_test.json",
+    seed=1,
+    fixed_total=675.56,
+    transfer_price=0.5,
+)
+
+
+def make_analyzer(price: str = "0.10"):
+    calendar = ElectricityPriceCalendar()
+    calendar.add_pricing_plan(
+        plan=PricingPlan(
+            name="Daily Rate",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2023, 12, 31),
+            price=PreciseAmount(amount=Decimal(price)),
+            plan_type="daily_rate",
+        )
+    )
+    schedule = UsageSchedule()
+    schedule.add_usage_pattern(
+        pattern=UsagePattern(
+            name="Base Usage",
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2023, 12, 31),
+            kwh=Decimal("1"),
+        )
+    )
+    return ElectricityUsageAnalyzer(calendar, schedule)
+
+
+def test_fingerprint_is_stable_and_sensitive():
+    assert fingerprint(a=1, b=[Decimal("0.1")]) == fingerprint(b=[Decimal("0.1")], a=1)
+    assert fingerprint(a=1) != fingerprint(a=2)
+    assert fingerprint(a=1.0) != fingerprint(a="1.0")
+    assert fingerprint(plan=make_analyzer().price_calendar.pricing_plans) == fingerprint(
+        plan=make_analyzer().price_calendar.pricing_plans
+    )
+    assert fingerprint(plan=make_analyzer().price_calendar.pricing_plans) != fingerprint(
+        plan=make_analyzer("0.11").price_calendar.pricing_plans
+    )
+
+
+def test_lookup_and_store(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.lookup("abc") == (False, None)
+    cache.store("abc", {"value": 1})
+    assert cache.lookup("abc") == (True, {"value": 1})
+    assert [name for name in os.listdir(tmp_path)] == ["abc.pkl"]
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    (tmp_path / "abc.pkl").write_bytes(b"not a pickle")
+    assert cache.lookup("abc") == (False, None)
+    assert not (tmp_path / "abc.pkl").exists()
+
+
+def test_lru_eviction(tmp_path):
+    payload = b"x" * 1000
+    cache = ResultCache(str(tmp_path), max_bytes=2500)
+    cache.store("first", payload)
+    cache.store("second", payload)
+    past = time.time() - 60
+    os.utime(tmp_path / "first.pkl", (past - 10, past - 10))
+    os.utime(tmp_path / "second.pkl", (past, past))
+
+    assert cache.lookup("first")[0]  # bumps "first" to most recently used
+    cache.store("third", payload)
+
+    assert cache.lookup("first")[0]
+    assert not cache.lookup("second")[0]
+    assert cache.lookup("third")[0]
+
+
+def test_simulate_main_reports_hit_and_miss(tmp_path):
+    uncached = simulate.main(**SIMULATION_ARGS)
+    first = simulate.main(**SIMULATION_ARGS, cache_dir=str(tmp_path))
+    second = simulate.main(**SIMULATION_ARGS, cache_dir=str(tmp_path))
+    other_seed = simulate.main(**{**SIMULATION_ARGS, "seed": 2}, cache_dir=str(tmp_path))
+
+    assert first == {**uncached, "cache": "miss"}
+    assert second == {**uncached, "cache": "hit"}
+    assert other_seed["cache"] == "miss"
+
+
+def test_simulate_cache_key_follows_file_content(tmp_path):
+    consumption_file = tmp_path / "consumption.json"
+    shutil.copy(SIMULATION_ARGS["consumption_file"], consumption_file)
+    args = {**SIMULATION_ARGS, "consumption_file": str(consumption_file)}
+    cache_dir = str(tmp_path / "cache")
+
+    assert simulate.main(**args, cache_dir=cache_dir)["cache"] == "miss"
+    assert simulate.main(**args, cache_dir=cache_dir)["cache"] == "hit"
+    consumption_file.write_text(consumption_file.read_text().replace("0.5", "0.6"))
+    assert simulate.main(**args, cache_dir=cache_dir)["cache"] == "miss"
+
+
+@pytest.mark.parametrize("price", ["0.10", "0.20"])
+def test_cached_analyze_period(tmp_path, price):
+    cache = ResultCache(str(tmp_path))
+    start, end = datetime(2023, 1, 1), datetime(2023, 1, 2)
+
+    analysis, summary = cached_analyze_period(cache, make_analyzer(price), start, end)
+    cached_analysis, cached_summary = cached_analyze_period(cache, make_analyzer(price), start, end)
+
+    assert summary["cache"] == "miss"
+    assert cached_summary["cache"] == "hit"
+    assert cached_analysis == analysis
+    assert cached_summary["total_cost"].amount == summary["total_cost"].amount
+    assert cached_summary["total_usage_kwh"] == Decimal("24")
+
+
+def test_cached_analyze_period_follows_decimal_context(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    start, end = datetime(2023, 1, 1), datetime(2023, 1, 2)
+
+    with localcontext() as ctx:
+        ctx.prec = 2
+        _, rounded = cached_analyze_period(cache, make_analyzer("0.123"), start, end)
+    _, summary = cached_analyze_period(cache, make_analyzer("0.123"), start, end)
+
+    assert summary["cache"] == "miss"
+    assert rounded["total_cost"].amount != summary["total_cost"].amount
@@ -0,0 +1,186 @@
+import numpy as np
+import pytest
+
+from saft import risk_stats
+from saft import simulate
+from saft.risk_stats import QuantileSketch
+from saft.risk_stats import RiskEstimator
+from saft.risk_stats import RunningMoments
+
+
+CONSUMPTION_FILE = "test/energy_model_test.json"
+MARKET_FILE = "test/market_model_test.json"
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(7)
+    return np.concatenate([rng.normal(50, 200, 5000), np.zeros(10), rng.lognormal(3, 2, 5000)])
+
+
+def test_running_moments_merge(values):
+    left, right = RunningMoments(), RunningMoments()
+    left.update(values[:3000])
+    right.update(values[3000:])
+    left.merge(right)
+
+    assert left.count == len(values)
+    assert left.mean == pytest.approx(values.mean())
+    assert left.variance == pytest.approx(values.var(ddof=1))
+    assert (left.min, left.max) == (values.min(), values.max())
+
+
+@pytest.mark.parametrize("q", [0.0, 0.01, 0.05, 0.3, 0.5, 0.95, 0.99, 1.0])
+def test_sketch_quantile_within_relative_accuracy(values, q):
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.update(values)
+
+    exact = np.quantile(values, q, method="lower")
+    assert abs(sketch.quantile(q) - exact) <= 0.01 * abs(exact) + sketch.zero_threshold
+
+
+def test_sketch_merge_is_exact(values):
+    whole = QuantileSketch()
+    whole.update(values)
+
+    parts = [QuantileSketch() for _ in range(4)]
+    for part, chunk in zip(parts, np.array_split(values, 4)):
+        part.update(chunk)
+    merged = QuantileSketch()
+    for part in reversed(parts):
+        merged.merge(part)
+
+    assert merged.positive == whole.positive
+    assert merged.negative == whole.negative
+    assert merged.zero_count == whole.zero_count
+    assert merged.quantile(0.37) == whole.quantile(0.37)
+
+
+def test_sketch_merge_rejects_other_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(relative_accuracy=0.01).merge(QuantileSketch(relative_accuracy=0.02))
+
+
+def test_empty_sketch():
+    assert np.isnan(QuantileSketch().quantile(0.5))
+    assert np.isnan(QuantileSketch().lower_tail_mean(0.05))
+
+
+def test_var_and_cvar(values):
+    estimator = RiskEstimator(relative_accuracy=0.01)
+    estimator.update(values)
+    report = estimator.report()
+
+    ordered = np.sort(values)
+    tail = ordered[: int(0.05 * len(values))]
+    assert report["runs"] == len(values)
+    assert report["var_95"] == pytest.approx(-np.quantile(values, 0.05, method="lower"), rel=0.01)
+    assert report["cvar_95"] == pytest.approx(-tail.mean(), rel=0.01)
+    assert report["p50_savings"] == pytest.approx(
+        np.quantile(values, 0.5, method="lower"), rel=0.01
+    )
+
+
+def test_simulate_savings_matches_simulate_main():
+    profile = risk_stats.compile_profile(simulate.load_data(CONSUMPTION_FILE))
+    savings = risk_stats.simulate_savings(
+        profile=profile,
+        market_data=simulate.load_data(MARKET_FILE),
+        transfer_price=0.5,
+        fixed_total=675.56,
+        seed=3,
+    )
+    expected = simulate.main(
+        consumption_file=CONSUMPTION_FILE,
+        market_file=MARKET_FILE,
+        seed=3,
+        fixed_total=675.56,
+        transfer_price=0.5,
+    )
+    assert savings == pytest.approx(expected["savings_with_spot_price"])
+
+
+def test_quarter_hour_savings():
+    market_data = simulate.load_data(MARKET_FILE)
+    profile = risk_stats.compile_profile(simulate.load_data(CONSUMPTION_FILE))
+    savings = risk_stats.simulate_savings(
+        profile=profile.at_resolution(4),
+        market_data=market_data,
+        transfer_price=0.5,
+        fixed_total=675.56,
+        seed=3,
+        intervals_per_hour=4,
+    )
+
+    spot_prices = simulate.simulate_spot_prices(
+        market_data, intervals_per_hour=4, rng=np.random.default_rng(3)
+    )
+    spot_cost = profile.at_resolution(4).price(spot_prices).spot_cost
+    assert savings == pytest.approx(675.56 - spot_cost - 0.5 * profile.kwh)
+
+    estimator = risk_stats.run_risk_analysis(
+        consumption_data=simulate.load_data(CONSUMPTION_FILE),
+        market_data=market_data,
+        transfer_price=0.5,
+        fixed_total=675.56,
+        first_seed=3,
+        runs=2,
+        workers=1,
+        intervals_per_hour=4,
+    )
+    assert estimator.moments.min <= savings <= estimator.moments.max
+
+
+def test_parallel_run_matches_sequential():
+    kwargs = dict(
+        consumption_data=simulate.load_data(CONSUMPTION_FILE),
+        market_data=simulate.load_data(MARKET_FILE),
+        transfer_price=0.05,
+        fixed_total=675.56,
+        first_seed=10,
+        runs=12,
+        batch_size=5,
+    )
+    sequential = risk_stats.run_risk_analysis(workers=1, **kwargs)
+    parallel = risk_stats.run_risk_analysis(workers=2, **kwargs)
+
+    assert sequential.sketch.positive == parallel.sketch.positive
+    assert sequential.sketch.negative == parallel.sketch.negative
+    assert sequential.report() == pytest.approx(parallel.report())
+    assert sequential.report()["runs"] == 12
+
+
+def test_seed_ranges():
+    assert risk_stats.seed_ranges(5, 7, 3) == [range(5, 8), range(8, 11), range(11, 12)]
+
+
+def test_resumed_run_matches_uninterrupted(tmp_path, monkeypatch):
+    kwargs = dict(
+        consumption_data=simulate.load_data(CONSUMPTION_FILE),
+        market_data=simulate.load_data(MARKET_FILE),
+        transfer_price=0.05,
+        fixed_total=675.56,
+        first_seed=10,
+        runs=12,
+        batch_size=3,
+        workers=1,
+    )
+    expected = risk_stats.run_risk_analysis(**kwargs)
+
+    estimate_seed_range = risk_stats.estimate_seed_range
+
+    def preempted(*, seeds, **rest):
+        if 16 in seeds:
+            raise KeyboardInterrupt()
+        return estimate_seed_range(seeds=seeds, **rest)
+
+    monkeypatch.setattr(risk_stats, "estimate_seed_range", preempted)
+    with pytest.raises(KeyboardInterrupt):
+        risk_stats.run_risk_analysis(checkpoint_dir=str(tmp_path), **kwargs)
+    monkeypatch.undo()
+
+    resumed = risk_stats.run_risk_analysis(checkpoint_dir=str(tmp_path), **kwargs)
+
+    assert vars(resumed.moments) == vars(expected.moments)
+    assert resumed.sketch.positive == expected.sketch.positive
+    assert resumed.report() == expected.report()
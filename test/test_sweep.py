@@ -0,0 +1,134 @@
+import csv
+import random
+
+import numpy as np
+import pytest
+
+from saft import simulate
+from saft import sweep
+
+
+CONSUMPTION_FILE = "test/energy_model_test.json"
+MARKET_FILE = "test/market_model_test.json"
+
+
+@pytest.fixture
+def compiled():
+    random.seed(1)
+    hourly_spot_prices = simulate.simulate_spot_prices_by_hour(simulate.load_data(MARKET_FILE))
+    consumption_data = simulate.load_data(CONSUMPTION_FILE)
+    return (
+        consumption_data,
+        hourly_spot_prices,
+        sweep.compile_load(consumption_data, hourly_spot_prices),
+    )
+
+
+def test_sweep_matches_calculate_costs(compiled):
+    consumption_data, hourly_spot_prices, load = compiled
+    transfer_prices = [0.0, 0.05, 0.5]
+    fixed_totals = [500.0, 675.56]
+
+    savings = sweep.sweep_savings(load, transfer_prices, fixed_totals)
+
+    assert savings.shape == (3, 2)
+    for i, transfer_price in enumerate(transfer_prices):
+        for j, fixed_total in enumerate(fixed_totals):
+            expected = simulate.calculate_costs(
+                consumption_data, hourly_spot_prices, transfer_price, fixed_total
+            )
+            assert savings[i, j] == pytest.approx(expected["savings_with_spot_price"])
+            for k, v in load.stats.items():
+                assert v == pytest.approx(expected[k]), k
+
+
+def test_break_even(compiled):
+    consumption_data, hourly_spot_prices, load = compiled
+
+    fixed = sweep.break_even_fixed_total(load, [0.05])
+    expected = simulate.calculate_costs(consumption_data, hourly_spot_prices, 0.05, 0.0)
+    assert fixed[0] == pytest.approx(expected["total_cost_variable_price"])
+
+    transfer = sweep.break_even_transfer_price(load, fixed)
+    assert transfer[0] == pytest.approx(0.05)
+    assert sweep.sweep_savings(load, transfer, fixed)[0, 0] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_sweep_table_columns(compiled):
+    consumption_data, hourly_spot_prices, load = compiled
+    transfer_prices = [0.05, 0.5]
+    fixed_totals = [500.0, 675.56]
+
+    rows = sweep.sweep_table(load, transfer_prices, fixed_totals)
+
+    for row in rows:
+        expected = simulate.calculate_costs(
+            consumption_data, hourly_spot_prices, row["transfer_price"], row["fixed_total"]
+        )
+        assert row["total_cost_variable_price"] == pytest.approx(
+            expected["total_cost_variable_price"]
+        )
+        assert row["savings_with_spot_price"] == pytest.approx(expected["savings_with_spot_price"])
+    # No column merely repeats another one
+    columns = {name: [row[name] for row in rows] for name in rows[0]}
+    values = [tuple(column) for column in columns.values()]
+    assert len(set(values)) == len(values)
+
+
+def test_break_even_transfer_price_without_load():
+    profile = sweep.LoadProfile(
+        kw_by_hour=np.zeros(3), peak_hours=np.zeros(3), off_peak_hours=np.zeros(3)
+    )
+    load = profile.price(np.ones(3))
+    assert np.isnan(sweep.break_even_transfer_price(load, [100.0])).all()
+
+
+def test_main_writes_grid(tmp_path):
+    output = tmp_path / "grid.csv"
+    rows = sweep.main(
+        seed=1,
+        transfer_prices=[0.05, 0.5],
+        fixed_totals=[675.56, 800.0, 900.0],
+        consumption_file=CONSUMPTION_FILE,
+        market_file=MARKET_FILE,
+        output=str(output),
+    )
+
+    with open(output) as file:
+        written = list(csv.DictReader(file))
+    assert len(rows) == len(written) == 6
+
+    expected = simulate.main(
+        consumption_file=CONSUMPTION_FILE,
+        market_file=MARKET_FILE,
+        seed=1,
+        fixed_total=675.56,
+        transfer_price=0.5,
+    )
+    row = [r for r in rows if r["transfer_price"] == 0.5 and r["fixed_total"] == 675.56][0]
+    assert row["savings_with_spot_price"] == pytest.approx(expected["savings_with_spot_price"])
+    assert float(written[3]["savings_with_spot_price"]) == pytest.approx(
+        row["savings_with_spot_price"]
+    )
+
+
+def test_main_at_quarter_hour():
+    rows = sweep.main(
+        seed=1,
+        transfer_prices=[0.05, 0.5],
+        fixed_totals=[675.56],
+        consumption_file=CONSUMPTION_FILE,
+        market_file=MARKET_FILE,
+        intervals_per_hour=4,
+    )
+
+    profile = sweep.compile_profile(simulate.load_data(CONSUMPTION_FILE))
+    spot_prices = simulate.simulate_spot_prices(
+        simulate.load_data(MARKET_FILE), intervals_per_hour=4, rng=np.random.default_rng(1)
+    )
+    load = profile.at_resolution(4).price(spot_prices)
+    assert [row["savings_with_spot_price"] for row in rows] == pytest.approx(
+        list(675.56 - load.variable_cost([0.05, 0.5]))
+    )
+    # The energy is the same as at hourly resolution
+    assert load.kwh == pytest.approx(profile.kwh)
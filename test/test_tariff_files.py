@@ -0,0 +1,166 @@
+import json
+import tomllib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+
+from saft.compiled_tariff import compile_tariff
+from saft.compiled_tariff import TariffTable
+from saft.resolution import usage_vector
+from saft.result_cache import ResultCache
+from saft.tariff_files import cached_load_catalogue
+from saft.tariff_files import load_catalogue
+from saft.tariff_files import main
+from saft.tariff_files import TariffFile
+
+
+TARIFF_FILE = "saft/sample_data/tariffs.toml"
+INDEX = pd.date_range("2023-01-01", "2023-04-01", freq="h", inclusive="left")
+
+
+def tariff(tariff_id, kind="supplier", **plan):
+    return {
+        "id": tariff_id,
+        "kind": kind,
+        "name": tariff_id.title(),
+        "start_date": "2023-01-01T00:00:00",
+        "end_date": "2024-01-01T00:00:00",
+        "plans": [{"name": "Energy", "plan_type": "supply", "price": "0.07", **plan}],
+    }
+
+
+def write_json(path, tariffs):
+    path.write_text(json.dumps({"tariffs": tariffs}))
+    return str(path)
+
+
+def assert_prices_equal(table, calendar):
+    expected = TariffTable.from_calendar(calendar).prices(INDEX)
+    prices = table.prices(INDEX)
+    assert prices.keys() == expected.keys()
+    for plan_type in expected:
+        np.testing.assert_allclose(prices[plan_type], expected[plan_type])
+
+
+def test_sample_file_builds_the_calendar(tariff_calendar):
+    catalogue = load_catalogue(TARIFF_FILE)
+    calendar = catalogue.to_calendar("tou-distribution", "night-day-supply")
+
+    assert catalogue.ids("supplier") == ["night-day-supply", "spot-margin"]
+    for timestamp in pd.date_range("2023-01-30", periods=48, freq="h"):
+        assert calendar.get_price(timestamp=timestamp) == tariff_calendar.get_price(
+            timestamp=timestamp
+        )
+    assert_prices_equal(
+        catalogue.table_for("tou-distribution", "night-day-supply"), tariff_calendar
+    )
+
+
+def test_json_and_toml_are_the_same_format(tmp_path):
+    with open(TARIFF_FILE, "rb") as file:
+        data = tomllib.load(file)
+    json_file = tmp_path / "tariffs.json"
+    json_file.write_text(json.dumps(data, default=lambda value: value.isoformat()))
+
+    from_toml, from_json = load_catalogue(TARIFF_FILE), load_catalogue(str(json_file))
+
+    assert from_json.ids() == from_toml.ids()
+    assert_prices_equal(
+        from_json.table_for(*from_json.ids()), from_toml.to_calendar(*from_toml.ids())
+    )
+
+
+def test_first_tariff_wins_shared_plan_types(tmp_path):
+    catalogue = load_catalogue(
+        write_json(
+            tmp_path / "tariffs.json",
+            [
+                tariff("weekend", days_of_week=[5, 6], price="0.03"),
+                tariff("flat", tax_multiplier="1.0"),
+                tariff("grid", kind="distributor", plan_type="distribution", months=[1]),
+            ],
+        )
+    )
+
+    for ids in [("weekend", "flat", "grid"), ("grid", "flat", "weekend")]:
+        assert_prices_equal(catalogue.table_for(*ids), catalogue.to_calendar(*ids))
+    with pytest.raises(ValueError, match="No tariff"):
+        catalogue.table_for("missing")
+
+
+@pytest.mark.parametrize(
+    "tariffs",
+    [
+        [tariff("a", months=[13])],
+        [tariff("a", days_of_week=[7])],
+        [tariff("a", price="cheap")],
+        [tariff("a", prise="0.07")],
+        [tariff("a"), tariff("a")],
+        [tariff("a", end_date="2022-01-01T00:00:00")],
+        [{**tariff("a"), "plans": []}],
+        [tariff("a", kind="retailer")],
+    ],
+)
+def test_invalid_files_are_rejected(tmp_path, tariffs):
+    with pytest.raises(ValidationError):
+        load_catalogue(write_json(tmp_path / "tariffs.json", tariffs))
+
+
+def test_cached_catalogue_is_not_validated_again(tmp_path, monkeypatch):
+    variants = [
+        tariff(f"variant-{i}", price=f"0.{i:04d}", time_range={"start": "07:00", "end": "22:00"})
+        for i in range(500)
+    ]
+    tariff_file = write_json(tmp_path / "tariffs.json", variants)
+    cache = ResultCache(str(tmp_path / "cache"))
+    catalogue, hit = cached_load_catalogue(cache, tariff_file)
+    assert not hit and len(catalogue.ids()) == 500
+
+    def validate(data):
+        raise AssertionError("Validated a cached catalogue")
+
+    monkeypatch.setattr(TariffFile, "model_validate", validate)
+    cached, hit = cached_load_catalogue(cache, tariff_file)
+    assert hit
+    assert_prices_equal(cached.table_for("variant-42"), catalogue.to_calendar("variant-42"))
+
+    monkeypatch.undo()
+    _, hit = cached_load_catalogue(cache, write_json(tmp_path / "tariffs.json", variants[:10]))
+    assert not hit
+
+
+def test_table_feeds_the_cost_engine(tariff_calendar, household_schedule, pricing_factory):
+    catalogue = load_catalogue(TARIFF_FILE)
+    pricing = pricing_factory("2023-01-01", [50.0] * len(INDEX))
+    usage = usage_vector(household_schedule, INDEX)
+
+    summary = compile_tariff(
+        catalogue.table_for("tou-distribution", "night-day-supply"), INDEX, pricing=pricing
+    ).summarize(usage)
+    expected = compile_tariff(tariff_calendar, INDEX, pricing=pricing).summarize(usage)
+
+    assert summary == expected
+    spot = compile_tariff(
+        catalogue.table_for("tou-distribution", "spot-margin"),
+        pd.date_range(datetime(2023, 1, 1), periods=24, freq="h"),
+        pricing=pricing,
+    )
+    assert set(spot.prices) == {
+        "fixed_monthly",
+        "distribution",
+        "supplier_monthly",
+        "margin",
+        "spot",
+    }
+
+
+def test_main(tmp_path):
+    summary = main(tariff_file=TARIFF_FILE, cache_dir=str(tmp_path))
+
+    assert summary["distributors"] == ["tou-distribution"]
+    assert summary["plans"] == 7
+    assert summary["cache"] == "miss"
+    assert main(tariff_file=TARIFF_FILE, cache_dir=str(tmp_path))["cache"] == "hit"